@@ -3,11 +3,17 @@
  * Connects to self-hosted NLLB-200 translation service on Contabo
  */
 
+/**
+ * Decoding profiles: fast (greedy) for headlines and tickers, quality (beam search) for article bodies
+ */
+export type DecodingProfile = 'fast' | 'balanced' | 'quality';
+
 interface TranslationRequest {
   text: string;
   source_lang: string;
   target_lang: string;
   preserve_crypto_terms?: boolean;
+  profile?: DecodingProfile;
 }
 
 interface TranslationResponse {
@@ -22,6 +28,7 @@ interface BatchTranslationRequest {
   source_lang: string;
   target_langs: string[];
   preserve_crypto_terms?: boolean;
+  profile?: DecodingProfile;
 }
 
 interface BatchTranslationResponse {
@@ -29,6 +36,22 @@ interface BatchTranslationResponse {
   model_version: string;
 }
 
+/**
+ * One event from the streaming endpoints (NDJSON)
+ * - segment: one sentence of a document-mode text
+ * - token: text generated so far for a token-streamed translation
+ * - result: a complete translation of texts[index] into target_lang
+ */
+export interface TranslationStreamEvent {
+  type: 'segment' | 'token' | 'result' | 'done' | 'error';
+  index?: number;
+  segment?: number;
+  target_lang?: string;
+  translated_text?: string;
+  cached?: boolean;
+  detail?: string;
+}
+
 class NLLBTranslationClient {
   private baseUrl: string;
   private timeout: number;
@@ -47,7 +70,8 @@ class NLLBTranslationClient {
     text: string,
     sourceLang: string = 'en',
     targetLang: string,
-    preserveCryptoTerms: boolean = true
+    preserveCryptoTerms: boolean = true,
+    profile?: DecodingProfile
   ): Promise<string> {
     let lastError: Error | null = null;
 
@@ -63,7 +87,8 @@ class NLLBTranslationClient {
             text,
             source_lang: sourceLang,
             target_lang: targetLang,
-            preserve_crypto_terms: preserveCryptoTerms
+            preserve_crypto_terms: preserveCryptoTerms,
+            profile
           } as TranslationRequest),
           signal: controller.signal
         });
@@ -104,7 +129,8 @@ class NLLBTranslationClient {
     texts: string[],
     sourceLang: string = 'en',
     targetLangs: string[],
-    preserveCryptoTerms: boolean = true
+    preserveCryptoTerms: boolean = true,
+    profile?: DecodingProfile
   ): Promise<Record<string, string[]>> {
     const controller = new AbortController();
     const timeoutId = setTimeout(() => controller.abort(), this.timeout * 2);
@@ -117,7 +143,8 @@ class NLLBTranslationClient {
           texts,
           source_lang: sourceLang,
           target_langs: targetLangs,
-          preserve_crypto_terms: preserveCryptoTerms
+          preserve_crypto_terms: preserveCryptoTerms,
+          profile
         } as BatchTranslationRequest),
         signal: controller.signal
       });
@@ -143,6 +170,76 @@ class NLLBTranslationClient {
     }
   }
 
+  /**
+   * Translate multiple texts to multiple languages, receiving each result as soon as it is decoded
+   */
+  async batchTranslateStream(
+    texts: string[],
+    sourceLang: string = 'en',
+    targetLangs: string[],
+    onEvent: (event: TranslationStreamEvent) => void,
+    options: { preserveCryptoTerms?: boolean; documentMode?: boolean; profile?: DecodingProfile } = {}
+  ): Promise<Record<string, string[]>> {
+    const controller = new AbortController();
+    const timeoutId = setTimeout(() => controller.abort(), this.timeout * 2);
+    const translations: Record<string, string[]> = {};
+
+    try {
+      const response = await fetch(`${this.baseUrl}/translate/batch/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', Accept: 'application/x-ndjson' },
+        body: JSON.stringify({
+          texts,
+          source_lang: sourceLang,
+          target_langs: targetLangs,
+          preserve_crypto_terms: options.preserveCryptoTerms ?? true,
+          document_mode: options.documentMode ?? false,
+          profile: options.profile
+        }),
+        signal: controller.signal
+      });
+
+      if (!response.ok || !response.body) {
+        const error = await response.text();
+        throw new Error(`Streaming batch translation failed (${response.status}): ${error}`);
+      }
+
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      for await (const chunk of response.body as any as AsyncIterable<Uint8Array>) {
+        buffer += decoder.decode(chunk, { stream: true });
+        let newline: number;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+          const line = buffer.slice(0, newline).trim();
+          buffer = buffer.slice(newline + 1);
+          if (!line) continue;
+
+          const event = JSON.parse(line) as TranslationStreamEvent;
+          if (event.type === 'error') {
+            throw new Error(`Streaming batch translation failed: ${event.detail}`);
+          }
+          if (event.type === 'result' && event.target_lang !== undefined && event.index !== undefined) {
+            translations[event.target_lang] = translations[event.target_lang] || new Array(texts.length).fill('');
+            translations[event.target_lang][event.index] = event.translated_text || '';
+          }
+          onEvent(event);
+        }
+      }
+
+      return translations;
+
+    } catch (error: any) {
+      if (error.name === 'AbortError') {
+        throw new Error('Streaming batch translation timeout');
+      }
+
+      throw error;
+    } finally {
+      clearTimeout(timeoutId);
+    }
+  }
+
   /**
    * Translate article content (title, excerpt, content)
    */
@@ -0,0 +1,225 @@
+"""
+Memory-aware admission control for the NLLB translation service.
+
+Peak memory of a generate call grows with batch size x beams x sequence
+length: every beam keeps its own decoder self-attention cache and a copy of
+the cross-attention keys/values, and each step scores the whole vocabulary
+(256k entries for NLLB). A batch of long texts decoded with five beams can
+need several GB on top of the weights. Three safeguards keep that in check:
+
+- batches are capped by the estimated peak memory of their generate call, so
+  oversized work is split into several smaller calls
+- every inference job reserves its estimate before it runs; a job that would
+  not fit below the memory limit waits until running jobs have finished
+- the service's memory (API process plus inference workers) is sampled, and
+  new requests are turned away with 503 + Retry-After above a high-water mark
+  instead of running into the kernel's OOM killer
+"""
+
+import json
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+
+from inference_queue import QueueFullError
+
+
+class MemoryPressureError(QueueFullError):
+    """Raised instead of admitting new work while memory use is above the high-water mark"""
+
+    def __init__(self, retry_after: int, used: int, limit: int):
+        super().__init__(retry_after)
+        self.args = (f"Memory use is {used / 2**20:.0f} of {limit / 2**20:.0f} MB, retry after {retry_after}s",)
+
+
+class MemoryEstimator:
+    """Activation memory of encode and generate calls for one model architecture
+
+    Defaults describe NLLB-200 distilled 600M; estimates are upper bounds of the
+    tensors alive at the peak, not measurements.
+    """
+
+    def __init__(
+        self,
+        d_model: int = 1024,
+        decoder_layers: int = 12,
+        attention_heads: int = 16,
+        ffn_dim: int = 4096,
+        vocab_size: int = 256206,
+        dtype_bytes: int = 4,
+    ):
+        self.d_model = d_model
+        self.decoder_layers = decoder_layers
+        self.attention_heads = attention_heads
+        self.ffn_dim = ffn_dim
+        self.vocab_size = vocab_size
+        self.dtype_bytes = dtype_bytes
+
+    @classmethod
+    def from_checkpoint(cls, path: str, dtype_bytes: int = 4) -> "MemoryEstimator":
+        """Estimator for the config.json of a local checkpoint (NLLB-600M dimensions if there is none)"""
+        try:
+            with open(os.path.join(path, "config.json")) as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            return cls(dtype_bytes=dtype_bytes)
+        return cls(
+            d_model=config.get("d_model", 1024),
+            decoder_layers=config.get("decoder_layers", 12),
+            attention_heads=config.get("encoder_attention_heads", 16),
+            ffn_dim=max(config.get("encoder_ffn_dim", 4096), config.get("decoder_ffn_dim", 4096)),
+            vocab_size=config.get("vocab_size", 256206),
+            dtype_bytes=dtype_bytes,
+        )
+
+    def encode_bytes(self, batch: int, input_tokens: int) -> int:
+        """Peak of an encoder pass (layers run one after another, so one layer's temporaries)"""
+        hidden = batch * input_tokens * self.d_model
+        scores = batch * self.attention_heads * input_tokens * input_tokens
+        ffn = batch * input_tokens * self.ffn_dim
+        return (3 * hidden + scores + ffn) * self.dtype_bytes
+
+    def generate_bytes(self, batch: int, input_tokens: int, output_tokens: int, beams: int = 1) -> int:
+        """Peak of a generate call that runs up to output_tokens steps"""
+        rows = batch * max(1, beams)
+        encoder_states = rows * input_tokens * self.d_model  # expanded once per beam
+        cross_cache = 2 * self.decoder_layers * rows * input_tokens * self.d_model
+        self_cache = 2 * self.decoder_layers * rows * output_tokens * self.d_model
+        step = rows * (self.attention_heads * max(input_tokens, output_tokens) + self.ffn_dim)
+        # Logits, their log-softmax and the beam scores over the vocabulary, in fp32
+        logits = 3 * rows * self.vocab_size * 4
+        return (encoder_states + cross_cache + self_cache + step) * self.dtype_bytes + logits
+
+
+def memory_limit() -> int:
+    """Memory available to the service: the cgroup limit if there is one, else physical RAM"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:  # "max" or a huge number means unlimited
+            return int(value)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def process_memory(pid: int) -> Optional[int]:
+    """Proportional set size of a process (shared weight pages split between the processes
+    sharing them), falling back to its resident set; None where /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class AdmissionController:
+    """Reserves estimated memory for inference jobs and throttles admission by sampled memory use"""
+
+    def __init__(self, limit_bytes: int, high_watermark: float = 0.85, sample_seconds: float = 0.25):
+        self.limit = limit_bytes
+        self.high_watermark = high_watermark
+        self.sample_seconds = sample_seconds
+        self._pids: Callable[[], Iterable[int]] = lambda: ()
+        self._cond = threading.Condition()
+        self._used: Optional[int] = None
+        self._sampled_at = 0.0
+        self.reserved = 0
+        self._running = 0
+        self.peak_used = 0
+        self.throttled = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    @property
+    def threshold(self) -> int:
+        return int(self.limit * self.high_watermark)
+
+    def watch(self, pids: Callable[[], Iterable[int]]):
+        """Also count these processes (e.g. inference workers) in the sampled memory use"""
+        self._pids = pids
+
+    def used(self) -> Optional[int]:
+        """Memory of the API process and its workers, sampled at most every sample_seconds"""
+        now = time.monotonic()
+        if now - self._sampled_at >= self.sample_seconds:
+            sizes = [process_memory(pid) for pid in (os.getpid(), *self._pids())]
+            self._used = sum(size for size in sizes if size is not None) if sizes[0] is not None else None
+            self._sampled_at = now
+            if self._used is not None:
+                self.peak_used = max(self.peak_used, self._used)
+        return self._used
+
+    def _pressure(self, extra: int = 0) -> Optional[int]:
+        """Projected memory use if it is above the high-water mark, else None"""
+        used = self.used()
+        if not self.enabled or used is None:
+            return None
+        # Running jobs may not have allocated their whole estimate yet, so it is
+        # counted on top of the sample; that errs on the safe side
+        projected = used + self.reserved + extra
+        return projected if projected > self.threshold else None
+
+    def check(self, retry_after: int):
+        """Fail fast while memory use is above the high-water mark"""
+        projected = self._pressure()
+        if projected is not None:
+            self.throttled += 1
+            raise MemoryPressureError(retry_after, projected, self.limit)
+
+    @contextmanager
+    def reserve(self, estimate: int) -> Iterator[None]:
+        """Hold estimate bytes while a job runs, waiting while it would not fit
+
+        A job always runs once nothing else is running, so one oversized job
+        cannot stall the queue.
+        """
+        with self._cond:
+            if self._running and self._pressure(estimate) is not None:
+                self.waits += 1
+                started = time.perf_counter()
+                # Memory is freed without notice (e.g. by other processes), so re-sample regularly
+                while self._running and self._pressure(estimate) is not None:
+                    self._cond.wait(self.sample_seconds)
+                self.wait_seconds += time.perf_counter() - started
+            self.reserved += estimate
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.reserved -= estimate
+                self._running -= 1
+                self._sampled_at = 0.0  # the job's memory is gone; sample again next time
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        used = self.used()
+        return {
+            "limit_mb": round(self.limit / 2**20) if self.enabled else None,
+            "high_watermark": self.high_watermark,
+            "used_mb": round(used / 2**20, 1) if used is not None else None,
+            "peak_used_mb": round(self.peak_used / 2**20, 1),
+            "reserved_mb": round(self.reserved / 2**20, 1),
+            "throttled": self.throttled,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
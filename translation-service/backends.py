@@ -0,0 +1,207 @@
+"""
+Inference backends for the NLLB translation service.
+
+The service only needs two operations from a model: run the encoder on a batch
+of token ids, and generate translations from those encoder outputs. Backends
+implement them on top of different engines and precisions:
+
+- torch       fp32 PyTorch (the reference path)
+- torch-int8  PyTorch with dynamic int8 quantization of the linear layers (CPU)
+- torch-bf16  PyTorch in bfloat16 (CPUs with AVX512-BF16/AMX, or CUDA)
+- onnx        ONNX Runtime graph exported with optimum (optional dependency)
+"""
+
+import os
+from typing import Any, Optional, cast
+import logging
+
+import torch  # type: ignore
+from transformers import AutoModelForSeq2SeqLM  # type: ignore
+from transformers.modeling_outputs import BaseModelOutput  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_model_path(model_name: str) -> str:
+    """Local snapshot directory for a hub model if it is already cached, else the name itself"""
+    if os.path.isdir(model_name):
+        return model_name
+    try:
+        from huggingface_hub import snapshot_download  # type: ignore
+        return snapshot_download(model_name, local_files_only=True)
+    except Exception:
+        # Not cached yet; from_pretrained downloads it
+        return model_name
+
+
+def cpu_supports_bf16() -> bool:
+    """Whether this CPU has native bfloat16 instructions"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def encoder_outputs(last_hidden_state: torch.Tensor) -> BaseModelOutput:
+    """Encoder hidden states wrapped the way generate() takes them"""
+    return BaseModelOutput(last_hidden_state=cast(torch.FloatTensor, last_hidden_state))
+
+
+class InferenceBackend:
+    """Encoder + generate interface the translation pipeline runs on"""
+
+    name = "base"
+    precision = "fp32"
+
+    def __init__(self, device: str):
+        self.device = torch.device(device)
+
+    def encode(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """Encoder hidden states for a padded batch"""
+        raise NotImplementedError
+
+    def generate(self, last_hidden_state: torch.Tensor, attention_mask: torch.Tensor, **kwargs) -> torch.Tensor:
+        """Generated token ids for previously encoded inputs (kwargs go to generate)"""
+        raise NotImplementedError
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the loaded weights"""
+        return 0
+
+    def describe(self) -> dict:
+        return {"name": self.name, "precision": self.precision, "device": str(self.device)}
+
+
+def _tensors(value):
+    """Tensors in a state_dict value (quantized layers store tuples of tensors)"""
+    if isinstance(value, torch.Tensor):
+        yield value
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _tensors(item)
+
+
+class TorchBackend(InferenceBackend):
+    """Hugging Face PyTorch model in fp32, dynamic int8 or bf16"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str, device: str, precision: str = "fp32"):
+        super().__init__(device)
+
+        if precision == "int8" and self.device.type != "cpu":
+            logger.warning("Dynamic int8 quantization is CPU-only, using fp32")
+            precision = "fp32"
+        if precision == "bf16":
+            supported = torch.cuda.is_bf16_supported() if self.device.type == "cuda" else cpu_supports_bf16()
+            if not supported:
+                logger.warning(f"bfloat16 is not supported on this {self.device.type.upper()}, using fp32")
+                precision = "fp32"
+
+        # low_cpu_mem_usage skips the random init and fills the parameters straight
+        # from the memory-mapped safetensors file; bf16 is loaded as bf16
+        model = AutoModelForSeq2SeqLM.from_pretrained(
+            model_name,
+            low_cpu_mem_usage=True,
+            torch_dtype=torch.bfloat16 if precision == "bf16" else torch.float32,
+        )
+        model.eval()
+
+        if precision == "int8":
+            # Linear layers hold almost all NLLB weights; int8 roughly quarters their size
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        self.model = model.to(self.device)
+        self.precision = precision
+
+    def memory_bytes(self) -> int:
+        # Tied embeddings appear several times in the state dict; count them once
+        seen = set()
+        total = 0
+        for value in self.model.state_dict().values():
+            for tensor in _tensors(value):
+                if tensor.data_ptr() not in seen:
+                    seen.add(tensor.data_ptr())
+                    total += tensor.numel() * tensor.element_size()
+        return total
+
+    def encode(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.model.get_encoder()(
+                input_ids=input_ids.to(self.device),
+                attention_mask=attention_mask.to(self.device),
+                return_dict=True
+            ).last_hidden_state
+
+    def generate(self, last_hidden_state: torch.Tensor, attention_mask: torch.Tensor, **kwargs) -> torch.Tensor:
+        # generate() expands encoder outputs for beam search in place, so give it a fresh wrapper
+        with torch.no_grad():
+            return self.model.generate(
+                encoder_outputs=encoder_outputs(last_hidden_state),
+                attention_mask=attention_mask.to(self.device),
+                **kwargs
+            )
+
+
+class OnnxBackend(InferenceBackend):
+    """Encoder/decoder graphs exported to ONNX and run with ONNX Runtime"""
+
+    name = "onnx"
+
+    def __init__(self, model_name: str, device: str, export_path: Optional[str] = None):
+        super().__init__(device)
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM  # type: ignore
+        except ImportError as e:
+            raise RuntimeError(
+                "The onnx backend needs optimum[onnxruntime]: pip install 'optimum[onnxruntime]'"
+            ) from e
+
+        provider = "CUDAExecutionProvider" if self.device.type == "cuda" else "CPUExecutionProvider"
+        if export_path and os.path.exists(os.path.join(export_path, "config.json")):
+            logger.info(f"Loading exported ONNX model from {export_path}")
+            self.model: Any = ORTModelForSeq2SeqLM.from_pretrained(export_path, provider=provider)
+        else:
+            # One-off export; saved so later starts skip it
+            logger.info(f"Exporting {model_name} to ONNX (first start only)...")
+            self.model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, provider=provider)
+            if export_path:
+                self.model.save_pretrained(export_path)
+        self.export_path = export_path
+
+    def memory_bytes(self) -> int:
+        if not self.export_path or not os.path.isdir(self.export_path):
+            return 0
+        return sum(
+            os.path.getsize(os.path.join(self.export_path, name))
+            for name in os.listdir(self.export_path)
+            if name.endswith((".onnx", ".onnx_data"))
+        )
+
+    def encode(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    def generate(self, last_hidden_state: torch.Tensor, attention_mask: torch.Tensor, **kwargs) -> torch.Tensor:
+        return self.model.generate(
+            encoder_outputs=encoder_outputs(last_hidden_state),
+            attention_mask=attention_mask,
+            **kwargs
+        )
+
+
+BACKENDS = ("torch", "torch-int8", "torch-bf16", "onnx")
+
+
+def create_backend(name: str, model_name: str, device: str, onnx_path: Optional[str] = None) -> InferenceBackend:
+    """Load the model with the configured backend"""
+    if name == "torch":
+        return TorchBackend(model_name, device, "fp32")
+    if name == "torch-int8":
+        return TorchBackend(model_name, device, "int8")
+    if name == "torch-bf16":
+        return TorchBackend(model_name, device, "bf16")
+    if name == "onnx":
+        return OnnxBackend(model_name, device, onnx_path)
+    raise ValueError(f"Unknown inference backend: {name} (use one of: {', '.join(BACKENDS)})")
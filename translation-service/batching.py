@@ -0,0 +1,233 @@
+"""
+Micro-batching scheduler for the NLLB translation service.
+
+Concurrent single-text requests that share a (source, target) language pair
+and decoding profile are collected for a short window and translated together in one padded
+``generate`` call, instead of one forward pass per request. A text that is
+already being translated for another request is not queued a second time.
+A batch runs at the highest priority of its requests and is only dropped
+once every request in it has missed its deadline. Batches are closed before
+they exceed a token budget or, when an estimator is given, a memory budget.
+"""
+
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+import profiling
+from dedup import InFlight
+from inference_queue import PRIORITIES, InferenceQueue, check_deadline, current_schedule
+
+logger = logging.getLogger(__name__)
+
+
+def make_length_buckets(
+    lengths: List[int],
+    max_batch_tokens: int,
+    max_batch_size: int,
+    max_batch_bytes: int = 0,
+    estimate_bytes: Optional[Callable[[int, int], int]] = None,
+) -> List[List[int]]:
+    """Group item indices into batches of similar token length
+
+    Items are sorted by length so each padded batch wastes little compute on
+    padding, and a batch is closed once longest-length x size would exceed the
+    token budget, or estimate_bytes(size, longest length) the memory budget.
+    Returns lists of indices into ``lengths``.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets: List[List[int]] = []
+    current: List[int] = []
+    for i in order:
+        # Sorted ascending, so the new item is always the longest in the bucket
+        padded = max(1, lengths[i]) * (len(current) + 1)
+        too_large = padded > max_batch_tokens or len(current) >= max_batch_size or (
+            max_batch_bytes > 0 and estimate_bytes is not None
+            and estimate_bytes(len(current) + 1, max(1, lengths[i])) > max_batch_bytes
+        )
+        if current and too_large:
+            buckets.append(current)
+            current = []
+        current.append(i)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+class _PendingBatch:
+    """Requests waiting to be flushed for one language pair"""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.max_tokens = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.flushed_at = 0.0
+        self.timings = profiling.PhaseTimings()  # replaced by the timings of the batch's own run
+        self.priority = PRIORITIES[-1]
+        self.deadline: Optional[float] = 0.0  # None once any request has no deadline
+
+    def padded_tokens(self, extra_tokens: int = 0) -> int:
+        """Token cost of the padded batch if one more item were added"""
+        longest = max(self.max_tokens, extra_tokens)
+        count = len(self.texts) + (1 if extra_tokens else 0)
+        return longest * count
+
+
+class MicroBatcher:
+    """Collects concurrent requests per language pair (profile and model) and runs them as one batch"""
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[str], str, str, str, str], List[str]],
+        count_tokens: Callable[[str], int],
+        window_ms: float,
+        max_batch_tokens: int,
+        max_batch_size: int,
+        queue: InferenceQueue,
+        in_flight: Optional[InFlight] = None,
+        max_batch_bytes: int = 0,
+        estimate_bytes: Optional[Callable[[int, int, Tuple[str, str, str, str]], int]] = None,
+    ):
+        self._run_batch = run_batch
+        self._count_tokens = count_tokens
+        self._window = window_ms / 1000.0
+        self._max_batch_tokens = max_batch_tokens
+        self._max_batch_size = max_batch_size
+        self._queue = queue
+        self._in_flight = in_flight
+        # estimate_bytes(size, longest tokens, (src, tgt, profile, model)) -> peak bytes of the generate call
+        self._max_batch_bytes = max_batch_bytes
+        self._estimate_bytes = estimate_bytes
+        self._pending: Dict[Tuple[str, str, str, str], _PendingBatch] = {}
+        self.batches_run = 0
+        self.items_run = 0
+        self.deduplicated = 0
+
+    async def submit(self, text: str, src_lang: str, tgt_lang: str, profile: str, model: str) -> str:
+        """Queue one text for translation and wait for its result"""
+        in_flight = self._in_flight
+        flight_key = None
+        if in_flight is not None:
+            flight_key = InFlight.key(text, src_lang, tgt_lang, profile, model)
+            priority, deadline = current_schedule()
+            owned, shared = in_flight.claim(flight_key, priority)
+            if shared is not None:
+                # Another request (of the same or a higher priority) is translating the same text right now
+                with profiling.phase("in_flight"):
+                    result = await InFlight.wait(shared, deadline)
+                if result is not None:
+                    self.deduplicated += 1
+                    return result
+            if not owned:
+                flight_key = None  # its owner gave up, or runs at a lower priority; translate without sharing
+
+        try:
+            result = await self._translate(text, src_lang, tgt_lang, profile, model)
+        except BaseException:
+            if in_flight is not None and flight_key is not None:
+                in_flight.abandon(flight_key)
+            raise
+        if in_flight is not None and flight_key is not None:
+            in_flight.resolve(flight_key, result)
+        return result
+
+    async def _translate(self, text: str, src_lang: str, tgt_lang: str, profile: str, model: str) -> str:
+        # Shed load (and work nobody will wait for) before the request joins a batch
+        priority, deadline = current_schedule()
+        check_deadline(deadline)
+        self._queue.check_capacity()
+
+        loop = asyncio.get_running_loop()
+        key = (src_lang, tgt_lang, profile, model)
+        tokens = max(1, self._count_tokens(text))
+
+        batch = self._pending.get(key)
+        if batch is not None and (
+            batch.padded_tokens(tokens) > self._max_batch_tokens or self._over_memory(key, batch, tokens)
+        ):
+            # Adding this text would overflow the token or memory budget - send what we have
+            self._flush(key)
+            batch = None
+
+        if batch is None:
+            batch = _PendingBatch()
+            self._pending[key] = batch
+            batch.timer = loop.call_later(self._window, self._flush, key)
+
+        future = loop.create_future()
+        joined = time.perf_counter()
+        batch.texts.append(text)
+        batch.futures.append(future)
+        batch.max_tokens = max(batch.max_tokens, tokens)
+        batch.priority = min(batch.priority, priority, key=PRIORITIES.index)
+        if batch.deadline is not None:
+            batch.deadline = None if deadline is None else max(batch.deadline, deadline)
+
+        if (
+            len(batch.texts) >= self._max_batch_size
+            or batch.padded_tokens() >= self._max_batch_tokens
+            or (self._max_batch_bytes > 0 and self._batch_bytes(key, batch) >= self._max_batch_bytes)
+        ):
+            self._flush(key)
+
+        result = await future
+        # Every request in the batch waited for the whole batch
+        profiling.add("batch_window", batch.flushed_at - joined)
+        profiling.merge(batch.timings.phases)
+        return result
+
+    def _batch_bytes(self, key: Tuple[str, str, str, str], batch: _PendingBatch, extra_tokens: int = 0) -> int:
+        """Estimated peak memory of the batch's generate call if one more item were added"""
+        if self._estimate_bytes is None:
+            return 0
+        count = len(batch.texts) + (1 if extra_tokens else 0)
+        return self._estimate_bytes(count, max(batch.max_tokens, extra_tokens), key)
+
+    def _over_memory(self, key: Tuple[str, str, str, str], batch: _PendingBatch, extra_tokens: int) -> bool:
+        return self._max_batch_bytes > 0 and self._batch_bytes(key, batch, extra_tokens) > self._max_batch_bytes
+
+    def _flush(self, key: Tuple[str, str, str, str]):
+        """Send the pending batch for a language pair to the model"""
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        batch.flushed_at = time.perf_counter()
+        asyncio.ensure_future(self._execute(key, batch))
+
+    async def _execute(self, key: Tuple[str, str, str, str], batch: _PendingBatch):
+        """Run one batch off the event loop and deliver each result to its caller"""
+        src_lang, tgt_lang, profile, model = key
+        # The batch's own timings, shared out to its requests by submit()
+        batch.timings = profiling.begin()
+        try:
+            results = await self._queue.run(
+                self._run_batch, batch.texts, src_lang, tgt_lang, profile, model, admitted=True,
+                cost=batch.padded_tokens(), priority=batch.priority, deadline=batch.deadline,
+                memory=self._batch_bytes(key, batch)
+            )
+        except Exception as e:
+            logger.error(f"Batch {src_lang} -> {tgt_lang} failed: {e}")
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.items_run += len(batch.texts)
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Batching counters for the health endpoint"""
+        return {
+            "batches": self.batches_run,
+            "items": self.items_run,
+            "avg_batch_size": round(self.items_run / self.batches_run, 2) if self.batches_run else 0.0,
+            "deduplicated": self.deduplicated,
+            "pending_pairs": len(self._pending),
+        }
@@ -0,0 +1,428 @@
+"""
+Offline benchmark for the NLLB translation service.
+
+Replays the bundled crypto-news corpus (benchmark_corpus.json) against the
+translation functions directly and against the HTTP API, sweeping batch size,
+beam count, torch threads and concurrency. Reports p50/p95/p99 latency and
+tokens per second as JSON that can be compared against an earlier run.
+
+By default it runs on a tiny randomly initialized model with the NLLB
+architecture and tokenizer layout, built on the fly, so it needs no network and
+no model download. Its translations are gibberish but the code path is the
+same, which is what regressions in the service show up in.
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+    python benchmark.py --model facebook/nllb-200-distilled-600M --beams 1,5 --threads 4
+    python benchmark.py --url http://localhost:8000 --modes http --model facebook/nllb-200-distilled-600M
+"""
+
+# pyright: reportMissingImports=false
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import torch  # type: ignore
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, "benchmark_corpus.json")
+TINY = "tiny"
+TINY_MAX_OUTPUT_TOKENS = 64
+
+# Fields that identify one benchmark configuration across runs
+CONFIG_FIELDS = ("mode", "corpus", "batch_size", "beams", "threads", "concurrency")
+
+logger = logging.getLogger("benchmark")
+
+
+def int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def load_corpus(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        corpus = json.load(f)
+    corpus["mixed"] = [text for pair in itertools.zip_longest(corpus["headlines"], corpus["paragraphs"]) for text in pair if text]
+    return corpus
+
+
+def build_tiny_model(path: str, corpus: dict) -> str:
+    """Save a small random NLLB-architecture model and tokenizer covering the corpus vocabulary"""
+    from tokenizers import Tokenizer, decoders, models, normalizers, pre_tokenizers  # type: ignore
+    from transformers import M2M100Config, M2M100ForConditionalGeneration, NllbTokenizerFast  # type: ignore
+
+    os.makedirs(path, exist_ok=True)
+    words = set()
+    splitter = pre_tokenizers.Whitespace()
+    for text in corpus["mixed"]:
+        words.update(word for word, _ in splitter.pre_tokenize_str(text.lower()))
+    vocab = {token: i for i, token in enumerate(["<s>", "<pad>", "</s>", "<unk>"] + sorted(words))}
+
+    word_level = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    # The tokenizers stubs declare these properties without setters
+    word_level.normalizer = normalizers.Lowercase()  # type: ignore
+    word_level.pre_tokenizer = splitter  # type: ignore
+    word_level.decoder = decoders.WordPiece()  # type: ignore
+    tokenizer_file = os.path.join(path, "word_level.json")
+    word_level.save(tokenizer_file)
+
+    # NllbTokenizerFast adds the 200 language codes and special tokens on top
+    tokenizer = NllbTokenizerFast(tokenizer_file=tokenizer_file)
+    tokenizer.save_pretrained(path)
+
+    config = M2M100Config(
+        vocab_size=len(tokenizer),
+        d_model=64,
+        encoder_layers=2,
+        decoder_layers=2,
+        encoder_attention_heads=4,
+        decoder_attention_heads=4,
+        encoder_ffn_dim=256,
+        decoder_ffn_dim=256,
+        max_position_embeddings=1024,
+        pad_token_id=vocab["<pad>"],
+        bos_token_id=vocab["<s>"],
+        eos_token_id=vocab["</s>"],
+        decoder_start_token_id=vocab["</s>"],
+    )
+    torch.manual_seed(0)
+    M2M100ForConditionalGeneration(config).save_pretrained(path)
+    return path
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(config: dict, latencies: List[float], input_tokens: int, output_tokens: int, texts: int, errors: int, seconds: float) -> dict:
+    return {
+        **config,
+        "requests": len(latencies),
+        "texts": texts,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "latency_ms": {
+            "mean": round(1000 * sum(latencies) / len(latencies), 1) if latencies else 0.0,
+            "p50": round(1000 * percentile(latencies, 50), 1),
+            "p95": round(1000 * percentile(latencies, 95), 1),
+            "p99": round(1000 * percentile(latencies, 99), 1),
+        },
+        "texts_per_second": round(texts / seconds, 2) if seconds else 0.0,
+        "input_tokens_per_second": round(input_tokens / seconds, 1) if seconds else 0.0,
+        "output_tokens_per_second": round(output_tokens / seconds, 1) if seconds else 0.0,
+    }
+
+
+def beam_profile(beams: int) -> str:
+    return f"bench-beams-{beams}"
+
+
+class Workload:
+    """Cycles through corpus texts and target languages so every run sends the same sequence"""
+
+    def __init__(self, texts: List[str], target_langs: List[str], batch_size: int):
+        self._texts = itertools.cycle(texts)
+        self._targets = itertools.cycle(target_langs)
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def next(self) -> Tuple[List[str], str]:
+        with self._lock:
+            return [next(self._texts) for _ in range(self._batch_size)], next(self._targets)
+
+
+class InProcessService:
+    """The translation service run by uvicorn on a local port, in this process"""
+
+    def __init__(self, model: str, backend: str, max_output_tokens: Optional[int], beams: List[int], workdir: str):
+        import server  # noqa: E402  (configured below, before the model loads)
+
+        self.server = server
+        server.MODEL_NAME = model
+        server.MODELS = ""
+        server.BACKEND = backend
+        server.ONNX_PATH = os.path.join(workdir, "onnx")
+        server.CACHE_ENABLED = False  # every request must reach the model
+        server.TM_ENABLED = False  # ... including repeated sentences
+        server.TM_PATH = os.path.join(workdir, "translation_memory.sqlite3")
+        server.JOBS_PATH = os.path.join(workdir, "jobs.sqlite3")
+        server.WARMUP_PAIRS = ""  # the benchmark warms up each configuration itself
+        if max_output_tokens:
+            server.MAX_OUTPUT_TOKENS = max_output_tokens
+            server.length_predictor.max_new_tokens = max_output_tokens
+        for count in beams:
+            server.DECODING_PROFILES[beam_profile(count)] = {"num_beams": count, "early_stopping": True} if count > 1 else {"num_beams": 1}
+
+        import uvicorn  # type: ignore
+
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._uvicorn = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._uvicorn.run, daemon=True)
+
+    def start(self, timeout: float = 600):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.server.startup_state["phase"] == "failed":
+                raise RuntimeError(f"Service failed to start: {self.server.startup_state['error']}")
+            try:
+                with urllib.request.urlopen(f"{self.url}/ready", timeout=5) as response:
+                    if response.status == 200:
+                        return
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("Service did not become ready in time")
+
+    def set_threads(self, threads: int):
+        """Set the torch thread count here and on the service's inference thread"""
+        torch.set_num_threads(threads)
+        loop = self.server.startup_task.get_loop()
+        job = self.server.inference_queue.run(torch.set_num_threads, threads, admitted=True, local=True)
+        asyncio.run_coroutine_threadsafe(job, loop).result()
+
+    def stop(self):
+        self._uvicorn.should_exit = True
+        self._thread.join(timeout=30)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post_json(url: str, payload: dict, timeout: float) -> dict:
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def run_direct(service: InProcessService, workload: Workload, source_lang: str, beams: int, requests: int, warmup: int, count_tokens: Callable[[str], int]) -> Tuple[List[float], int, int, int, int, float]:
+    """translate_texts called straight from this thread (no HTTP, queue or batcher)"""
+    server = service.server
+    src_code = server.require_nllb_code(source_lang)
+    latencies, input_tokens, output_tokens, texts = [], 0, 0, 0
+
+    started = 0.0
+    for i in range(warmup + requests):
+        if i == warmup:
+            started = time.perf_counter()
+        batch, target_lang = workload.next()
+        request_started = time.perf_counter()
+        outputs = server.translate_texts(batch, src_code, server.require_nllb_code(target_lang), beam_profile(beams))
+        if i >= warmup:
+            latencies.append(time.perf_counter() - request_started)
+            input_tokens += sum(count_tokens(text) for text in batch)
+            output_tokens += sum(count_tokens(text) for text in outputs)
+            texts += len(batch)
+    return latencies, input_tokens, output_tokens, texts, 0, time.perf_counter() - started
+
+
+def run_http(url: str, workload: Workload, source_lang: str, profile: str, concurrency: int, requests: int, warmup: int, count_tokens: Callable[[str], int], timeout: float) -> Tuple[List[float], int, int, int, int, float]:
+    """Requests to /translate (batch size 1) or /translate/batch from `concurrency` clients"""
+    lock = threading.Lock()
+    totals = {"latencies": [], "input": 0, "output": 0, "texts": 0, "errors": 0}
+
+    def one_request(record: bool):
+        batch, target_lang = workload.next()
+        options = {"source_lang": source_lang, "profile": profile}
+        started = time.perf_counter()
+        try:
+            if len(batch) == 1:
+                outputs = [post_json(f"{url}/translate", {"text": batch[0], "target_lang": target_lang, **options}, timeout)["translated_text"]]
+            else:
+                result = post_json(f"{url}/translate/batch", {"texts": batch, "target_langs": [target_lang], **options}, timeout)
+                outputs = result["translations"][target_lang]
+        except (urllib.error.URLError, OSError, KeyError, ValueError) as e:
+            logger.warning(f"Request failed: {e}")
+            if record:
+                with lock:
+                    totals["errors"] += 1
+            return
+        elapsed = time.perf_counter() - started
+        if record:
+            input_tokens = sum(count_tokens(text) for text in batch)
+            output_tokens = sum(count_tokens(text) for text in outputs)
+            with lock:
+                totals["latencies"].append(elapsed)
+                totals["input"] += input_tokens
+                totals["output"] += output_tokens
+                totals["texts"] += len(batch)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: one_request(False), range(warmup)))
+        started = time.perf_counter()
+        list(pool.map(lambda _: one_request(True), range(requests)))
+        seconds = time.perf_counter() - started
+    return totals["latencies"], totals["input"], totals["output"], totals["texts"], totals["errors"], seconds
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """Configurations whose p95 latency or output tokens/sec got worse by more than `tolerance`"""
+    def key(result: dict) -> tuple:
+        return tuple(result.get(field) for field in CONFIG_FIELDS)
+
+    previous = {key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        label = ", ".join(f"{field}={result.get(field)}" for field in CONFIG_FIELDS if result.get(field) is not None)
+        if before["latency_ms"]["p95"] and result["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {before['latency_ms']['p95']} ms -> {result['latency_ms']['p95']} ms")
+        if result["output_tokens_per_second"] < before["output_tokens_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: output tokens/s {before['output_tokens_per_second']} -> {result['output_tokens_per_second']}"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the NLLB translation service")
+    parser.add_argument("--model", default=TINY, help="checkpoint to benchmark, or 'tiny' for a random offline model (default)")
+    parser.add_argument("--backend", default="torch", help="inference backend (see NLLB_BACKEND)")
+    parser.add_argument("--url", help="benchmark an already running service instead of starting one (http mode only)")
+    parser.add_argument("--modes", default="direct,http", help="direct (translate_texts) and/or http")
+    parser.add_argument("--corpus", default="headlines,paragraphs", help="headlines, paragraphs and/or mixed")
+    parser.add_argument("--corpus-file", default=DEFAULT_CORPUS)
+    parser.add_argument("--batch-sizes", type=int_list, default=[1, 8])
+    parser.add_argument("--beams", type=int_list, default=[1, 4])
+    parser.add_argument("--threads", type=int_list, default=[1, os.cpu_count() or 1])
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8], help="parallel clients (http mode)")
+    parser.add_argument("--requests", type=int, default=20, help="measured requests per configuration")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests before each configuration")
+    parser.add_argument("--max-output-tokens", type=int, help=f"decode limit (default: {TINY_MAX_OUTPUT_TOKENS} for the tiny model)")
+    parser.add_argument("--timeout", type=float, default=600, help="per-request HTTP timeout in seconds")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="earlier report to compare against; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown for --compare")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    if args.url and "direct" in modes:
+        parser.error("--url only supports --modes http")
+    corpus = load_corpus(args.corpus_file)
+    corpora = [name.strip() for name in args.corpus.split(",") if name.strip()]
+
+    workdir = tempfile.TemporaryDirectory(prefix="nllb-bench-")
+    model = args.model
+    max_output_tokens = args.max_output_tokens
+    if model == TINY:
+        logger.info("Building tiny random model...")
+        model = build_tiny_model(os.path.join(workdir.name, "tiny-model"), corpus)
+        max_output_tokens = max_output_tokens or TINY_MAX_OUTPUT_TOKENS
+
+    # Client threads count tokens with their own tokenizer, not the service's
+    from transformers import AutoTokenizer  # type: ignore
+    tokenizer = AutoTokenizer.from_pretrained(model)
+    tokenizer_lock = threading.Lock()
+
+    def count_tokens(text: str) -> int:
+        with tokenizer_lock:
+            return len(tokenizer(text)["input_ids"])
+
+    service = None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        service = InProcessService(model, args.backend, max_output_tokens, args.beams, workdir.name)
+        logger.info(f"Starting service on {service.url}...")
+        service.start()
+        # The service logs every request; keep the benchmark output readable
+        logging.getLogger("server").setLevel(logging.WARNING)
+        url = service.url
+
+    results = []
+    try:
+        for mode, corpus_name, batch_size, beams in itertools.product(modes, corpora, args.batch_sizes, args.beams):
+            thread_counts = args.threads if service is not None else [None]
+            concurrencies = args.concurrency if mode == "http" else [1]
+            for threads, concurrency in itertools.product(thread_counts, concurrencies):
+                config = {
+                    "mode": mode,
+                    "corpus": corpus_name,
+                    "batch_size": batch_size,
+                    "beams": beams,
+                    "threads": threads,
+                    "concurrency": concurrency if mode == "http" else None,
+                }
+                logger.info(f"Running {config}")
+                if service is not None and threads is not None:
+                    service.set_threads(threads)
+                workload = Workload(corpus[corpus_name], corpus["target_langs"], batch_size)
+                if mode == "direct" and service is not None:  # --url is rejected with direct mode
+                    measured = run_direct(service, workload, corpus["source_lang"], beams, args.requests, args.warmup, count_tokens)
+                elif mode == "http":
+                    # A remote service only knows its own profiles: greedy is "fast", beam search "quality"
+                    profile = beam_profile(beams) if service is not None else ("fast" if beams == 1 else "quality")
+                    measured = run_http(url, workload, corpus["source_lang"], profile, concurrency, args.requests, args.warmup, count_tokens, args.timeout)
+                else:
+                    parser.error(f"Unknown mode: {mode}")
+                results.append(summarize(config, *measured))
+                logger.info(f"  p50 {results[-1]['latency_ms']['p50']} ms, {results[-1]['output_tokens_per_second']} output tokens/s")
+    finally:
+        if service is not None:
+            service.stop()
+        workdir.cleanup()
+
+    report = {
+        "meta": {
+            "model": args.model,
+            "backend": args.backend if service is not None else None,
+            "url": args.url,
+            "max_output_tokens": max_output_tokens,
+            "requests_per_config": args.requests,
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "cuda": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            return 1
+        logger.info(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Crypto-term protection engine for the NLLB translation service.
+
+All protected terms are compiled into a single trie-shaped regular expression,
+so a text is scanned once no matter how many terms there are. Matches are
+case-insensitive, respect word boundaries and prefer the longest term.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = "__CRYPTO_TERM_{}__"
+_PLACEHOLDER_PATTERN = re.compile(r"__CRYPTO_TERM_(\d+)__")
+
+# Glossary files alternate "term" and "definition" lines; terms are short
+_MAX_GLOSSARY_TERM_LENGTH = 60
+_PARENTHESIZED = re.compile(r"^(.*?)\s*\(([^)]+)\)$")
+# Glossary terms specific enough to protect: several words ("Bull market", "Proof-of-stake"),
+# or a capital after the first letter or a digit (acronyms and tickers such as "DAO", "DeFi", "ERC-20")
+_SPECIFIC_TERM = re.compile(r"\w[\s-]\w|.[A-Z]|\d")
+
+
+def build_trie_pattern(terms: Iterable[str]) -> str:
+    """Build a regex alternation shaped like a trie of the (lower-cased) terms
+
+    Shared prefixes are factored out, so the regex engine does not try every
+    term at every position. Longer continuations are tried first, which
+    together with the trailing word boundary gives longest-match semantics.
+    """
+    trie: dict = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node: dict) -> str:
+        end = "" in node
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not end:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if end else body
+
+    return render(trie)
+
+
+def read_terms_file(path: str) -> List[str]:
+    """Read protected terms from a file
+
+    Plain lists have one term per line (blank lines and # comments are
+    ignored). Glossaries with a definition line after each term are detected
+    automatically; "A / B" yields both names and "Name (ABBR)" yields both the
+    name and the abbreviation. Single words from a glossary are only kept if
+    they are acronyms or cased tickers: headwords like "Block", "Address" or
+    "Yield" are ordinary words that must still be translated.
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    lines = [line for line in lines if line and not line.startswith("#")]
+
+    is_glossary = any(len(line) > 2 * _MAX_GLOSSARY_TERM_LENGTH for line in lines)
+    if not is_glossary:
+        return lines
+
+    terms = []
+    for line, following in zip(lines, lines[1:]):
+        if len(line) > _MAX_GLOSSARY_TERM_LENGTH or line.endswith(".") or len(following) <= len(line):
+            continue
+        for name in line.split(" / "):
+            match = _PARENTHESIZED.match(name)
+            names = [match.group(1), match.group(2)] if match else [name]
+            terms.extend(n.strip() for n in names)
+    # Single letters are section headings, not terms
+    return [term for term in terms if len(term) > 1 and _SPECIFIC_TERM.search(term)]
+
+
+class TermProtector:
+    """Replaces protected terms with placeholders before translation"""
+
+    def __init__(self, builtin_terms: Iterable[str], path: Optional[str] = None, check_interval: float = 5.0):
+        self.builtin_terms = list(builtin_terms)
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._pattern: Optional[re.Pattern] = None
+        self.term_count = 0
+        self.version = ""
+        self.reload()
+
+    def reload(self) -> int:
+        """(Re)build the matcher from the built-in terms and the terms file"""
+        terms = list(self.builtin_terms)
+        mtime = None
+        if self.path:
+            try:
+                mtime = os.path.getmtime(self.path)
+                terms.extend(read_terms_file(self.path))
+            except OSError as e:
+                logger.error(f"Could not read crypto terms file {self.path}: {e}")
+
+        unique = sorted({term.lower() for term in terms if term.strip()})
+        pattern = None
+        if unique:
+            # A term may also touch a placeholder, as in "__KEEP_0__Bitcoin__KEEP_1__" for **Bitcoin**
+            pattern = re.compile(
+                r"(?:(?<!\w)|(?<=__))" + build_trie_pattern(unique) + r"(?:(?!\w)|(?=__))", re.IGNORECASE
+            )
+
+        with self._lock:
+            self._pattern = pattern
+            self._mtime = mtime
+            self.term_count = len(unique)
+            self.version = hashlib.sha256("\n".join(unique).encode("utf-8")).hexdigest()[:16]
+
+        logger.info(f"Loaded {len(unique)} protected crypto terms")
+        return len(unique)
+
+    def _maybe_reload(self):
+        """Pick up edits to the terms file without a restart"""
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def protect(self, text: str) -> Tuple[str, Dict[str, str]]:
+        """Replace protected terms with placeholders in a single pass"""
+        if not text:
+            return text, {}
+
+        self._maybe_reload()
+        pattern = self._pattern
+        if pattern is None:
+            return text, {}
+
+        placeholders: Dict[str, str] = {}
+        replacements: Dict[str, str] = {}
+
+        def substitute(match: re.Match) -> str:
+            original = match.group(0)
+            placeholder = placeholders.get(original)
+            if placeholder is None:
+                placeholder = PLACEHOLDER.format(len(placeholders))
+                placeholders[original] = placeholder
+                replacements[placeholder] = original
+            return placeholder
+
+        return pattern.sub(substitute, text), replacements
+
+    @staticmethod
+    def restore(text: str, replacements: Dict[str, str]) -> str:
+        """Put the original terms back in place of their placeholders"""
+        if not replacements:
+            return text
+        return _PLACEHOLDER_PATTERN.sub(lambda m: replacements.get(m.group(0), m.group(0)), text)
+
+    def stats(self) -> dict:
+        return {
+            "terms": self.term_count,
+            "version": self.version,
+            "file": self.path,
+        }
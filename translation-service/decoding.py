@@ -0,0 +1,97 @@
+"""
+Adaptive output length limits for the NLLB translation service.
+
+Instead of reserving the full output length for every input, the decode budget
+(max_new_tokens) is derived from the input length and an output/input length
+ratio learned per language pair from past translations.
+"""
+
+import math
+import threading
+from typing import Dict, List, Tuple
+
+
+class LengthPredictor:
+    """Learns how long translations are per language pair and sizes decode budgets"""
+
+    def __init__(
+        self,
+        default_ratio: float = 1.3,
+        margin: float = 1.5,
+        slack_tokens: int = 8,
+        min_new_tokens: int = 16,
+        max_new_tokens: int = 512,
+        smoothing: float = 0.05,
+    ):
+        self.default_ratio = default_ratio
+        self.margin = margin
+        self.slack_tokens = slack_tokens
+        self.min_new_tokens = min_new_tokens
+        self.max_new_tokens = max_new_tokens
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._ratios: Dict[Tuple[str, str], Tuple[float, int]] = {}  # pair -> (ratio, samples)
+        self.budget_hits = 0
+        # Worker processes record what they observe so the API process can replay it
+        self.recording = False
+        self._recorded: List[Tuple[str, str, int, int]] = []
+        self._recorded_hits = 0
+
+    def ratio(self, src_lang: str, tgt_lang: str) -> float:
+        """Current output/input token ratio estimate for a language pair"""
+        entry = self._ratios.get((src_lang, tgt_lang))
+        return entry[0] if entry is not None else self.default_ratio
+
+    def budget(self, src_lang: str, tgt_lang: str, input_tokens: int) -> int:
+        """max_new_tokens for an input of this length"""
+        expected = input_tokens * self.ratio(src_lang, tgt_lang) * self.margin
+        budget = math.ceil(expected) + self.slack_tokens
+        return max(self.min_new_tokens, min(budget, self.max_new_tokens))
+
+    def observe(self, src_lang: str, tgt_lang: str, input_tokens: int, output_tokens: int):
+        """Record the length of a finished (not cut off) translation"""
+        if input_tokens <= 0:
+            return
+        sample = output_tokens / input_tokens
+        with self._lock:
+            ratio, samples = self._ratios.get((src_lang, tgt_lang), (sample, 0))
+            samples += 1
+            # Plain average while there are few samples, then an exponential moving average
+            weight = max(1.0 / samples, self.smoothing)
+            self._ratios[(src_lang, tgt_lang)] = (ratio + weight * (sample - ratio), samples)
+            if self.recording:
+                self._recorded.append((src_lang, tgt_lang, input_tokens, output_tokens))
+
+    def record_budget_hit(self):
+        """A translation used its whole budget and had to be redone with the full limit"""
+        with self._lock:
+            self.budget_hits += 1
+            if self.recording:
+                self._recorded_hits += 1
+
+    def drain(self) -> Tuple[List[Tuple[str, str, int, int]], int]:
+        """Observations and budget hits recorded since the last drain"""
+        with self._lock:
+            recorded, hits = self._recorded, self._recorded_hits
+            self._recorded, self._recorded_hits = [], 0
+        return recorded, hits
+
+    def replay(self, drained: Tuple[List[Tuple[str, str, int, int]], int]):
+        """Apply what another process drained"""
+        observations, hits = drained
+        for observation in observations:
+            self.observe(*observation)
+        with self._lock:
+            self.budget_hits += hits
+
+    def stats(self) -> dict:
+        with self._lock:
+            ratios = sorted(self._ratios.items())
+        return {
+            "pairs": {
+                f"{src} -> {tgt}": {"ratio": round(ratio, 3), "samples": samples}
+                for (src, tgt), (ratio, samples) in ratios
+            },
+            "budget_hits": self.budget_hits,
+            "margin": self.margin,
+        }
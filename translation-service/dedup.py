@@ -0,0 +1,96 @@
+"""
+De-duplication of concurrent translations for the NLLB translation service.
+
+Feeds often send the same headline, byline or disclaimer several times, in one
+request or in requests that arrive together. The first request to need a
+(normalized text, language pair, profile, model) translation claims it; every
+other request that needs it while it is being computed waits for that result
+instead of running the model again, as long as the owner's work has the same
+or a higher priority (an interactive request never queues behind background
+work) and the wait ends by the waiter's own deadline.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from inference_queue import PRIORITIES, DeadlineExceededError, check_deadline
+from translation_cache import normalize_text
+
+FlightKey = Tuple[str, str, str, str, str]
+
+
+class InFlight:
+    """Translations currently being computed, shared with concurrent requests for the same text"""
+
+    def __init__(self):
+        # key -> (future, priority rank of the owner's work)
+        self._futures: Dict[FlightKey, Tuple[asyncio.Future, int]] = {}
+        self.claimed = 0
+        self.joined = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def key(text: str, src_lang: str, tgt_lang: str, profile: str, model: str) -> FlightKey:
+        return (normalize_text(text), src_lang, tgt_lang, profile, model)
+
+    def claim(self, key: FlightKey, priority: str) -> Tuple[bool, Optional[asyncio.Future]]:
+        """(owned, shared) for a translation the caller needs
+
+        owned: the caller now owns it and must resolve or abandon it.
+        shared: the future to wait for instead of translating. Neither is set
+        when lower-priority work owns the key; the caller then translates the
+        text itself at its own priority.
+        """
+        rank = PRIORITIES.index(priority)
+        entry = self._futures.get(key)
+        if entry is not None:
+            future, owner_rank = entry
+            if owner_rank <= rank:
+                self.joined += 1
+                return False, future
+            self.bypassed += 1
+            return False, None
+        self._futures[key] = (asyncio.get_running_loop().create_future(), rank)
+        self.claimed += 1
+        return True, None
+
+    def resolve(self, key: FlightKey, translation: str):
+        future, _ = self._futures.pop(key, (None, None))
+        if future is not None and not future.done():
+            future.set_result(translation)
+
+    def abandon(self, key: FlightKey):
+        """Give up an owned translation (failure or disconnect); waiters then translate it themselves"""
+        future, _ = self._futures.pop(key, (None, None))
+        if future is not None and not future.done():
+            future.cancel()
+
+    @staticmethod
+    async def wait(future: asyncio.Future, deadline: Optional[float] = None) -> Optional[str]:
+        """The shared translation, or None if its owner abandoned it
+
+        Raises DeadlineExceededError once the waiter's deadline (a
+        time.perf_counter() value) passes.
+        """
+        check_deadline(deadline)
+        try:
+            # Shielded, so a waiter that goes away does not cancel it for everyone else
+            shielded = asyncio.shield(future)
+            if deadline is None:
+                return await shielded
+            return await asyncio.wait_for(shielded, deadline - time.perf_counter())
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError("Deadline passed while waiting for the same text in another request")
+        except asyncio.CancelledError:
+            if future.cancelled():
+                return None
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._futures),
+            "claimed": self.claimed,
+            "joined": self.joined,
+            "bypassed": self.bypassed,
+        }
@@ -0,0 +1,194 @@
+"""
+gRPC interface of the NLLB translation service.
+
+Serves translation.proto next to the REST API, over the same inference engine:
+requests are handed to the REST handlers, so caching, translation memory,
+de-duplication, micro-batching and priorities behave exactly as they do for
+HTTP. A backend can keep one HTTP/2 connection open and push article segments
+through TranslateStream as they are written.
+
+grpcio (and grpcio-tools, which compiles translation.proto at startup) are
+optional; without them the service only speaks REST.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Tuple
+
+try:
+    import grpc  # type: ignore
+    from google.protobuf import json_format  # type: ignore
+except ImportError:
+    grpc = None
+    json_format = None
+
+logger = logging.getLogger(__name__)
+
+PROTO_FILE = "translation.proto"  # resolved against sys.path, like the sibling modules
+
+# Request fields (as a dict) -> response fields (as a dict)
+Handler = Callable[[dict], Awaitable[dict]]
+
+# HTTP status of a failed request -> gRPC status code name
+STATUS_CODES = {
+    400: "INVALID_ARGUMENT",
+    404: "NOT_FOUND",
+    413: "RESOURCE_EXHAUSTED",
+    422: "INVALID_ARGUMENT",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+
+def available() -> bool:
+    return grpc is not None
+
+
+def _grpc():
+    """The grpc module, or RuntimeError where grpcio is not installed"""
+    if grpc is None:
+        raise RuntimeError("grpcio is not installed")
+    return grpc
+
+
+def status_of(error: Exception) -> Tuple[int, str]:
+    """(HTTP-style status, message) of a failed translation"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status, str(getattr(error, "detail", error))
+    if isinstance(error, ValueError):  # request validation
+        return 400, str(error)
+    return 500, str(error)
+
+
+def grpc_code(status: int):
+    return getattr(_grpc().StatusCode, STATUS_CODES.get(status, "INTERNAL"))
+
+
+def request_fields(message, context) -> dict:
+    """Fields set on a request message; the call's own deadline applies when deadline_ms is not given"""
+    if json_format is None:
+        raise RuntimeError("protobuf is not installed")
+    fields = json_format.MessageToDict(message, preserving_proto_field_name=True)
+    remaining = context.time_remaining()
+    if "deadline_ms" not in fields and remaining is not None:
+        fields["deadline_ms"] = max(0, int(remaining * 1000))
+    return fields
+
+
+class GrpcServer:
+    """grpc.aio server for the Translation service, running on the REST server's event loop"""
+
+    def __init__(self, translate: Handler, translate_batch: Handler, max_message_bytes: int):
+        self.protos, self.services = _grpc().protos_and_services(PROTO_FILE)
+        self._translate = translate
+        self._translate_batch = translate_batch
+        self._max_message_bytes = max_message_bytes
+        self._server = None
+        self.calls = {"Translate": 0, "TranslateBatch": 0, "TranslateStream": 0}
+        self.stream_items = 0
+        self.errors = 0
+
+    async def start(self, address: str) -> int:
+        """Listen on host:port and return the bound port"""
+        self._server = _grpc().aio.server(options=[
+            ("grpc.max_receive_message_length", self._max_message_bytes),
+            ("grpc.max_send_message_length", self._max_message_bytes),
+        ])
+        self.services.add_TranslationServicer_to_server(self._servicer(), self._server)
+        port = self._server.add_insecure_port(address)
+        await self._server.start()
+        return port
+
+    async def stop(self, grace: Optional[float] = 5.0):
+        if self._server is not None:
+            await self._server.stop(grace)
+            self._server = None
+
+    async def _call(self, handler: Handler, fields: dict, context) -> dict:
+        try:
+            return await handler(fields)
+        except Exception as e:
+            self.errors += 1
+            status, message = status_of(e)
+            await context.abort(grpc_code(status), message)
+            raise  # abort() raises; never fall through to the callers' result handling
+
+    def _servicer(self):
+        server = self
+        protos = self.protos
+
+        class TranslationServicer(self.services.TranslationServicer):
+            async def Translate(self, request, context):
+                server.calls["Translate"] += 1
+                result = await server._call(server._translate, request_fields(request, context), context)
+                return protos.TranslateResponse(**result)
+
+            async def TranslateBatch(self, request, context):
+                server.calls["TranslateBatch"] += 1
+                result = await server._call(server._translate_batch, request_fields(request, context), context)
+                return protos.BatchResponse(
+                    translations={lang: protos.TextList(texts=texts) for lang, texts in result["translations"].items()},
+                    model_version=result["model_version"],
+                    deduplicated=result.get("deduplicated", 0),
+                )
+
+            async def TranslateStream(self, request_iterator, context):
+                server.calls["TranslateStream"] += 1
+                async for result in server._stream(request_iterator, context):
+                    yield result
+
+        return TranslationServicer()
+
+    async def _stream(self, request_iterator, context):
+        """Translate every (text, target) pushed on the stream concurrently and yield results as they finish"""
+        results: asyncio.Queue = asyncio.Queue()
+        tasks = set()  # translations still running; finished ones drop out so a long stream does not accumulate them
+
+        async def translate_one(item_id: str, fields: dict, target: str):
+            try:
+                result = await self._translate({**fields, "target_lang": target})
+                item = self.protos.StreamResult(
+                    id=item_id, target_lang=target, translated_text=result["translated_text"],
+                    model_version=result["model_version"], status=200,
+                )
+            except Exception as e:
+                self.errors += 1
+                status, message = status_of(e)
+                item = self.protos.StreamResult(id=item_id, target_lang=target, error=message, status=status)
+            await results.put(item)
+
+        async def read_requests():
+            try:
+                async for message in request_iterator:
+                    fields = request_fields(message, context)
+                    item_id = fields.pop("id", "")
+                    targets = fields.pop("target_langs", [])
+                    if not targets:
+                        await results.put(self.protos.StreamResult(id=item_id, error="target_langs is empty", status=400))
+                        continue
+                    self.stream_items += 1
+                    # Single translations, so concurrent segments share micro-batches
+                    for target in targets:
+                        task = asyncio.ensure_future(translate_one(item_id, fields, target))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                await asyncio.gather(*tasks)
+            finally:
+                await results.put(None)
+
+        reader = asyncio.ensure_future(read_requests())
+        try:
+            while True:
+                item = await results.get()
+                if item is None:
+                    break
+                yield item
+            await reader
+        finally:
+            reader.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {"calls": dict(self.calls), "stream_items": self.stream_items, "errors": self.errors}
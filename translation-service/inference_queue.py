@@ -0,0 +1,276 @@
+"""
+Bounded inference queue for the NLLB translation service.
+
+Blocking model work runs on dedicated worker threads so the asyncio event loop
+(and the health endpoints) stay responsive. With an executor each thread hands
+its jobs to a worker process instead of running them itself. The queue has a fixed capacity;
+once it is full new work is rejected immediately instead of piling up latency.
+
+Jobs carry a priority class and an optional deadline. Workers take the
+highest class first (interactive, then batch, then background) and, within a
+class, the job with the smallest estimated token cost; a job's cost counts
+down while it waits so long jobs still get their turn. Jobs whose deadline has
+passed are failed without running. With an admission controller, each job
+holds its estimated peak memory while it runs, and new work is refused while
+the service is short of memory.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import profiling
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "batch", "background")
+DEFAULT_PRIORITY = "interactive"
+
+# (priority, deadline) of the request being served; deadlines are time.perf_counter() values
+_schedule: contextvars.ContextVar = contextvars.ContextVar("schedule", default=(DEFAULT_PRIORITY, None))
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot accept more work"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised instead of running work whose deadline has already passed"""
+
+
+def check_priority(priority: str) -> str:
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority} (use one of: {', '.join(PRIORITIES)})")
+    return priority
+
+
+def current_schedule() -> Tuple[str, Optional[float]]:
+    """(priority, deadline) of the current request"""
+    return _schedule.get()
+
+
+@contextmanager
+def schedule(priority: str, deadline: Optional[float] = None) -> Iterator[None]:
+    """Run a block with inference jobs queued under this priority class and deadline"""
+    token = _schedule.set((check_priority(priority), deadline))
+    try:
+        yield
+    finally:
+        _schedule.reset(token)
+
+
+def set_schedule(priority: str, deadline: Optional[float] = None):
+    """Set the schedule for the rest of the current task (e.g. a streaming response body)"""
+    _schedule.set((check_priority(priority), deadline))
+
+
+def check_deadline(deadline: Optional[float]):
+    if deadline is not None and time.perf_counter() > deadline:
+        raise DeadlineExceededError("Deadline passed before the translation could run")
+
+
+class _Job:
+    __slots__ = ("fn", "args", "local", "future", "loop", "queued_at", "rank", "cost", "deadline", "memory")
+
+    def __init__(self, fn, args, local, future, loop, queued_at, rank, cost, deadline, memory):
+        self.fn = fn
+        self.args = args
+        self.local = local
+        self.future = future
+        self.loop = loop
+        self.queued_at = queued_at
+        self.rank = rank
+        self.cost = cost
+        self.deadline = deadline
+        self.memory = memory
+
+
+class InferenceQueue:
+    """Runs blocking inference calls on worker threads behind a bounded queue"""
+
+    def __init__(self, max_pending: int, workers: int = 1, aging_tokens_per_second: float = 500.0, admission=None):
+        self.max_pending = max_pending
+        self.workers = workers
+        self.aging_tokens_per_second = aging_tokens_per_second
+        self.admission = admission  # admission.AdmissionController, or None
+        self._jobs: List[_Job] = []
+        self._executor: Optional[Callable[[int, Callable, tuple], Any]] = None
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self._avg_job_seconds = 1.0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.completed_by_priority: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+
+    def start(self, executor: Optional[Callable[[int, Callable, tuple], Any]] = None):
+        """Start the worker threads
+
+        executor(worker_index, fn, args) runs a job somewhere else, e.g. in the
+        worker process owned by that thread; by default jobs run in-thread.
+        """
+        self._executor = executor
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, args=(i,), name=f"nllb-inference-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def depth(self) -> int:
+        """Jobs waiting for a worker"""
+        return len(self._jobs)
+
+    def is_full(self) -> bool:
+        return len(self._jobs) >= self.max_pending
+
+    def retry_after(self) -> int:
+        """Seconds a rejected caller should wait, estimated from the backlog"""
+        backlog = len(self._jobs) + self._running
+        return max(1, math.ceil(backlog * self._avg_job_seconds / self.workers))
+
+    def check_capacity(self):
+        """Fail fast if the queue is full (or memory is short)"""
+        if self.is_full():
+            self.rejected += 1
+            raise QueueFullError(self.retry_after())
+        if self.admission is not None:
+            self.admission.check(self.retry_after())
+
+    async def run(
+        self,
+        fn: Callable,
+        *args,
+        admitted: bool = False,
+        local: bool = False,
+        cost: float = 0.0,
+        priority: Optional[str] = None,
+        deadline: Optional[float] = None,
+        memory: int = 0,
+    ) -> Any:
+        """Run fn(*args) on a worker thread and wait for its result
+
+        Work that was already admitted (e.g. a batch assembled from requests
+        that passed check_capacity) is never rejected. Local jobs bypass the
+        executor (for arguments that cannot leave this process). The job's
+        queue wait and phase timings are added to the caller's request.
+        Priority and deadline default to the current request's schedule;
+        cost is the estimated token cost used to order jobs within a class,
+        memory the estimated peak bytes reserved while the job runs.
+        """
+        if priority is None:
+            priority, scheduled_deadline = current_schedule()
+            deadline = deadline if deadline is not None else scheduled_deadline
+        check_deadline(deadline)
+        if not admitted:
+            self.check_capacity()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = _Job(fn, args, local, future, loop, time.perf_counter(), PRIORITIES.index(priority), cost, deadline, memory)
+        with self._cond:
+            self._jobs.append(job)
+            self._cond.notify()
+        result, phases = await future
+        profiling.merge(phases)
+        self.completed_by_priority[priority] += 1
+        return result
+
+    def _next_job(self) -> _Job:
+        """Remove and return the job to run next (called with the lock held)"""
+        now = time.perf_counter()
+        best = min(
+            range(len(self._jobs)),
+            key=lambda i: (
+                self._jobs[i].rank,
+                self._jobs[i].cost - self.aging_tokens_per_second * (now - self._jobs[i].queued_at),
+                self._jobs[i].queued_at,
+            ),
+        )
+        return self._jobs.pop(best)
+
+    def _worker(self, index: int):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                job = self._next_job()
+                self._running += 1
+
+            if job.future.cancelled():
+                with self._cond:
+                    self._running -= 1
+                continue
+
+            started = time.perf_counter()
+            if job.deadline is not None and started > job.deadline:
+                # Nobody is waiting for this result any more; skip the model work
+                with self._cond:
+                    self._running -= 1
+                    self.expired += 1
+                job.loop.call_soon_threadsafe(
+                    _set_exception, job.future, DeadlineExceededError(f"Deadline passed after {started - job.queued_at:.2f}s in the queue")
+                )
+                continue
+
+            try:
+                with profiling.collect() as phases, self._reserve(job.memory):
+                    phases["queue"] = started - job.queued_at
+                    if self._executor is None or job.local:
+                        result = job.fn(*job.args)
+                    else:
+                        result = self._executor(index, job.fn, job.args)
+            except Exception as e:
+                job.loop.call_soon_threadsafe(_set_exception, job.future, e)
+            else:
+                job.loop.call_soon_threadsafe(_set_result, job.future, (result, phases))
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._cond:
+                    self._running -= 1
+                    self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+                    self.completed += 1
+
+    def _reserve(self, memory: int):
+        if self.admission is None or not memory:
+            return contextlib.nullcontext()
+        return self.admission.reserve(memory)
+
+    def stats(self) -> dict:
+        """Queue counters for the health endpoint"""
+        with self._cond:
+            waiting = {priority: 0 for priority in PRIORITIES}
+            for job in self._jobs:
+                waiting[PRIORITIES[job.rank]] += 1
+        return {
+            "depth": len(self._jobs),
+            "depth_by_priority": waiting,
+            "completed_by_priority": dict(self.completed_by_priority),
+            "expired": self.expired,
+            "running": self._running,
+            "capacity": self.max_pending,
+            "workers": self.workers,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_job_seconds": round(self._avg_job_seconds, 3),
+        }
+
+
+def _set_result(future: asyncio.Future, result: Any):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: Exception):
+    if not future.done():
+        future.set_exception(exc)
@@ -0,0 +1,247 @@
+"""
+Asynchronous translation jobs for the NLLB translation service.
+
+Large backfills are stored in a local SQLite queue and translated in the
+background, a chunk of texts at a time. Finished texts are committed as they
+complete, so a restarted service resumes a job where it left off.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+import logging
+
+from inference_queue import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobStore:
+    """Durable job queue backed by SQLite"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                target_langs TEXT NOT NULL,
+                options TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS job_texts (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                translations TEXT,
+                PRIMARY KEY (job_id, idx)
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def create(self, texts: List[str], source_lang: str, target_langs: List[str], options: dict) -> str:
+        """Store a new job and all of its texts"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute(
+                    """INSERT INTO jobs (id, status, source_lang, target_langs, options, total, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (job_id, QUEUED, source_lang, json.dumps(target_langs), json.dumps(options), len(texts), time.time()),
+                )
+                self._db.executemany(
+                    "INSERT INTO job_texts (job_id, idx, text) VALUES (?, ?, ?)",
+                    ((job_id, i, text) for i, text in enumerate(texts)),
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row is not None else None
+
+    def list(self, limit: int = 50, offset: int = 0) -> List[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def next_runnable(self) -> Optional[dict]:
+        """Oldest job that still has work (jobs interrupted by a restart come first)"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY status = ? DESC, created_at ASC LIMIT 1",
+                (RUNNING, QUEUED, RUNNING),
+            ).fetchone()
+        return _job_dict(row) if row is not None else None
+
+    def pending_texts(self, job_id: str, limit: int) -> List[tuple]:
+        """Next (index, text) pairs that have not been translated yet"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT idx, text FROM job_texts WHERE job_id = ? AND translations IS NULL ORDER BY idx LIMIT ?",
+                (job_id, limit),
+            ).fetchall()
+        return [(row["idx"], row["text"]) for row in rows]
+
+    def save_results(self, job_id: str, results: Dict[int, Dict[str, str]]):
+        """Commit translations for finished texts and advance the progress counter"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "UPDATE job_texts SET translations = ? WHERE job_id = ? AND idx = ?",
+                    ((json.dumps(translations, ensure_ascii=False), job_id, idx) for idx, translations in results.items()),
+                )
+                self._db.execute(
+                    "UPDATE jobs SET completed = completed + ? WHERE id = ?", (len(results), job_id)
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            if status == RUNNING:
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (status, now, job_id),
+                )
+            else:
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                    (status, error, now, job_id),
+                )
+
+    def results(self, job_id: str, offset: int, limit: int) -> List[dict]:
+        """A page of translated texts, in input order"""
+        with self._lock:
+            rows = self._db.execute(
+                """SELECT idx, translations FROM job_texts
+                WHERE job_id = ? AND translations IS NOT NULL AND idx >= ?
+                ORDER BY idx LIMIT ?""",
+                (job_id, offset, limit),
+            ).fetchall()
+        return [{"index": row["idx"], "translations": json.loads(row["translations"])} for row in rows]
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM job_texts WHERE job_id = ?", (job_id,))
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+def _job_dict(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["target_langs"] = json.loads(job["target_langs"])
+    job["options"] = json.loads(job["options"])
+    job["progress"] = round(job["completed"] / job["total"], 4) if job["total"] else 1.0
+    return job
+
+
+class JobRunner:
+    """Background task that works through stored jobs one chunk at a time"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        translate_chunk: Callable[[dict, List[str]], Awaitable[List[Dict[str, str]]]],
+        is_busy: Callable[[], bool],
+        chunk_size: int = 32,
+    ):
+        self.store = store
+        self._translate_chunk = translate_chunk
+        self._is_busy = is_busy
+        self.chunk_size = chunk_size
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def notify(self):
+        """Wake the runner after a job was submitted"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            job = self.store.next_runnable()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}")
+                self.store.set_status(job["id"], FAILED, str(e))
+
+    async def _run_job(self, job: dict):
+        job_id = job["id"]
+        self.store.set_status(job_id, RUNNING)
+        logger.info(f"Running translation job {job_id} ({job['completed']}/{job['total']} done)")
+
+        while True:
+            # Interactive requests always go first
+            while self._is_busy():
+                await asyncio.sleep(0.05)
+
+            current = self.store.get(job_id)
+            if current is None or current["status"] != RUNNING:
+                # Cancelled or deleted while running
+                return
+
+            pending = self.store.pending_texts(job_id, self.chunk_size)
+            if not pending:
+                self.store.set_status(job_id, COMPLETED)
+                logger.info(f"Translation job {job_id} completed")
+                return
+
+            try:
+                translations = await self._translate_chunk(job, [text for _, text in pending])
+            except QueueFullError as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            self.store.save_results(job_id, {idx: result for (idx, _), result in zip(pending, translations)})
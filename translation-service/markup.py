@@ -0,0 +1,421 @@
+"""
+HTML and Markdown splitting for document translation.
+
+A document is split into the same (text, translatable) pieces as document-mode
+segmentation: translatable pieces are the blocks of text a reader sees
+(paragraphs, headings, list items, table cells), everything else (block tags,
+code blocks, whitespace) is kept verbatim. Joining all pieces gives back the
+original document, so reassemble() rebuilds the translated one.
+
+Inline markup stays inside its block ("Bitcoin is **not** a <em>fad</em>" is
+one node), so a sentence is translated as a whole. Before translation the
+markup and the spans that must come through unchanged (URLs, e-mail
+addresses, @handles, numbers and prices) are replaced with placeholders, the
+same way as crypto terms, and the translated text around them is escaped for
+the document format.
+"""
+
+import html
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from segmentation import Piece
+
+FORMATS = ("html", "markdown", "text")
+
+KEEP_PLACEHOLDER = "__KEEP_{}__"
+_KEEP_PATTERN = re.compile(r"__KEEP_(\d+)__")
+
+# Spans kept verbatim inside text nodes, in priority order
+_PROTECTED = re.compile(
+    "|".join([
+        r"(?:https?://|www\.)[^\s<>\"'`]+?(?=[.,;:!?)\]]*(?:[\s<>\"'`]|$))",  # URLs, minus trailing punctuation
+        r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+",  # e-mail addresses
+        r"(?<![\w@])@\w{1,30}",  # @handles
+        r"(?<![\w$])\$[A-Z]{2,10}\b",  # $BTC-style cashtags
+        # Prices, percentages and plain numbers: $70,000 / 5% / 1.2bn / KES 500
+        r"(?:(?:[$€£¥₦₵]|\b(?:USD|EUR|GBP|KES|NGN|ZAR|GHS|UGX|TZS|ETB)\s?)"
+        r"\d+(?:[.,]\d+)*(?:\s?(?:[kKmMbB]n?|million|billion|trillion)\b)?"
+        r"|(?<![\w.])\d+(?:[.,]\d+)*(?:%|[kKmMbB]n?\b)?)",
+    ])
+)
+_LETTER = re.compile(r"[^\W\d_]")
+
+# HTML elements that stay inside the text node around them
+_INLINE_ELEMENTS = {
+    "a", "abbr", "b", "bdi", "bdo", "br", "cite", "code", "data", "del", "dfn", "em", "font", "i", "img",
+    "ins", "kbd", "mark", "q", "s", "samp", "small", "span", "strong", "sub", "sup", "time", "u", "var", "wbr",
+}
+# HTML elements whose content is never translated
+_SKIP_ELEMENTS = {"script", "style", "code", "pre", "kbd", "samp", "var", "textarea", "svg", "math", "noscript", "template"}
+_VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_TRANSLATABLE_ATTRIBUTES = {"alt", "title", "placeholder", "aria-label"}
+_TRANSLATABLE_META = {"description", "og:title", "og:description", "twitter:title", "twitter:description"}
+
+_HTML_TOKEN = re.compile(
+    r"<!--.*?-->|<!\[CDATA\[.*?\]\]>|<![^>]*>|<\?.*?>"
+    r"|</?[a-zA-Z][\w:-]*(?:\s+[^\s=/>]+(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'>]+))?)*\s*/?>",
+    re.S,
+)
+_TAG_NAME = re.compile(r"</?([a-zA-Z][\w:-]*)")
+_ATTRIBUTE = re.compile(r"([^\s=/>]+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'>]+)))?")
+
+# Markdown block syntax
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s")
+_VERBATIM_LINE = re.compile(
+    r"^\s{0,3}(?:\[[^\]]+\]:\s*\S+.*"  # link reference definitions
+    r"|([-*_])(?:\s*\1){2,}\s*"  # horizontal rules
+    r"|\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?\s*)$"  # table delimiter rows
+)
+_LINE_PREFIX = re.compile(r"^\s*(?:>\s?)*\s*(?:#{1,6}\s+|(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s+)?)?")
+_HTML_LINE = re.compile(r"^\s*</?[a-zA-Z!]")
+_TABLE_CELL_SPLIT = re.compile(r"((?<!\\)\|)")
+
+# Markdown inline syntax: backslash escapes, code spans, link/image openers and
+# their targets, autolinks, inline HTML and emphasis markers are markup, the rest is text
+_MARKDOWN_INLINE = re.compile(
+    r"\\[!-/:-@\[-`{-~]"  # backslash escapes
+    r"|(`+)[^`]*?\1"  # code spans
+    r"|!?\["  # link or image text starts
+    r"|\](?:\([^)]*\)|\[[^\]]*\])?"  # ...and ends, with its target
+    r"|<(?:https?://|mailto:)[^>]+>"  # autolinks
+    r"|</?[a-zA-Z][^>]*>"  # inline HTML
+    r"|\*{1,3}|~~|(?<!\w)_{1,3}|_{1,3}(?!\w)"  # emphasis markers
+)
+# Characters escaped in translated Markdown text so they are not read as markup
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_\[])")
+
+
+def detect_format(document: str) -> str:
+    """Guess whether a document is HTML, Markdown or plain text"""
+    # Markdown may embed HTML blocks, so its own block syntax is checked first
+    if re.search(r"^\s{0,3}(?:#{1,6}\s|```|~~~)|\[[^\]]+\]\([^)]+\)", document, re.M):
+        return "markdown"
+    if re.search(r"^\s*<(?:!doctype|html|head|body|p|div|h[1-6]|article|section|ul|ol|table|blockquote)\b", document, re.I | re.M):
+        return "html"
+    if re.search(r"^\s{0,3}(?:>\s|[-*+]\s)|\*\*[^*]+\*\*", document, re.M):
+        return "markdown"
+    return "text"
+
+
+def protect_spans(node: str, fmt: str = "text") -> Tuple[str, Dict[str, str]]:
+    """Replace inline markup, URLs, e-mail addresses, handles, numbers and prices with placeholders
+
+    Returns the text to translate and {placeholder: what goes back into the document}.
+    """
+    replacements: Dict[str, str] = {}
+
+    def keep(value: str) -> str:
+        placeholder = KEEP_PLACEHOLDER.format(len(replacements))
+        replacements[placeholder] = value
+        return placeholder
+
+    parts = []
+    for segment, is_markup in _inline_markup(node, fmt):
+        if is_markup:
+            parts.append(keep(segment))
+        else:
+            # HTML text is translated with its entities decoded, so kept spans are re-encoded
+            parts.append(_PROTECTED.sub(
+                lambda m: keep(html.escape(m.group(0)) if fmt == "html" else m.group(0)),
+                _unescape(segment, fmt),
+            ))
+    return "".join(parts), replacements
+
+
+def restore_spans(text: str, replacements: Dict[str, str], fmt: str = "text") -> Optional[str]:
+    """Escape a translated node for the document format and put its placeholders back,
+    or None if the translation lost any of them"""
+    if any(placeholder not in text for placeholder in replacements):
+        return None
+    parts = []
+    start = 0
+    for match in _KEEP_PATTERN.finditer(text):
+        parts.append(escape(text[start:match.start()], fmt))
+        parts.append(replacements.get(match.group(0), escape(match.group(0), fmt)))
+        start = match.end()
+    parts.append(escape(text[start:], fmt))
+    return "".join(parts)
+
+
+def escape(text: str, fmt: str) -> str:
+    """Escape translated text for the document format"""
+    if fmt == "html":
+        return html.escape(text)
+    if fmt == "markdown":
+        return _MARKDOWN_SPECIAL.sub(r"\\\1", text)
+    return text
+
+
+def _unescape(text: str, fmt: str) -> str:
+    return html.unescape(text) if fmt == "html" else text
+
+
+def split_markup(document: str, fmt: str) -> List[Piece]:
+    """Split an HTML or Markdown document into text nodes and verbatim markup"""
+    if fmt == "html":
+        return _merge(_split_html(document))
+    if fmt == "markdown":
+        return _merge(_split_markdown(document))
+    raise ValueError(f"Unknown document format: {fmt} (use one of: {', '.join(FORMATS)})")
+
+
+def _inline_markup(node: str, fmt: str) -> List[Tuple[str, bool]]:
+    """(segment, is markup) pieces of a node, with adjacent markup joined into one segment"""
+    if fmt == "html":
+        segments = _html_inline(node)
+    elif fmt == "markdown":
+        segments = []
+        start = 0
+        for match in _MARKDOWN_INLINE.finditer(node):
+            segments.append((node[start:match.start()], False))
+            segments.append((match.group(0), True))
+            start = match.end()
+        segments.append((node[start:], False))
+    else:
+        segments = [(node, False)]
+
+    joined: List[Tuple[str, bool]] = []
+    for segment, is_markup in segments:
+        if not segment:
+            continue
+        if is_markup and joined and joined[-1][1]:
+            joined[-1] = (joined[-1][0] + segment, True)
+        else:
+            joined.append((segment, is_markup))
+    return joined
+
+
+def _html_inline(node: str) -> List[Tuple[str, bool]]:
+    """Tags of an HTML node as markup; an element whose content is not translated is markup as a whole"""
+    segments: List[Tuple[str, bool]] = []
+    skipping: List[str] = []
+    start = 0
+    for match in _HTML_TOKEN.finditer(node):
+        if not skipping:
+            segments.append((node[start:match.start()], False))
+            start = match.start()
+        tag = match.group(0)
+        name_match = _TAG_NAME.match(tag)
+        if name_match is not None:
+            name = name_match.group(1).lower()
+            if tag.startswith("</"):
+                if skipping and skipping[-1] == name:
+                    skipping.pop()
+            elif _opens(tag, name) and (
+                (skipping and name == skipping[-1])
+                or (not skipping and _skips(name, dict(_attributes(tag, name_match.end()))))
+            ):
+                skipping.append(name)
+        if not skipping:
+            segments.append((node[start:match.end()], True))
+            start = match.end()
+    segments.append((node[start:], bool(skipping)))
+    return segments
+
+
+def _has_text(node: str, fmt: str) -> bool:
+    """Whether a node has letters to translate outside its markup and kept spans"""
+    text = "".join(_unescape(segment, fmt) for segment, is_markup in _inline_markup(node, fmt) if not is_markup)
+    return _LETTER.search(_PROTECTED.sub("", text)) is not None
+
+
+def _text_pieces(text: str, fmt: str) -> List[Piece]:
+    """A run of text as verbatim edges around one node (verbatim if nothing to translate)"""
+    stripped = text.strip()
+    if not stripped or not _has_text(stripped, fmt):
+        return [(text, False)] if text else []
+    lead = text[:len(text) - len(text.lstrip())]
+    trail = text[len(text.rstrip()):]
+    segments = _inline_markup(stripped, fmt)
+    if len(segments) == 3 and segments[0][1] and segments[2][1]:
+        # Markup around the whole node (a link, an emphasized line) stays outside it
+        return [(lead + segments[0][0], False)] + _text_pieces(segments[1][0], fmt) + [(segments[2][0] + trail, False)]
+    pieces: List[Piece] = [(lead, False)] if lead else []
+    pieces.append((stripped, True))
+    if trail:
+        pieces.append((trail, False))
+    return pieces
+
+
+def _merge(pieces: List[Piece]) -> List[Piece]:
+    """Join adjacent verbatim pieces"""
+    merged: List[Piece] = []
+    for text, translatable in pieces:
+        if not translatable and merged and not merged[-1][1]:
+            merged[-1] = (merged[-1][0] + text, False)
+        elif text or translatable:
+            merged.append((text, translatable))
+    return merged
+
+
+def _opens(tag: str, name: str) -> bool:
+    return name not in _VOID_ELEMENTS and not tag.endswith("/>")
+
+
+def _skips(name: str, attributes: Dict[str, str]) -> bool:
+    """Whether an element's content is kept verbatim"""
+    return (
+        name in _SKIP_ELEMENTS
+        or attributes.get("translate", "").lower() == "no"
+        or "notranslate" in attributes.get("class", "").split()
+    )
+
+
+def _split_html(document: str) -> List[Piece]:
+    pieces: List[Piece] = []
+    skipping: List[str] = []  # open elements whose content stays verbatim
+    inline_skip = False  # the verbatim element is part of a text node
+    node_start = 0  # where the text node being collected starts
+    for match in _HTML_TOKEN.finditer(document):
+        tag = match.group(0)
+        name_match = _TAG_NAME.match(tag)
+        if skipping:
+            if name_match is not None:
+                name = name_match.group(1).lower()
+                if tag.startswith("</"):
+                    if skipping[-1] == name:
+                        skipping.pop()
+                elif name == skipping[-1] and _opens(tag, name):
+                    skipping.append(name)  # nested element of the same name
+            if not skipping and not inline_skip:
+                pieces.append((document[node_start:match.end()], False))
+                node_start = match.end()
+            continue
+
+        if name_match is None:  # comments, doctype, processing instructions
+            pieces.extend(_text_pieces(document[node_start:match.start()], "html"))
+            pieces.append((tag, False))
+            node_start = match.end()
+            continue
+        name = name_match.group(1).lower()
+        attributes = {} if tag.startswith("</") else {key.lower(): value for key, value in _attributes(tag, name_match.end())}
+        if not tag.startswith("</") and _opens(tag, name) and _skips(name, attributes):
+            inline_skip = name in _INLINE_ELEMENTS
+            if not inline_skip:
+                pieces.extend(_text_pieces(document[node_start:match.start()], "html"))
+                node_start = match.start()
+            skipping.append(name)
+            continue
+        if name in _INLINE_ELEMENTS and not _translatable_attributes(name, attributes) & attributes.keys():
+            continue  # stays in the text node
+
+        pieces.extend(_text_pieces(document[node_start:match.start()], "html"))
+        pieces.extend(_split_tag(tag, name, attributes) if not tag.startswith("</") else [(tag, False)])
+        node_start = match.end()
+
+    rest = document[node_start:]
+    pieces.extend([(rest, False)] if skipping and not inline_skip else _text_pieces(rest, "html"))
+    return pieces
+
+
+def _attributes(tag: str, start: int):
+    """(name, value) pairs of a tag's attributes, which start after its name"""
+    for match in _ATTRIBUTE.finditer(tag, start):
+        value = next((group for group in match.groups()[1:] if group is not None), "")
+        yield match.group(1), value
+
+
+def _translatable_attributes(name: str, attributes: Dict[str, str]) -> Set[str]:
+    translatable = set(_TRANSLATABLE_ATTRIBUTES)
+    if name == "meta" and (attributes.get("name") or attributes.get("property", "")).lower() in _TRANSLATABLE_META:
+        translatable.add("content")
+    return translatable
+
+
+def _split_tag(tag: str, name: str, attributes: Dict[str, str]) -> List[Piece]:
+    """A start tag, with translatable attribute values (alt, title, meta descriptions) as nodes"""
+    translatable = _translatable_attributes(name, attributes)
+    pieces: List[Piece] = []
+    start = 0
+    for match in _ATTRIBUTE.finditer(tag, 1 + len(name)):  # after "<name"
+        if match.group(1).lower() not in translatable:
+            continue
+        for group in (2, 3):  # quoted values only
+            if match.group(group) is not None:
+                pieces.append((tag[start:match.start(group)], False))
+                pieces.extend(_text_pieces(match.group(group), "html"))
+                start = match.end(group)
+    pieces.append((tag[start:], False))
+    return pieces
+
+
+def _split_markdown(document: str) -> List[Piece]:
+    pieces: List[Piece] = []
+    lines = document.split("\n")
+    fence = None
+    previous_blank = True
+    in_code = False
+    block: List[str] = []  # lines of the paragraph or list item being collected
+
+    def end_block():
+        if block:
+            pieces.extend(_text_pieces("\n".join(block), "markdown"))
+            block.clear()
+
+    # YAML front matter stays verbatim
+    first = 0
+    if lines and lines[0].strip() == "---":
+        for i in range(1, len(lines)):
+            if lines[i].strip() in ("---", "..."):
+                pieces.append(("\n".join(lines[:i + 1]), False))
+                first = i + 1
+                break
+
+    for i in range(first, len(lines)):
+        line = lines[i]
+        fence_match = _FENCE.match(line)
+        blank = not line.strip()
+        # Indented code blocks follow a blank line (or more code); nested list items are not code
+        code = (
+            fence is None
+            and not blank
+            and (line.startswith("    ") or line.startswith("\t"))
+            and (previous_blank or in_code)
+            and not _LIST_ITEM.match(line)
+        )
+        prefix_match = _LINE_PREFIX.match(line)  # every group is optional, so it always matches
+        prefix = prefix_match.group(0) if prefix_match else ""
+        text_line = not (
+            fence is not None or fence_match or blank or code
+            or _VERBATIM_LINE.match(line) or _HTML_LINE.match(line) or line.lstrip().startswith("|")
+        )
+        if block and text_line and not prefix.strip():
+            block.append(line)  # a paragraph continues on the next line
+            previous_blank = in_code = False
+            continue
+        end_block()
+        if i > 0:
+            pieces.append(("\n", False))
+
+        if fence is not None:
+            if fence_match and fence_match.group(1)[0] == fence[0] and len(fence_match.group(1)) >= len(fence):
+                fence = None
+            pieces.append((line, False))
+            continue
+        if fence_match:
+            fence = fence_match.group(1)
+            pieces.append((line, False))
+            continue
+
+        in_code = code
+        previous_blank = blank
+        if blank or in_code or _VERBATIM_LINE.match(line):
+            pieces.append((line, False))
+        elif _HTML_LINE.match(line):
+            pieces.extend(_split_html(line))
+        elif line.lstrip().startswith("|"):
+            for cell in _TABLE_CELL_SPLIT.split(line):
+                if cell == "|":
+                    pieces.append((cell, False))
+                else:
+                    pieces.extend(_text_pieces(cell, "markdown"))
+        else:
+            pieces.append((prefix, False))
+            if "#" in prefix:
+                pieces.extend(_text_pieces(line[len(prefix):], "markdown"))  # headings are one line
+            else:
+                block.append(line[len(prefix):])
+    end_block()
+    return pieces
@@ -0,0 +1,195 @@
+"""
+Prometheus metrics for the NLLB translation service.
+
+A small dependency-free implementation of the Prometheus text exposition
+format: counters, histograms and gauges with labels. Values that already live
+elsewhere (queue depth, cache counters, model sizes) are read through collect
+callbacks at scrape time instead of being mirrored.
+
+Inference runs in forked worker processes when NLLB_WORKER_PROCESSES is set,
+so workers record their observations and the API process replays them, the
+same way as the length statistics.
+"""
+
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+LabelValues = Tuple[str, ...]
+M = TypeVar("M", bound="_Metric")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, registry: "Metrics", name: str, help: str, labels: Sequence[str], collect: Optional[Callable] = None):
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # collect() returns a value, or {label values: value} for labelled metrics
+        self._collect = collect
+        self._values: Dict[LabelValues, float] = {}
+        # A metric without labels has one series, exported as 0 until it changes (like prometheus_client)
+        if not self.labels:
+            self._values[()] = 0.0
+
+    def _update(self, key: LabelValues, value: float):
+        raise NotImplementedError
+
+    def _key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        if self._collect is not None:
+            collected = self._collect()
+            if not isinstance(collected, dict):
+                return [(self.name, "", collected)]
+            return [(self.name, _format_labels(self.labels, key), value) for key, value in sorted(collected.items())]
+        with self._registry._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in values]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, value: float = 1, **labels):
+        self._registry._apply(self.name, self._key(labels), value)
+
+    def _update(self, key: LabelValues, value: float):
+        self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, value: float = 1, **labels):
+        # Gauges describe this process only and are not replayed from workers
+        with self._registry._lock:
+            self._update(self._key(labels), value)
+
+    def dec(self, value: float = 1, **labels):
+        self.inc(-value, **labels)
+
+    def _update(self, key: LabelValues, value: float):
+        self._values[key] = self._values.get(key, 0) + value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry: "Metrics", name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # per-bucket counts, then sum and count
+        if not self.labels:
+            self._series[()] = [0.0] * (len(self.buckets) + 2)
+
+    def observe(self, value: float, **labels):
+        self._registry._apply(self.name, self._key(labels), value)
+
+    def _update(self, key: LabelValues, value: float):
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._registry._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        samples = []
+        for key, values in series:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _format_labels(self.labels, key, f'le="{_format_value(bound)}"'), cumulative))
+            samples.append((f"{self.name}_bucket", _format_labels(self.labels, key, 'le="+Inf"'), values[-1]))
+            samples.append((f"{self.name}_sum", _format_labels(self.labels, key), values[-2]))
+            samples.append((f"{self.name}_count", _format_labels(self.labels, key), values[-1]))
+        return samples
+
+
+class Metrics:
+    """Registry of metrics rendered together for /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        # Worker processes record observations so the API process can replay them
+        self.recording = False
+        self._recorded: List[Tuple[str, LabelValues, float]] = []
+
+    def _register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (), collect: Optional[Callable] = None) -> Counter:
+        return self._register(Counter(self, name, help, labels, collect))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), collect: Optional[Callable] = None) -> Gauge:
+        return self._register(Gauge(self, name, help, labels, collect))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, labels, buckets))
+
+    def _apply(self, name: str, key: LabelValues, value: float):
+        with self._lock:
+            self._metrics[name]._update(key, value)
+            if self.recording:
+                self._recorded.append((name, key, value))
+
+    def drain(self) -> List[Tuple[str, LabelValues, float]]:
+        """Counter and histogram observations recorded since the last drain"""
+        with self._lock:
+            recorded, self._recorded = self._recorded, []
+        return recorded
+
+    def replay(self, drained: List[Tuple[str, LabelValues, float]]):
+        """Apply what another process drained"""
+        with self._lock:
+            for name, key, value in drained:
+                self._metrics[name]._update(key, value)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A collector for a component that is not up yet
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
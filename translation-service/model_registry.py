@@ -0,0 +1,197 @@
+"""
+Multi-model registry for the NLLB translation service.
+
+Several NLLB checkpoints can be served side by side under named tiers (e.g.
+"standard" for the distilled 600M model and "premium" for 3.3B). Models are
+loaded on first use and evicted least-recently-used when loading another one
+would exceed the memory budget. The default tier is never evicted. A tier is
+loaded outside the registry lock, so requests for tiers that are already
+loaded are not held up by a load that takes minutes.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from backends import InferenceBackend
+
+logger = logging.getLogger(__name__)
+
+_WEIGHT_SUFFIXES = (".safetensors", ".bin", ".onnx", ".onnx_data")
+
+
+def parse_model_list(spec: str) -> "OrderedDict[str, str]":
+    """Parse "tier=checkpoint,tier=checkpoint" into an ordered {tier: checkpoint}"""
+    models: "OrderedDict[str, str]" = OrderedDict()
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        if "=" not in entry:
+            raise ValueError(f"Model entries look like tier=checkpoint, got: {entry}")
+        tier, checkpoint = entry.split("=", 1)
+        models[tier.strip()] = checkpoint.strip()
+    if not models:
+        raise ValueError("No models configured")
+    return models
+
+
+def parse_routes(spec: str) -> Dict[Tuple[str, str], str]:
+    """Parse "src:tgt=tier,*:tgt=tier" into {(src, tgt): tier}; "*" matches any language"""
+    routes = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        pair, tier = entry.split("=", 1)
+        src, tgt = pair.split(":", 1)
+        routes[(src.strip(), tgt.strip())] = tier.strip()
+    return routes
+
+
+def weights_size(path: str) -> int:
+    """Bytes of weight files in a local model directory (0 if unknown)"""
+    if not os.path.isdir(path):
+        return 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.endswith(_WEIGHT_SUFFIXES):
+                total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class _Entry:
+    def __init__(self, backend: InferenceBackend, memory_bytes: int, load_seconds: float):
+        self.backend = backend
+        self.memory_bytes = memory_bytes
+        self.load_seconds = load_seconds
+        self.uses = 0
+
+
+class ModelRegistry:
+    """Named model tiers, loaded lazily and evicted LRU under a memory budget"""
+
+    def __init__(
+        self,
+        models: "OrderedDict[str, str]",
+        load: Callable[[str], InferenceBackend],
+        resolve_path: Callable[[str], str],  # checkpoint -> local directory, for size estimates
+        memory_budget_mb: float = 0,
+        default: Optional[str] = None,
+    ):
+        self.models = models
+        self.default = default or next(iter(models))
+        if self.default not in models:
+            raise ValueError(f"Default model tier {self.default} is not configured")
+        self._load = load
+        self._resolve_path = resolve_path
+        self.memory_budget = int(memory_budget_mb * 2**20)
+        self._loaded: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._loading: Dict[str, threading.Event] = {}  # tier -> set once its load has finished (or failed)
+        self._lock = threading.Lock()
+        # Cleared once inference workers are forked: a tier loaded afterwards would be
+        # a private copy in every worker, outside the shared memory budget
+        self.allow_loading = True
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, tier: str) -> InferenceBackend:
+        """Backend for a tier, loading it (and evicting others) if necessary"""
+        while True:
+            with self._lock:
+                entry = self._loaded.get(tier)
+                if entry is not None:
+                    self._loaded.move_to_end(tier)
+                    entry.uses += 1
+                    return entry.backend
+                loading = self._loading.get(tier)
+                if loading is None:
+                    if not self.allow_loading:
+                        raise RuntimeError(f"Model tier '{tier}' is not loaded and can no longer be loaded")
+                    loading = self._loading[tier] = threading.Event()
+                    break
+            # Another thread is loading this tier; use its result (or try again if it failed)
+            loading.wait()
+
+        try:
+            entry = self._load_entry(tier)
+            with self._lock:
+                self._loaded[tier] = entry
+                self.loads += 1
+                # The estimate can be off (e.g. quantized weights); settle up with the real size
+                self._evict_for(0, keep=tier)
+                entry.uses += 1
+                return entry.backend
+        finally:
+            with self._lock:
+                del self._loading[tier]
+            loading.set()
+
+    def is_loaded(self, tier: str) -> bool:
+        return tier in self._loaded
+
+    def _load_entry(self, tier: str) -> _Entry:
+        """Load a tier (called without the lock held, once per tier at a time)"""
+        checkpoint = self.models[tier]
+        path = self._resolve_path(checkpoint)
+
+        # Make room first, using the size of the weight files as the estimate
+        with self._lock:
+            self._evict_for(weights_size(path), keep=tier)
+
+        logger.info(f"Loading model tier '{tier}': {checkpoint}")
+        started = time.perf_counter()
+        backend = self._load(checkpoint)
+        memory = backend.memory_bytes()
+        entry = _Entry(backend, memory, time.perf_counter() - started)
+        logger.info(f"Model tier '{tier}' loaded in {entry.load_seconds:.1f}s ({memory / 2**20:.0f} MB)")
+        return entry
+
+    def _evict_for(self, needed: int, keep: str):
+        """Evict least recently used tiers until `needed` more bytes fit in the budget"""
+        if not self.memory_budget:
+            return
+        for tier in list(self._loaded):
+            if self._used() + needed <= self.memory_budget:
+                return
+            if tier in (keep, self.default):
+                continue
+            entry = self._loaded.pop(tier)
+            self.evictions += 1
+            logger.info(f"Evicting model tier '{tier}' ({entry.memory_bytes / 2**20:.0f} MB) to stay within the memory budget")
+        if self._used() + needed > self.memory_budget:
+            logger.warning(f"Model memory budget exceeded: {(self._used() + needed) / 2**20:.0f} MB needed")
+
+    def _used(self) -> int:
+        return sum(entry.memory_bytes for entry in self._loaded.values())
+
+    def loaded_tiers(self) -> List[str]:
+        return list(self._loaded)
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Weight memory per loaded tier"""
+        return {tier: entry.memory_bytes for tier, entry in list(self._loaded.items())}
+
+    def stats(self) -> dict:
+        # No lock: a model load can hold it for minutes and /health must not wait
+        loaded = {
+            tier: {
+                "checkpoint": self.models[tier],
+                "memory_mb": round(entry.memory_bytes / 2**20, 1),
+                "load_seconds": round(entry.load_seconds, 2),
+                "uses": entry.uses,
+                **entry.backend.describe(),
+            }
+            for tier, entry in list(self._loaded.items())
+        }
+        return {
+            "default": self.default,
+            "tiers": dict(self.models),
+            "loaded": loaded,
+            "memory_budget_mb": round(self.memory_budget / 2**20) if self.memory_budget else None,
+            "memory_used_mb": round(self._used() / 2**20, 1),
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,229 @@
+"""
+Per-request phase timing and on-demand profiling for the NLLB translation service.
+
+Every request collects the time it spends per phase (crypto-term protection,
+queue wait, tokenization, encoder, generate, detokenization, ...). Request code
+records into a context variable; inference jobs run on queue threads or worker
+processes, so they record into a per-thread collector whose totals are merged
+back into every request the job served.
+
+A ProfileSession additionally runs the torch profiler or cProfile around the
+inference jobs of the next N requests and writes the traces to a directory.
+"""
+
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILER_MODES = ("torch", "cprofile")
+
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+_job = threading.local()
+
+
+class PhaseTimings:
+    """Seconds spent per phase while serving one request"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def merge(self, phases: Dict[str, float]):
+        for name, seconds in phases.items():
+            self.add(name, seconds)
+
+    def header(self) -> str:
+        """Server-Timing header value"""
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items())
+
+
+def begin() -> PhaseTimings:
+    """Start collecting phase timings for the current request (or task)"""
+    timings = PhaseTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def _current() -> Optional[Dict[str, float]]:
+    phases = getattr(_job, "phases", None)
+    if phases is not None:
+        return phases
+    timings = _request_timings.get()
+    return timings.phases if timings is not None else None
+
+
+def add(name: str, seconds: float):
+    """Record time spent in a phase (ignored outside a request or job)"""
+    phases = _current()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+def merge(phases: Dict[str, float]):
+    for name, seconds in phases.items():
+        add(name, seconds)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a block as one phase of the current request or job"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - started)
+
+
+@contextmanager
+def collect() -> Iterator[Dict[str, float]]:
+    """Collect the phases of an inference job run on this thread"""
+    previous = getattr(_job, "phases", None)
+    _job.phases = {}
+    try:
+        yield _job.phases
+    finally:
+        _job.phases = previous
+
+
+@contextmanager
+def capture(target: Optional[Tuple[str, str]]) -> Iterator[None]:
+    """Run a block under the torch profiler or cProfile and write the trace to target=(mode, path)"""
+    if target is None:
+        yield
+        return
+    mode, path = target
+    if mode == "torch":
+        import torch  # type: ignore
+
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        with torch.profiler.profile(activities=activities) as profiler:
+            yield
+        try:
+            profiler.export_chrome_trace(path)
+        except Exception as e:
+            logger.warning(f"Could not write torch profiler trace {path}: {e}")
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+
+
+class PhaseStats:
+    """Rolling per-phase latency summary over the most recent requests"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._phases: Dict[str, Deque[float]] = {}
+        self.requests = 0
+
+    def record(self, timings: PhaseTimings):
+        with self._lock:
+            self.requests += 1
+            for name, seconds in timings.phases.items():
+                samples = self._phases.get(name)
+                if samples is None:
+                    samples = self._phases[name] = deque(maxlen=self._window)
+                samples.append(seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            phases = {name: sorted(samples) for name, samples in self._phases.items()}
+        return {
+            "requests": self.requests,
+            "window": self._window,
+            "phases_ms": {
+                name: {
+                    "count": len(samples),
+                    "mean": round(1000 * sum(samples) / len(samples), 2),
+                    "p50": round(1000 * samples[len(samples) // 2], 2),
+                    "p95": round(1000 * samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+                }
+                for name, samples in phases.items()
+                if samples
+            },
+        }
+
+
+class ProfileSession:
+    """Profiler traces of the inference jobs run for the next N requests"""
+
+    def __init__(self, mode: str, requests: int, directory: str):
+        if mode not in PROFILER_MODES:
+            raise ValueError(f"Unknown profiler: {mode} (use one of: {', '.join(PROFILER_MODES)})")
+        os.makedirs(directory, exist_ok=True)
+        self.mode = mode
+        self.requests = requests
+        self.directory = directory
+        self.remaining = requests
+        self.jobs = 0
+        self.files: List[str] = []
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.remaining > 0
+
+    def next_job(self) -> Optional[Tuple[str, str]]:
+        """(mode, trace path) for an inference job, or None once the session is over"""
+        with self._lock:
+            if not self.active:
+                return None
+            self.jobs += 1
+            path = os.path.join(self.directory, f"job-{self.jobs:04d}.{'json' if self.mode == 'torch' else 'prof'}")
+            self.files.append(path)
+            return self.mode, path
+
+    def request_finished(self):
+        with self._lock:
+            if not self.active:
+                return
+            self.remaining -= 1
+            if self.active:
+                return
+            self.finished_at = time.time()
+        self._finish()
+
+    def _finish(self):
+        if self.mode == "cprofile":
+            # One combined report; jobs still running when the last request returned are left out
+            written = [path for path in self.files if os.path.exists(path)]
+            if written:
+                report = io.StringIO()
+                stats = pstats.Stats(*written, stream=report)
+                stats.dump_stats(os.path.join(self.directory, "combined.prof"))
+                stats.sort_stats("cumulative").print_stats(40)
+                with open(os.path.join(self.directory, "combined.txt"), "w") as f:
+                    f.write(report.getvalue())
+        logger.info(f"Profile of {self.requests} requests ({self.jobs} inference jobs) written to {self.directory}")
+
+    def describe(self) -> dict:
+        return {
+            "mode": self.mode,
+            "requests": self.requests,
+            "remaining": self.remaining,
+            "jobs": self.jobs,
+            "directory": self.directory,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
@@ -0,0 +1,207 @@
+"""
+Sentence segmentation for document-mode translation.
+
+Long inputs are split into paragraphs and sentences so each segment is a short,
+batch-friendly decode instead of one huge (and silently truncated) sequence.
+The whitespace between segments is kept so the translated document can be
+reassembled with its original layout. A segment that is still longer than the
+model's input limit (a long URL, CJK text without sentence punctuation) is cut
+by token count as a last resort, so nothing is silently truncated.
+"""
+
+import re
+from typing import Callable, List, Optional, Tuple
+
+# Sentence-final punctuation per script (NLLB codes end in the script name).
+# "spaced" marks only end a sentence when followed by whitespace (so 1.5 or
+# example.com stay intact); "unspaced" marks always end one.
+_TERMINATORS = {
+    "Latn": {"spaced": ".!?", "unspaced": ""},
+    "Ethi": {"spaced": ".!?", "unspaced": "።፧፨"},
+    "Arab": {"spaced": ".!?؟۔", "unspaced": ""},
+    "Hans": {"spaced": ".!?", "unspaced": "。！？"},
+    "Hant": {"spaced": ".!?", "unspaced": "。！？"},
+    "Jpan": {"spaced": ".!?", "unspaced": "。！？"},
+}
+_DEFAULT_TERMINATORS = {"spaced": ".!?", "unspaced": ""}
+
+# Closing quotes/brackets that stay attached to the sentence they end
+_CLOSERS = "\"'”’»)]"
+
+# Abbreviations that end in a period but do not end a sentence
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e",
+    "inc", "ltd", "co", "corp", "no", "u.s", "u.k", "jan", "feb", "mar", "apr",
+    "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec", "approx", "est",
+}
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_CLAUSE_BREAK = re.compile(r"(?<=[;:,])\s+")
+_SPACE_BREAK = re.compile(r"\s+")
+# Placeholders put in by markup and crypto-term protection (__KEEP_0__, __CRYPTO_TERM_0__)
+_PLACEHOLDER = re.compile(r"__[A-Z]+(?:_[A-Z]+)*_\d+__")
+
+# A piece is (text, translatable); untranslatable pieces are whitespace kept verbatim
+Piece = Tuple[str, bool]
+
+
+def _sentence_pattern(src_lang: str) -> re.Pattern:
+    script = src_lang.split("_")[-1] if "_" in src_lang else ""
+    terminators = _TERMINATORS.get(script, _DEFAULT_TERMINATORS)
+    closers = re.escape(_CLOSERS)
+    alternatives = [rf"[{re.escape(terminators['spaced'])}]+[{closers}]*(?=\s)"]
+    if terminators["unspaced"]:
+        alternatives.insert(0, rf"[{re.escape(terminators['unspaced'])}]+[{closers}]*")
+    return re.compile("(?:" + "|".join(alternatives) + r")(\s*)")
+
+
+def _is_abbreviation(sentence: str) -> bool:
+    """Whether a sentence candidate actually ends in an abbreviation or initial"""
+    words = sentence.rstrip(_CLOSERS).split()
+    if not words:
+        return False
+    last = words[-1].rstrip(".").lower()
+    return last in ABBREVIATIONS or (len(last) == 1 and last.isalpha())
+
+
+def split_sentences(paragraph: str, src_lang: str, max_chars: int) -> List[Piece]:
+    """Split one paragraph into sentences, keeping the whitespace between them"""
+    pieces: List[Piece] = []
+    start = 0
+    for match in _sentence_pattern(src_lang).finditer(paragraph):
+        gap_start = match.start(1)
+        sentence = paragraph[start:gap_start]
+        if not sentence.strip() or _is_abbreviation(sentence):
+            continue
+        pieces.extend(_limit_length(sentence, max_chars))
+        if match.group(1):
+            pieces.append((match.group(1), False))
+        start = match.end()
+
+    if start < len(paragraph):
+        pieces.extend(_limit_length(paragraph[start:], max_chars))
+    return pieces
+
+
+def _limit_length(sentence: str, max_chars: int) -> List[Piece]:
+    """Break run-on sentences at clause boundaries (or spaces) so no segment is too long"""
+    if len(sentence) <= max_chars:
+        return [(sentence, True)]
+    pieces: List[Piece] = []
+    for text, translatable in _pack(sentence, _CLAUSE_BREAK, max_chars):
+        if translatable and len(text) > max_chars:
+            pieces.extend(_pack(text, _SPACE_BREAK, max_chars))
+        else:
+            pieces.append((text, translatable))
+    return pieces
+
+
+def _pack(text: str, separator: re.Pattern, max_chars: int) -> List[Piece]:
+    """Split text at separator matches and greedily merge the parts up to max_chars"""
+    parts: List[Tuple[str, str]] = []  # (chunk, whitespace after it)
+    start = 0
+    for match in separator.finditer(text):
+        parts.append((text[start:match.start()], match.group(0)))
+        start = match.end()
+    parts.append((text[start:], ""))
+
+    pieces: List[Piece] = []
+    current, current_gap = "", ""
+    for chunk, gap in parts:
+        if current and len(current) + len(current_gap) + len(chunk) > max_chars:
+            pieces.append((current, True))
+            pieces.append((current_gap, False))
+            current = chunk
+        else:
+            current = current + current_gap + chunk if current else chunk
+        current_gap = gap
+    if current:
+        pieces.append((current, True))
+    if current_gap:
+        pieces.append((current_gap, False))
+    return pieces
+
+
+def _split_tokens(text: str, count_tokens: Callable[[str], int], max_tokens: int) -> List[Piece]:
+    """Cut a segment into the longest pieces within max_tokens, at whitespace where possible"""
+    pieces: List[Piece] = []
+    while len(text) > 1 and count_tokens(text) > max_tokens:
+        # Longest prefix that fits (token counts grow with the prefix length)
+        low, high = 1, len(text) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        cut = low
+        inside = next((match for match in _PLACEHOLDER.finditer(text) if match.start() < cut < match.end()), None)
+        if inside is not None:
+            cut = inside.start() or inside.end()
+
+        gaps = list(_SPACE_BREAK.finditer(text, cut // 2, cut))
+        if gaps and gaps[-1].start() > 0:
+            pieces.append((text[:gaps[-1].start()], True))
+            pieces.append((gaps[-1].group(0), False))
+            text = text[gaps[-1].end():]
+        else:
+            pieces.append((text[:cut], True))
+            text = text[cut:]
+    pieces.append((text, True))
+    return pieces
+
+
+def split_document(
+    text: str,
+    src_lang: str,
+    max_chars: int = 1000,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    max_tokens: int = 0,
+) -> List[Piece]:
+    """Split a document into translatable segments and verbatim whitespace
+
+    With count_tokens, segments over max_tokens are cut further. Joining the
+    text of all pieces gives back the original document exactly.
+    """
+    pieces: List[Piece] = []
+    start = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        pieces.extend(_split_paragraph(text[start:match.start()], src_lang, max_chars))
+        pieces.append((match.group(0), False))
+        start = match.end()
+    pieces.extend(_split_paragraph(text[start:], src_lang, max_chars))
+
+    if count_tokens is not None:
+        pieces = [
+            piece
+            for segment, translatable in pieces
+            for piece in (_split_tokens(segment, count_tokens, max_tokens) if translatable else [(segment, False)])
+        ]
+    return pieces
+
+
+def _split_paragraph(paragraph: str, src_lang: str, max_chars: int) -> List[Piece]:
+    """Split a paragraph, treating leading/trailing whitespace and single line breaks as layout"""
+    pieces: List[Piece] = []
+    for i, line in enumerate(paragraph.split("\n")):
+        if i > 0:
+            pieces.append(("\n", False))
+        stripped = line.strip()
+        if not stripped:
+            if line:
+                pieces.append((line, False))
+            continue
+        lead = line[:len(line) - len(line.lstrip())]
+        trail = line[len(line.rstrip()):]
+        if lead:
+            pieces.append((lead, False))
+        pieces.extend(split_sentences(stripped, src_lang, max_chars))
+        if trail:
+            pieces.append((trail, False))
+    return pieces
+
+
+def reassemble(pieces: List[Piece], translations: List[str]) -> str:
+    """Rebuild a document from its pieces and the translations of its segments, in order"""
+    translated = iter(translations)
+    return "".join(next(translated) if translatable else text for text, translatable in pieces)
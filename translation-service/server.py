@@ -5,19 +5,63 @@ Self-hosted translation API for African languages
 """
 
 # pyright: reportMissingImports=false
-from fastapi import FastAPI, HTTPException  # type: ignore
+from fastapi import FastAPI, HTTPException, Query, Request  # type: ignore
+from fastapi.responses import Response, StreamingResponse  # type: ignore
 from fastapi.middleware.cors import CORSMiddleware  # type: ignore
 from pydantic import BaseModel  # type: ignore
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM  # type: ignore
+from transformers import AutoTokenizer  # type: ignore
 import torch  # type: ignore
-from typing import List, Optional
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import asyncio
 import logging
+import os
+import time
+
+from admission import AdmissionController, MemoryEstimator, memory_limit
+from backends import create_backend, resolve_model_path
+from batching import MicroBatcher, make_length_buckets
+from crypto_terms import TermProtector
+from decoding import LengthPredictor
+from dedup import InFlight
+import grpc_server
+from tokenization import NllbTokenizer
+from segmentation import reassemble, split_document
+import markup
+from streaming import (
+    AsyncTextStreamer,
+    IncrementalRestorer,
+    NDJSON_MEDIA_TYPE,
+    SSE_MEDIA_TYPE,
+    format_event,
+    wants_sse,
+)
+from inference_queue import (
+    PRIORITIES,
+    DeadlineExceededError,
+    InferenceQueue,
+    QueueFullError,
+    current_schedule,
+    schedule,
+    set_schedule,
+)
+from model_registry import ModelRegistry, parse_model_list, parse_routes
+import profiling
+from metrics import BATCH_SIZE_BUCKETS, CONTENT_TYPE, Metrics
+from jobs import CANCELLED, COMPLETED, FAILED, JobRunner, JobStore
+from translation_cache import TranslationCache, normalize_text
+from translation_memory import TranslationMemory
+from worker_pool import WorkerPool, fork_available
+import wire
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="NLLB-200 Translation Service")
+# Responses use orjson (or MessagePack) and gzip/zstd when the client asks for them;
+# request bodies may be compressed or MessagePack as well
+app = FastAPI(title="NLLB-200 Translation Service", default_response_class=wire.WireResponse)
+app.router.route_class = wire.WireRoute
 
 # CORS for your Node.js backend
 app.add_middleware(
@@ -28,6 +72,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Time each request phase by phase and report it in a Server-Timing header"""
+    timings = profiling.begin()
+    started = time.perf_counter()
+    response = await call_next(request)
+    timings.add("total", time.perf_counter() - started)
+    response.headers["Server-Timing"] = timings.header()
+    
+    if request.url.path.startswith("/translate"):
+        phase_stats.record(timings)
+        if profile_session is not None:
+            profile_session.request_finished()
+    return response
+
 # Model configuration
 # Options:
 # - facebook/nllb-200-distilled-600M (smaller, faster, CPU-friendly)
@@ -35,6 +94,100 @@ app.add_middleware(
 # - facebook/nllb-200-3.3B (best quality, requires GPU)
 MODEL_NAME = "facebook/nllb-200-distilled-600M"
 
+# Inference backend: torch (fp32), torch-int8 (dynamic quantization, CPU),
+# torch-bf16 (AVX512-BF16/AMX CPUs or CUDA) or onnx (needs optimum[onnxruntime])
+BACKEND = os.getenv("NLLB_BACKEND", "torch")
+ONNX_PATH = os.getenv("NLLB_ONNX_PATH", "")  # exported graphs are saved under here (default: data/onnx)
+
+# Several checkpoints can be served at once as named tiers, e.g.
+# NLLB_MODELS="standard=facebook/nllb-200-distilled-600M,premium=facebook/nllb-200-3.3B"
+# Requests choose a tier with "quality"; NLLB_MODEL_ROUTES sends language pairs to a
+# tier ("en:am=premium,*:ti=premium"). The first tier is the default and stays loaded.
+MODELS = os.getenv("NLLB_MODELS", "")  # default: standard=MODEL_NAME
+MODEL_ROUTES = parse_routes(os.getenv("NLLB_MODEL_ROUTES", ""))
+MODEL_MEMORY_MB = float(os.getenv("NLLB_MODEL_MEMORY_MB", "0"))  # other tiers are evicted LRU beyond this (0 = no limit)
+PRELOAD_MODELS = os.getenv("NLLB_PRELOAD_MODELS", "")  # tiers loaded at startup besides the default
+
+# Warm-up translations run at startup (source:target pairs); /ready turns green after them
+WARMUP_PAIRS = os.getenv("NLLB_WARMUP_PAIRS", "en:sw,en:ha,en:yo,en:ig")
+WARMUP_TEXT = "Bitcoin rose today as more people in Africa started using crypto."
+
+# Inference worker processes forked after the model is loaded, sharing its weights
+# copy-on-write (0 = run inference in the API process). Needs fork(), i.e. Linux/macOS.
+WORKER_PROCESSES = int(os.getenv("NLLB_WORKER_PROCESSES", "0"))
+THREADS_PER_WORKER = int(os.getenv("NLLB_THREADS_PER_WORKER", "0"))  # torch intra-op threads (0 = cores / workers)
+# Without worker processes: inference threads sharing the model in the API process
+INFERENCE_STREAMS = int(os.getenv("NLLB_INFERENCE_STREAMS", "1"))
+
+# Micro-batching for concurrent /translate calls and length bucketing for /translate/batch
+# Requests for the same language pair arriving within the window share one generate call
+BATCH_WINDOW_MS = float(os.getenv("NLLB_BATCH_WINDOW_MS", "15"))
+MAX_BATCH_TOKENS = int(os.getenv("NLLB_MAX_BATCH_TOKENS", "4096"))  # padded tokens per generate call
+MAX_BATCH_SIZE = int(os.getenv("NLLB_MAX_BATCH_SIZE", "32"))
+
+# Inference jobs waiting beyond this are rejected with 503 + Retry-After
+MAX_QUEUE_DEPTH = int(os.getenv("NLLB_MAX_QUEUE_DEPTH", "64"))
+
+# Memory-aware admission: batches are split so the estimated peak memory of each
+# generate call (batch size x beams x input and output length) stays within
+# NLLB_MAX_BATCH_MEMORY_MB, and new requests get 503 + Retry-After while the service
+# uses more than NLLB_MEMORY_HIGH_WATERMARK of NLLB_MEMORY_LIMIT_MB
+MAX_BATCH_MEMORY_MB = float(os.getenv("NLLB_MAX_BATCH_MEMORY_MB", "2048"))  # 0 = only the token budget
+MEMORY_LIMIT_MB = os.getenv("NLLB_MEMORY_LIMIT_MB", "")  # default: cgroup limit or physical RAM; 0 disables throttling
+MEMORY_HIGH_WATERMARK = float(os.getenv("NLLB_MEMORY_HIGH_WATERMARK", "0.85"))
+
+# Inputs longer than this are split into sentences instead of being truncated
+MAX_INPUT_TOKENS = 512
+DOCUMENT_SEGMENT_CHARS = int(os.getenv("NLLB_DOCUMENT_SEGMENT_CHARS", "600"))
+
+# Named decoding profiles, selectable per request with "profile" (also part of the cache key)
+DECODING_PROFILES = {
+    "fast": {"num_beams": 1},                               # greedy: headlines, tickers, previews
+    "balanced": {"num_beams": 3, "early_stopping": True},
+    "quality": {"num_beams": 5, "early_stopping": True},    # article bodies
+}
+DEFAULT_PROFILE = os.getenv("NLLB_DECODING_PROFILE", "quality")
+
+# Decode budget: max_new_tokens is sized from the input length and the output/input
+# length ratio learned per language pair, instead of always reserving MAX_OUTPUT_TOKENS
+MAX_OUTPUT_TOKENS = 512
+LENGTH_MARGIN = float(os.getenv("NLLB_LENGTH_MARGIN", "1.5"))
+
+# Translation result cache: in-memory LRU in front of a persistent SQLite store
+CACHE_ENABLED = os.getenv("NLLB_CACHE_ENABLED", "true").lower() == "true"
+CACHE_PATH = os.getenv("NLLB_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "translation_cache.sqlite3"))
+CACHE_MEMORY_ITEMS = int(os.getenv("NLLB_CACHE_MEMORY_ITEMS", "10000"))
+CACHE_MAX_ITEMS = int(os.getenv("NLLB_CACHE_MAX_ITEMS", "500000"))
+CACHE_TTL_HOURS = float(os.getenv("NLLB_CACHE_TTL_HOURS", "720"))
+CACHE_EVICTION = os.getenv("NLLB_CACHE_EVICTION", "lru")  # lru, lfu or fifo
+
+# Segment-level translation memory: exact, number-template and punctuation-insensitive reuse
+TM_ENABLED = os.getenv("NLLB_TM_ENABLED", "true").lower() == "true"
+TM_PATH = os.getenv("NLLB_TM_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "translation_memory.sqlite3"))
+TM_MAX_SEGMENTS = int(os.getenv("NLLB_TM_MAX_SEGMENTS", "500000"))
+
+# Background translation jobs (POST /jobs) are stored here and survive restarts
+JOBS_PATH = os.getenv("NLLB_JOBS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.sqlite3"))
+JOB_CHUNK_SIZE = int(os.getenv("NLLB_JOB_CHUNK_SIZE", "32"))
+
+# Wire formats: responses at least this large are compressed for clients that accept
+# gzip/zstd; compressed request bodies may expand to at most NLLB_MAX_REQUEST_MB
+COMPRESS_MIN_BYTES = int(os.getenv("NLLB_COMPRESS_MIN_BYTES", "1024"))
+MAX_REQUEST_MB = float(os.getenv("NLLB_MAX_REQUEST_MB", "64"))
+wire.configure(COMPRESS_MIN_BYTES, int(MAX_REQUEST_MB * 1024 * 1024))
+
+# gRPC interface (translation.proto) served next to REST on this port (0 = disabled; needs grpcio)
+GRPC_PORT = int(os.getenv("NLLB_GRPC_PORT", "0"))
+GRPC_HOST = os.getenv("NLLB_GRPC_HOST", "0.0.0.0")
+
+# Per-phase request timings (Server-Timing header) and on-demand profiler traces
+PHASE_STATS_WINDOW = int(os.getenv("NLLB_PHASE_STATS_WINDOW", "1000"))  # requests in the rolling summary
+PROFILE_DIR = os.getenv("NLLB_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles"))
+
+# Extra protected terms (one per line, or a term/definition glossary such as "crypto glossary.txt")
+# The file is re-read automatically when it changes
+CRYPTO_TERMS_FILE = os.getenv("NLLB_CRYPTO_TERMS_FILE", "")
+
 # Language code mapping (NLLB uses special codes)
 LANGUAGE_CODES = {
     "en": "eng_Latn",      # English
@@ -49,7 +202,7 @@ LANGUAGE_CODES = {
     "sn": "sna_Latn",      # Shona
     "rw": "kin_Latn",      # Kinyarwanda
     "lg": "lug_Latn",      # Luganda
-    "om": "orm_Latn",      # Oromo
+    "om": "gaz_Latn",      # Oromo (NLLB-200 has West Central Oromo)
     "ti": "tir_Ethi",      # Tigrinya
     "wo": "wol_Latn",      # Wolof
     "fr": "fra_Latn",      # French (widely used in Africa)
@@ -62,12 +215,44 @@ class TranslationRequest(BaseModel):
     source_lang: str = "en"
     target_lang: str
     preserve_crypto_terms: bool = True
+    document_mode: bool = False  # split into sentences/paragraphs and translate them as one batch
+    stream_tokens: bool = False  # /translate/stream only: emit tokens as they are generated (greedy decoding)
+    profile: Optional[str] = None  # fast, balanced or quality (default: NLLB_DECODING_PROFILE)
+    quality: Optional[str] = None  # model tier from NLLB_MODELS (default: routed by language pair)
+    priority: Optional[str] = None  # interactive, batch or background (default: interactive)
+    deadline_ms: Optional[int] = None  # fail with 504 instead of translating once this much time has passed
 
 class BatchTranslationRequest(BaseModel):
     texts: List[str]
     source_lang: str = "en"
     target_langs: List[str]
     preserve_crypto_terms: bool = True
+    document_mode: bool = False
+    profile: Optional[str] = None
+    quality: Optional[str] = None
+    priority: Optional[str] = None  # default: batch
+    deadline_ms: Optional[int] = None
+
+class JobRequest(BaseModel):
+    texts: List[str]
+    source_lang: str = "en"
+    target_langs: List[str]
+    preserve_crypto_terms: bool = True
+    document_mode: bool = False
+    profile: Optional[str] = None
+    quality: Optional[str] = None
+
+class DocumentTranslationRequest(BaseModel):
+    document: str  # HTML, Markdown or plain text
+    source_lang: str = "en"
+    target_langs: List[str]
+    format: str = "auto"  # html, markdown, text or auto (detected)
+    preserve_crypto_terms: bool = True
+    document_mode: bool = True  # split long text nodes into sentences
+    profile: Optional[str] = None
+    quality: Optional[str] = None
+    priority: Optional[str] = None  # default: batch
+    deadline_ms: Optional[int] = None
 
 class TranslationResponse(BaseModel):
     translated_text: str
@@ -78,10 +263,104 @@ class TranslationResponse(BaseModel):
 class BatchTranslationResponse(BaseModel):
     translations: dict  # {lang: translated_text}
     model_version: str
+    deduplicated: int = 0  # translations served from a repeated text or sentence instead of the model
 
-# Global model and tokenizer
-model = None
-tokenizer = None
+class DocumentTranslationResponse(BaseModel):
+    translations: dict  # {lang: translated document}
+    format: str
+    nodes: int  # translatable text nodes in the document
+    unique_nodes: int  # nodes actually sent for translation
+    untranslated_nodes: dict  # {lang: nodes left in the source language because a protected span was lost}
+    model_version: str
+
+# Loaded models and the tokenizer (all NLLB-200 checkpoints share one vocabulary;
+# NllbTokenizer is safe to use from several inference threads at once).
+# Components below are None until startup creates them; request handlers check
+# for that before touching them, and inference only runs after loading.
+model_registry: ModelRegistry = None  # type: ignore[assignment]
+tokenizer: NllbTokenizer = None  # type: ignore[assignment]
+
+# Memory reservations of running inference jobs and sampled memory use (API process + workers)
+admission = AdmissionController(
+    int(float(MEMORY_LIMIT_MB) * 2**20) if MEMORY_LIMIT_MB else memory_limit(),
+    high_watermark=MEMORY_HIGH_WATERMARK,
+)
+memory_estimators: Dict[str, MemoryEstimator] = {}
+
+# Dedicated inference thread (one per worker process) so generate never blocks the event loop
+inference_queue = InferenceQueue(
+    max_pending=MAX_QUEUE_DEPTH,
+    workers=WORKER_PROCESSES if WORKER_PROCESSES > 0 else max(1, INFERENCE_STREAMS),
+    admission=admission
+)
+worker_pool: WorkerPool = None  # type: ignore[assignment]
+
+# Startup progress for /live, /ready and /health
+startup_task = None
+startup_state: Dict[str, Any] = {"phase": "loading_model", "error": None, "load_seconds": None, "warmup_seconds": None}
+batcher: MicroBatcher = None  # type: ignore[assignment]
+cache: TranslationCache = None  # type: ignore[assignment]
+translation_memory: TranslationMemory = None  # type: ignore[assignment]
+# Translations being computed right now, shared with concurrent requests for the same text
+in_flight = InFlight()
+job_store: JobStore = None  # type: ignore[assignment]
+job_runner: JobRunner = None  # type: ignore[assignment]
+grpc_service = None
+length_predictor = LengthPredictor(margin=LENGTH_MARGIN, max_new_tokens=MAX_OUTPUT_TOKENS)
+
+# Rolling phase timings, and the profiler session started by POST /admin/profile
+phase_stats = profiling.PhaseStats(window=PHASE_STATS_WINDOW)
+profile_session = None
+
+# Prometheus metrics (GET /metrics)
+metrics = Metrics()
+requests_total = metrics.counter(
+    "nllb_requests_total", "Translation requests by endpoint, language pair and status",
+    ("endpoint", "source_lang", "target_lang", "status")
+)
+request_seconds = metrics.histogram(
+    "nllb_request_duration_seconds", "Translation request latency by endpoint and language pair",
+    ("endpoint", "source_lang", "target_lang")
+)
+requests_in_flight = metrics.gauge("nllb_requests_in_flight", "Translation requests being served")
+input_tokens_total = metrics.counter("nllb_input_tokens_total", "Source tokens translated", ("source_lang", "target_lang"))
+output_tokens_total = metrics.counter("nllb_output_tokens_total", "Tokens generated", ("source_lang", "target_lang"))
+generate_seconds = metrics.histogram(
+    "nllb_generate_duration_seconds", "Time per generate call, including budget retries",
+    ("source_lang", "target_lang", "profile")
+)
+generate_batch_size = metrics.histogram(
+    "nllb_generate_batch_size", "Texts per generate call", buckets=BATCH_SIZE_BUCKETS
+)
+metrics.gauge("nllb_queue_depth", "Inference jobs waiting", collect=lambda: inference_queue.depth)
+metrics.gauge("nllb_queue_running", "Inference jobs running", collect=lambda: inference_queue.stats()["running"])
+metrics.counter("nllb_queue_rejected_total", "Requests shed because the queue was full", collect=lambda: inference_queue.rejected)
+metrics.counter("nllb_queue_expired_total", "Inference jobs dropped because their deadline had passed", collect=lambda: inference_queue.expired)
+metrics.counter("nllb_admission_throttled_total", "Requests shed because memory use was above the high-water mark", collect=lambda: admission.throttled)
+metrics.gauge("nllb_process_memory_bytes", "Memory of the API process and inference workers (PSS)", collect=lambda: admission.used() or 0)
+metrics.gauge("nllb_reserved_memory_bytes", "Estimated peak memory reserved by running inference jobs", collect=lambda: admission.reserved)
+metrics.counter(
+    "nllb_cache_hits_total", "Translation cache hits", ("level",),
+    collect=lambda: {("memory",): cache.memory_hits, ("disk",): cache.disk_hits}
+)
+metrics.counter("nllb_cache_misses_total", "Translation cache misses", collect=lambda: cache.misses)
+metrics.gauge("nllb_cache_hit_ratio", "Share of cache lookups that hit", collect=lambda: cache.stats()["hit_ratio"])
+deduplicated_total = metrics.counter(
+    "nllb_deduplicated_translations_total",
+    "Translations served from a duplicate instead of the model (within a request or in flight for another one)",
+    ("scope",)
+)
+metrics.counter(
+    "nllb_translation_memory_lookups_total", "Translation memory lookups by result", ("result",),
+    collect=lambda: {
+        **{(kind,): hits for kind, hits in translation_memory.hits.items()},
+        ("miss",): translation_memory.lookups - sum(translation_memory.hits.values()),
+    } if translation_memory is not None else {}
+)
+metrics.gauge(
+    "nllb_model_memory_bytes", "Weight memory of each loaded model tier", ("tier",),
+    collect=lambda: {(tier,): size for tier, size in model_registry.memory_bytes().items()}
+)
 
 # Crypto terms to preserve (don't translate)
 CRYPTO_TERMS = {
@@ -94,104 +373,939 @@ CRYPTO_TERMS = {
     "M-Pesa", "Luno", "Quidax", "BuyCoins", "Valr", "Ice3X"
 }
 
+# Compiled once; matches every protected term in a single pass over the text
+term_protector = TermProtector(CRYPTO_TERMS, path=CRYPTO_TERMS_FILE or None)
+
+def load_backend(checkpoint: str):
+    """Load one checkpoint with the configured backend (called by the model registry)"""
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    onnx_root = ONNX_PATH or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "onnx")
+    onnx_path = os.path.join(onnx_root, checkpoint.strip("/").replace("/", "--"))
+    # Read straight from the local snapshot when it is cached (no hub round-trips)
+    return create_backend(BACKEND, resolve_model_path(checkpoint), device, onnx_path)
+
+def load_weights():
+    """Load the tokenizer and the default (and preloaded) models (blocking, runs off the event loop)"""
+    logger.info(f"Using device: {'CUDA' if torch.cuda.is_available() else 'CPU'}")
+    
+    registry = ModelRegistry(
+        parse_model_list(MODELS or f"standard={MODEL_NAME}"),
+        load=load_backend,
+        resolve_path=resolve_model_path,
+        memory_budget_mb=MODEL_MEMORY_MB,
+    )
+    for tier in MODEL_ROUTES.values():
+        if tier not in registry.models:
+            raise ValueError(f"NLLB_MODEL_ROUTES uses unknown model tier: {tier}")
+    
+    # Language-token ids for every supported language are looked up once, here
+    loaded_tokenizer = NllbTokenizer(
+        AutoTokenizer.from_pretrained(resolve_model_path(registry.models[registry.default])),
+        LANGUAGE_CODES.values()
+    )
+    preload = [tier.strip() for tier in PRELOAD_MODELS.split(",") if tier.strip()]
+    for tier in preload:
+        if tier not in registry.models:
+            raise ValueError(f"NLLB_PRELOAD_MODELS uses unknown model tier: {tier}")
+    forks_workers = WORKER_PROCESSES > 0 and fork_available()
+    if forks_workers:
+        # Workers only share weights loaded before the fork; a tier loaded on demand would be
+        # loaded again by every worker, outside the memory budget
+        missing = [tier for tier in registry.models if tier != registry.default and tier not in preload]
+        if missing:
+            raise ValueError(
+                f"NLLB_WORKER_PROCESSES needs every model tier in NLLB_PRELOAD_MODELS (missing: {', '.join(missing)})"
+            )
+    
+    registry.get(registry.default)
+    for tier in preload:
+        registry.get(tier)
+    if forks_workers:
+        evicted = [tier for tier in registry.models if tier not in registry.loaded_tiers()]
+        if evicted:
+            raise ValueError(
+                f"NLLB_MODEL_MEMORY_MB is too small to keep every tier loaded for the workers (evicted: {', '.join(evicted)})"
+            )
+    return loaded_tokenizer, registry
+
+async def warm_up():
+    """Translate a short text for each configured pair so first requests skip one-time setup costs"""
+    pairs = [pair.split(":") for pair in WARMUP_PAIRS.split(",") if ":" in pair]
+    jobs = []
+    for src, tgt in pairs:
+        src_code, tgt_code = get_nllb_code(src.strip()), get_nllb_code(tgt.strip())
+        if src_code is None or tgt_code is None:
+            logger.warning(f"Skipping unknown warm-up pair {src}:{tgt}")
+            continue
+        # One job per inference thread and loaded model, so every worker process is warmed
+        for model in model_registry.loaded_tiers():
+            for _ in range(inference_queue.workers):
+                jobs.append(inference_queue.run(
+                    translate_texts, [WARMUP_TEXT], src_code, tgt_code, DEFAULT_PROFILE, model, admitted=True
+                ))
+    await asyncio.gather(*jobs)
+
 @app.on_event("startup")
+async def start_loading():
+    """Load the model in the background so /live answers while weights load"""
+    global startup_task
+    startup_task = asyncio.ensure_future(load_model())
+
+async def start_grpc():
+    """Serve the gRPC interface on the REST event loop (once inference workers are forked)"""
+    global grpc_service
+    if not GRPC_PORT:
+        return
+    if not grpc_server.available():
+        logger.error("NLLB_GRPC_PORT is set but grpcio is not installed; serving REST only")
+        return
+    grpc_service = grpc_server.GrpcServer(grpc_translate, grpc_translate_batch, int(MAX_REQUEST_MB * 1024 * 1024))
+    port = await grpc_service.start(f"{GRPC_HOST}:{GRPC_PORT}")
+    logger.info(f"gRPC interface listening on {GRPC_HOST}:{port}")
+
+@app.on_event("shutdown")
+async def stop_grpc():
+    """Let in-flight gRPC calls finish before the process exits"""
+    if grpc_service is not None:
+        await grpc_service.stop()
+
 async def load_model():
-    """Load model on startup"""
-    global model, tokenizer
+    """Load model, start inference workers and warm up"""
+    global model_registry, tokenizer, batcher, cache, translation_memory, job_store, job_runner, worker_pool
     
-    logger.info(f"Loading NLLB-200 model: {MODEL_NAME}")
+    logger.info(f"Loading NLLB-200 model: {MODEL_NAME} (backend: {BACKEND})")
     logger.info("This may take a few minutes on first run...")
+    started = time.perf_counter()
     
     try:
-        # Determine device
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"Using device: {device.upper()}")
-        
         # Load tokenizer and model
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-        model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME)
+        loaded_tokenizer, loaded_registry = await asyncio.get_running_loop().run_in_executor(None, load_weights)
+        startup_state["load_seconds"] = round(time.perf_counter() - started, 2)
         
-        # Move to GPU if available
+        loaded_tiers = ", ".join(loaded_registry.loaded_tiers())
         if torch.cuda.is_available():
-            model = model.to("cuda")
-            logger.info(f"Model loaded on GPU: {torch.cuda.get_device_name(0)}")
+            logger.info(f"Model loaded on GPU: {torch.cuda.get_device_name(0)} (tiers: {loaded_tiers})")
         else:
-            logger.info("Model loaded on CPU (slower)")
+            logger.info(f"Model loaded on CPU (tiers: {loaded_tiers})")
+        
+        batcher = MicroBatcher(
+            run_batch=translate_texts,
+            count_tokens=count_tokens,
+            window_ms=BATCH_WINDOW_MS,
+            max_batch_tokens=MAX_BATCH_TOKENS,
+            max_batch_size=MAX_BATCH_SIZE,
+            queue=inference_queue,
+            in_flight=in_flight,
+            max_batch_bytes=int(MAX_BATCH_MEMORY_MB * 2**20),
+            estimate_bytes=lambda count, tokens, key: generate_memory(key[3], count, tokens, key[0], key[1], key[2]),
+        )
         
-        logger.info("✅ Model loaded successfully!")
+        if CACHE_ENABLED:
+            cache = TranslationCache(
+                path=CACHE_PATH or None,
+                model_name=MODEL_NAME,
+                max_memory_items=CACHE_MEMORY_ITEMS,
+                max_disk_items=CACHE_MAX_ITEMS,
+                ttl_seconds=CACHE_TTL_HOURS * 3600,
+                eviction=CACHE_EVICTION,
+            )
+            logger.info(f"Translation cache enabled ({CACHE_PATH or 'memory only'})")
+        
+        if TM_ENABLED:
+            translation_memory = TranslationMemory(
+                path=TM_PATH or None,
+                max_segments=TM_MAX_SEGMENTS,
+            )
+            logger.info(f"Translation memory enabled ({TM_PATH or 'memory only'})")
+        
+        # Endpoints accept requests from here on (they queue behind the warm-up)
+        tokenizer, model_registry = loaded_tokenizer, loaded_registry
+        
+        executor = run_in_thread
+        if WORKER_PROCESSES > 0 and fork_available():
+            threads = THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // WORKER_PROCESSES)
+            worker_pool = WorkerPool(WORKER_PROCESSES, threads, initializer=record_in_worker)
+            worker_pool.start()
+            model_registry.allow_loading = False  # every tier was loaded before the fork
+            admission.watch(worker_pool.pids)
+            torch.set_num_threads(threads)  # local jobs (token streaming) run in this process
+            executor = run_in_worker
+        elif WORKER_PROCESSES > 0:
+            logger.warning("NLLB_WORKER_PROCESSES needs fork(), running inference in the API process")
+            inference_queue.workers = max(1, INFERENCE_STREAMS)
+        inference_queue.start(executor)
+        # grpc.aio runs its own threads, and forking a process that runs them is unsupported
+        await start_grpc()
+        
+        startup_state["phase"] = "warming_up"
+        warmup_started = time.perf_counter()
+        await warm_up()
+        startup_state["warmup_seconds"] = round(time.perf_counter() - warmup_started, 2)
+        
+        # Resume background jobs interrupted by a restart
+        job_store = JobStore(JOBS_PATH)
+        job_runner = JobRunner(
+            job_store,
+            translate_chunk=translate_job_chunk,
+            is_busy=lambda: inference_queue.depth > 0,
+            chunk_size=JOB_CHUNK_SIZE,
+        )
+        job_runner.start()
+        
+        startup_state["phase"] = "ready"
+        logger.info(f"✅ Model loaded successfully! (ready in {time.perf_counter() - started:.1f}s)")
         
     except Exception as e:
         logger.error(f"Failed to load model: {e}")
-        raise
+        startup_state["phase"] = "failed"
+        startup_state["error"] = str(e)
 
 
-def translate_text(text: str, src_lang: str, tgt_lang: str) -> str:
-    """Translate text using NLLB model with proper tokenizer configuration"""
-    # Set source language on tokenizer
-    tokenizer.src_lang = src_lang
+def encode_texts(texts: List[str], src_lang: str, model: str) -> dict:
+    """Run the encoder once for a batch of source texts
     
-    # Encode the input text
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
+    The encoder output depends only on the source text and language, so the
+    result can be decoded into any number of target languages.
+    """
+    with profiling.phase("tokenize"):
+        # "<src_lang> text </s>", padded to the longest text; no shared tokenizer state is touched
+        input_ids, attention_mask = tokenizer.encode(texts, src_lang, MAX_INPUT_TOKENS)
     
     # Move to same device as model
-    device = next(model.parameters()).device
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-    
-    # Get the target language token ID for forced_bos_token_id
-    forced_bos_token_id = tokenizer.convert_tokens_to_ids(tgt_lang)
-    
-    # Generate translation
-    with torch.no_grad():
-        generated_tokens = model.generate(
-            **inputs,
-            forced_bos_token_id=forced_bos_token_id,
-            max_length=512,
-            num_beams=5,
-            early_stopping=True
+    backend = model_registry.get(model)
+    input_ids, attention_mask = input_ids.to(backend.device), attention_mask.to(backend.device)
+    
+    with profiling.phase("encode"):
+        last_hidden_state = backend.encode(input_ids, attention_mask)
+    
+    return {
+        "last_hidden_state": last_hidden_state,
+        "attention_mask": attention_mask,
+        "src_lang": src_lang,
+        "model": model,
+    }
+
+def generate_tokens(model: str, last_hidden_state, attention_mask, tgt_lang: str, profile: str, max_new_tokens: int, **kwargs):
+    """Run generate on encoder outputs with a decoding profile and budget"""
+    backend = model_registry.get(model)
+    with profiling.phase("generate"):
+        return backend.generate(
+            last_hidden_state,
+            attention_mask,
+            forced_bos_token_id=tokenizer.language_id(tgt_lang),
+            max_new_tokens=max_new_tokens,
+            **DECODING_PROFILES[profile],
+            **kwargs
         )
+
+def memory_estimator(model: str) -> MemoryEstimator:
+    """Activation memory model of a tier, from its checkpoint's config.json"""
+    estimator = memory_estimators.get(model)
+    if estimator is None:
+        path = resolve_model_path(model_registry.models[model])
+        estimator = MemoryEstimator.from_checkpoint(path, dtype_bytes=2 if BACKEND == "torch-bf16" else 4)
+        memory_estimators[model] = estimator
+    return estimator
+
+def generate_memory(model: str, count: int, input_tokens: int, src_lang: str, tgt_lang: str, profile: str, max_new_tokens: Optional[int] = None) -> int:
+    """Estimated peak bytes of one generate call (decode budget predicted from the input length by default)"""
+    if max_new_tokens is None:
+        max_new_tokens = length_predictor.budget(src_lang, tgt_lang, input_tokens)
+    beams = DECODING_PROFILES[profile].get("num_beams", 1)
+    return memory_estimator(model).generate_bytes(count, input_tokens, max_new_tokens, beams)
+
+def rows_within_memory(model: str, input_tokens: int, src_lang: str, tgt_lang: str, profile: str, max_new_tokens: int) -> int:
+    """Most texts one generate call can take within NLLB_MAX_BATCH_MEMORY_MB (at least one)"""
+    if MAX_BATCH_MEMORY_MB <= 0:
+        return MAX_BATCH_SIZE
+    per_row = generate_memory(model, 1, input_tokens, src_lang, tgt_lang, profile, max_new_tokens)
+    return max(1, int(MAX_BATCH_MEMORY_MB * 2**20) // per_row)
+
+def cut_off_rows(generated_tokens, max_new_tokens: int) -> List[int]:
+    """Rows that used the whole budget without finishing"""
+    # The first position is the decoder start token
+    if generated_tokens.shape[1] - 1 < max_new_tokens:
+        return []
+    last = generated_tokens[:, -1].tolist()
+    return [i for i, token in enumerate(last) if token not in (tokenizer.eos_token_id, tokenizer.pad_token_id)]
+
+def decode_encoded(encoded: dict, tgt_lang: str, profile: str = DEFAULT_PROFILE) -> List[str]:
+    """Decode previously encoded source texts into one target language"""
+    src_lang = encoded["src_lang"]
+    input_lengths = encoded["attention_mask"].sum(dim=1).tolist()
+    started = time.perf_counter()
     
-    # Decode the generated tokens
-    translated_text = tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)[0]
+    # A short headline does not reserve the decode budget of a long paragraph
+    budget = length_predictor.budget(src_lang, tgt_lang, max(input_lengths))
+    generated_tokens = generate_tokens(
+        encoded["model"],
+        encoded["last_hidden_state"], encoded["attention_mask"], tgt_lang, profile, budget
+    )
+    with profiling.phase("detokenize"):
+        outputs = tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
+    output_lengths = (generated_tokens[:, 1:] != tokenizer.pad_token_id).sum(dim=1).tolist()
+    
+    # Outputs cut off by the predicted budget are redone with the full limit,
+    # so the budget only ever saves time and never truncates a translation
+    retry = cut_off_rows(generated_tokens, budget) if budget < MAX_OUTPUT_TOKENS else []
+    if retry:
+        length_predictor.record_budget_hit()
+        # The full limit needs a much larger decoder cache than the predicted budget,
+        # so the retry is split into calls that each stay within the memory budget
+        per_call = rows_within_memory(
+            encoded["model"], encoded["attention_mask"].shape[1], src_lang, tgt_lang, profile, MAX_OUTPUT_TOKENS
+        )
+        for start in range(0, len(retry), per_call):
+            chunk = retry[start:start + per_call]
+            rows = torch.tensor(chunk, device=generated_tokens.device)
+            retried_tokens = generate_tokens(
+                encoded["model"],
+                encoded["last_hidden_state"].index_select(0, rows),
+                encoded["attention_mask"].index_select(0, rows),
+                tgt_lang,
+                profile,
+                MAX_OUTPUT_TOKENS
+            )
+            retried_lengths = (retried_tokens[:, 1:] != tokenizer.pad_token_id).sum(dim=1).tolist()
+            with profiling.phase("detokenize"):
+                retried_outputs = tokenizer.batch_decode(retried_tokens, skip_special_tokens=True)
+            for i, output, length in zip(chunk, retried_outputs, retried_lengths):
+                outputs[i] = output
+                output_lengths[i] = length
+    
+    for input_length, output_length in zip(input_lengths, output_lengths):
+        length_predictor.observe(src_lang, tgt_lang, input_length, output_length)
+    
+    generate_seconds.observe(time.perf_counter() - started, source_lang=src_lang, target_lang=tgt_lang, profile=profile)
+    generate_batch_size.observe(len(input_lengths))
+    input_tokens_total.inc(sum(input_lengths), source_lang=src_lang, target_lang=tgt_lang)
+    output_tokens_total.inc(sum(output_lengths), source_lang=src_lang, target_lang=tgt_lang)
     
-    return translated_text
+    return outputs
+
+def record_in_worker():
+    """Forked workers record their length statistics and metrics for run_in_worker to merge"""
+    length_predictor.recording = metrics.recording = True
+
+def worker_job(fn, args: tuple, trace=None):
+    """An inference job as run inside a worker process"""
+    with profiling.collect() as phases, profiling.capture(trace):
+        result = fn(*args)
+    return result, phases, length_predictor.drain(), metrics.drain()
+
+def next_trace():
+    """Where to write a profiler trace of the next inference job, if a profile is being taken"""
+    return profile_session.next_job() if profile_session is not None else None
+
+def run_in_worker(index: int, fn, args: tuple):
+    """Run an inference job in worker process `index` (called from its queue thread)"""
+    result, phases, drained_lengths, drained_metrics = worker_pool.call(index, worker_job, (fn, args, next_trace()))
+    profiling.merge(phases)
+    length_predictor.replay(drained_lengths)
+    metrics.replay(drained_metrics)
+    return result
+
+def run_in_thread(index: int, fn, args: tuple):
+    """Run an inference job on the queue thread itself"""
+    with profiling.capture(next_trace()):
+        return fn(*args)
+
+def translate_texts(texts: List[str], src_lang: str, tgt_lang: str, profile: str = DEFAULT_PROFILE, model: Optional[str] = None) -> List[str]:
+    """Translate several texts for one language pair in a single padded generate call"""
+    return decode_encoded(encode_texts(texts, src_lang, model or model_registry.default), tgt_lang, profile)
+
+def translate_text(text: str, src_lang: str, tgt_lang: str, profile: str = DEFAULT_PROFILE, model: Optional[str] = None) -> str:
+    """Translate text using NLLB model with proper tokenizer configuration"""
+    return translate_texts([text], src_lang, tgt_lang, profile, model)[0]
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in a text (used for batch budgeting and long-input detection)"""
+    return tokenizer.count(text)
 
 def protect_crypto_terms(text: str) -> tuple[str, dict]:
     """Replace crypto terms with placeholders"""
-    if not text:
-        return text, {}
+    with profiling.phase("protect"):
+        return term_protector.protect(text)
+
+def restore_crypto_terms(text: str, replacements: dict) -> str:
+    """Restore crypto terms from placeholders"""
+    with profiling.phase("restore"):
+        return term_protector.restore(text, replacements)
+
+@contextmanager
+def track_request(endpoint: str, src_code: str, tgt_code: str):
+    """Count and time a translation request for /metrics"""
+    requests_in_flight.inc()
+    started = time.perf_counter()
+    status = "200"
+    try:
+        yield
+    except HTTPException as e:
+        status = str(e.status_code)
+        raise
+    except QueueFullError:
+        status = "503"
+        raise
+    except DeadlineExceededError:
+        status = "504"
+        raise
+    except Exception:
+        status = "500"
+        raise
+    except BaseException:
+        # Client went away mid-stream
+        status = "499"
+        raise
+    finally:
+        requests_in_flight.dec()
+        request_seconds.observe(time.perf_counter() - started, endpoint=endpoint, source_lang=src_code, target_lang=tgt_code)
+        requests_total.inc(endpoint=endpoint, source_lang=src_code, target_lang=tgt_code, status=status)
+
+def target_label(tgt_codes: List[str]) -> str:
+    """target_lang label for a request with several targets (keeps label cardinality bounded)"""
+    unique = set(tgt_codes)
+    return unique.pop() if len(unique) == 1 else "multiple"
+
+def overloaded(e: QueueFullError) -> HTTPException:
+    """503 telling the client when to retry"""
+    logger.warning(f"Shedding load: {e}")
+    return HTTPException(
+        status_code=503,
+        detail="Translation service is overloaded, please retry later",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def deadline_missed(e: DeadlineExceededError) -> HTTPException:
+    """504 for a request whose deadline passed before its translation ran"""
+    logger.warning(f"Dropping late request: {e}")
+    return HTTPException(status_code=504, detail=str(e))
+
+def request_schedule(priority: Optional[str], deadline_ms: Optional[int], default: str) -> tuple[str, Optional[float]]:
+    """Priority class and absolute deadline for a request, or a 400 error for an unknown class"""
+    priority = priority or default
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {priority} (use one of: {', '.join(PRIORITIES)})")
+    deadline = time.perf_counter() + deadline_ms / 1000 if deadline_ms is not None else None
+    return priority, deadline
+
+def get_nllb_code(lang: str) -> Optional[str]:
+    """NLLB code for a language (accepts both short codes like 'en' and full codes like 'eng_Latn')"""
+    # If it's already a full NLLB code (contains underscore), use it directly
+    if "_" in lang:
+        return lang
+    # Otherwise, look it up in the mapping
+    return LANGUAGE_CODES.get(lang)
+
+def supported_code(lang: str) -> Optional[str]:
+    """NLLB code for a language if the loaded tokenizer has a language token for it"""
+    code = get_nllb_code(lang)
+    if code is None or (tokenizer is not None and not tokenizer.supports(code)):
+        return None
+    return code
+
+def require_nllb_code(lang: str) -> str:
+    """NLLB code for a language, or a 400 error if it is not supported"""
+    code = supported_code(lang)
+    if code is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported language: {lang}. Use short codes (en, ha, sw) or NLLB codes (eng_Latn, hau_Latn)"
+        )
+    return code
+
+def require_profile(name: Optional[str]) -> str:
+    """Decoding profile for a request, or a 400 error if it is unknown"""
+    profile = name or DEFAULT_PROFILE
+    if profile not in DECODING_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown decoding profile: {profile}. Use one of: {', '.join(DECODING_PROFILES)}"
+        )
+    return profile
+
+def select_model(quality: Optional[str], src_code: str, tgt_code: str) -> str:
+    """Model tier for a translation: the requested one, else a language-pair route, else the default"""
+    if quality:
+        validate_tier(quality)
+        return quality
+    for (src, tgt), tier in MODEL_ROUTES.items():
+        if src in ("*", src_code) or get_nllb_code(src) == src_code:
+            if tgt in ("*", tgt_code) or get_nllb_code(tgt) == tgt_code:
+                return tier
+    return model_registry.default
+
+def validate_tier(quality: Optional[str]):
+    """400 error for an unknown quality tier"""
+    if quality and quality not in model_registry.models:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown quality tier: {quality}. Use one of: {', '.join(model_registry.models)}"
+        )
+
+def resolve_batch_languages(source_lang: str, target_langs: List[str]) -> tuple[str, Dict[str, str]]:
+    """Source NLLB code and {requested target: NLLB code}, skipping unsupported targets"""
+    src_code = supported_code(source_lang)
+    if src_code is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported source language: {source_lang}")
     
-    protected_text = text
-    replacements = {}
+    target_codes = {}
+    for target_lang in target_langs:
+        tgt_code = supported_code(target_lang)
+        if tgt_code is None:
+            logger.warning(f"Skipping unsupported language: {target_lang}")
+            continue
+        target_codes[target_lang] = tgt_code
+    return src_code, target_codes
+
+def lookup_cached(request: BatchTranslationRequest, src_code: str, tgt_codes: List[str], profile: str):
+    """Cached batch results, plus the texts still to translate grouped by missing targets
     
-    for i, term in enumerate(CRYPTO_TERMS):
-        if term.lower() in text.lower():
-            placeholder = f"__CRYPTO_TERM_{i}__"
-            # Case-insensitive replacement
-            import re
-            pattern = re.compile(re.escape(term), re.IGNORECASE)
-            protected_text = pattern.sub(placeholder, protected_text)
-            replacements[placeholder] = term
+    Returns ({tgt_code: [translation or None]}, {(tgt_codes...): [text indices]}).
+    """
+    results: Dict[str, List[Optional[str]]] = {tgt_code: [None] * len(request.texts) for tgt_code in tgt_codes}
+    missing = {}
+    for i, text in enumerate(request.texts):
+        for tgt_code in tgt_codes:
+            if cache is not None:
+                model = select_model(request.quality, src_code, tgt_code)
+                results[tgt_code][i] = cache.get(cache_key(text, src_code, tgt_code, request.preserve_crypto_terms, request.document_mode, profile, model))
+            if results[tgt_code][i] is None:
+                missing.setdefault(i, []).append(tgt_code)
     
-    return protected_text, replacements
+    # Texts missing the same set of targets are translated together
+    groups = {}
+    for i, codes in missing.items():
+        groups.setdefault(tuple(codes), []).append(i)
+    return results, groups
 
-def restore_crypto_terms(text: str, replacements: dict) -> str:
-    """Restore crypto terms from placeholders"""
-    restored_text = text
-    for placeholder, original in replacements.items():
-        restored_text = restored_text.replace(placeholder, original)
-    return restored_text
+def cache_key(text: str, src_code: str, tgt_code: str, preserve_crypto_terms: bool, document_mode: bool, profile: str, model: str) -> str:
+    # A changed term list changes what gets protected, so it is part of the key
+    terms_version = term_protector.version if preserve_crypto_terms else ""
+    # Quantized backends produce slightly different output, so they get their own entries
+    decoding = {
+        **DECODING_PROFILES[profile],
+        "profile": profile,
+        "document_mode": document_mode,
+        "backend": BACKEND,
+        "model": model_registry.models[model],
+    }
+    # Segmented texts keep their layout (paragraph breaks, spacing), so it is part of their key
+    keep_layout = document_mode or "\n" in text
+    return cache.make_key(text, src_code, tgt_code, preserve_crypto_terms, decoding, terms_version, keep_layout)
+
+def memory_scope(profile: str, model: str) -> str:
+    """Translation memory entries are only shared between identical model, backend and profile"""
+    return f"{model_registry.models[model]}|{BACKEND}|{profile}"
+
+async def recall_segments(queries: List[tuple]) -> List[Optional[str]]:
+    """Translations of (protected segment, src, tgt, profile, model) queries from the translation memory, None where unknown"""
+    if translation_memory is None or not queries:
+        return [None] * len(queries)
+    lookups = [(segment, src_code, tgt_code, memory_scope(profile, model)) for segment, src_code, tgt_code, profile, model in queries]
+    # SQLite work stays off the event loop
+    with profiling.phase("memory"):
+        matches = await asyncio.get_running_loop().run_in_executor(None, translation_memory.lookup_many, lookups)
+    return [match[0] if match is not None else None for match in matches]
+
+async def recall_segment(segment: str, src_code: str, tgt_code: str, profile: str, model: str) -> Optional[str]:
+    """Translation of a (protected) segment from the translation memory, or None"""
+    return (await recall_segments([(segment, src_code, tgt_code, profile, model)]))[0]
+
+async def remember_segments(entries: List[tuple]):
+    """Store (protected segment, output, replacements, src, tgt, profile, model) model translations in the translation memory"""
+    if translation_memory is None:
+        return
+    # An output that lost a placeholder would hand the same mistake to every later match
+    stores = [
+        (segment, output, src_code, tgt_code, memory_scope(profile, model))
+        for segment, output, replacements, src_code, tgt_code, profile, model in entries
+        if all(placeholder in output for placeholder in replacements)
+    ]
+    if stores:
+        with profiling.phase("memory"):
+            await asyncio.get_running_loop().run_in_executor(None, translation_memory.store_many, stores)
+
+async def remember_segment(segment: str, output: str, replacements: dict, src_code: str, tgt_code: str, profile: str, model: str):
+    """Store a model translation of a (protected) segment in the translation memory"""
+    await remember_segments([(segment, output, replacements, src_code, tgt_code, profile, model)])
+
+def needs_segmentation(text: str, document_mode: bool) -> bool:
+    """Document mode was requested, or the text would not fit in one sequence"""
+    return document_mode or count_tokens(text) > MAX_INPUT_TOKENS
+
+async def iter_fanout(texts: List[str], src_code: str, tgt_codes: List[str], profile: str, quality: Optional[str]):
+    """Translate texts into several target languages, encoding each bucket only once per model
+    
+    Yields (tgt_code, indices, outputs) after every decode, so callers can
+    stream results as soon as they exist.
+    """
+    lengths = [min(count_tokens(text), MAX_INPUT_TOKENS) for text in texts]
+    
+    # Targets routed to different models need their own encoder pass
+    codes_by_model = {}
+    for tgt_code in tgt_codes:
+        codes_by_model.setdefault(select_model(quality, src_code, tgt_code), []).append(tgt_code)
+    
+    # Each bucket is encoded once and decoded per target language. Jobs are
+    # queued one at a time so interactive requests can run in between.
+    beams = DECODING_PROFILES[profile].get("num_beams", 1)
+    
+    def bucket_memory(count: int, longest: int) -> int:
+        """Peak of the bucket's most expensive generate call"""
+        return max(
+            generate_memory(model, count, longest, src_code, tgt_code, profile)
+            for model, model_codes in codes_by_model.items() for tgt_code in model_codes
+        )
+    
+    # Buckets are also split so no generate call exceeds the memory budget
+    buckets = make_length_buckets(
+        lengths, MAX_BATCH_TOKENS, MAX_BATCH_SIZE, int(MAX_BATCH_MEMORY_MB * 2**20), bucket_memory
+    )
+    for bucket in buckets:
+        # Estimated token cost orders jobs within a priority class (shortest first)
+        tokens = sum(lengths[i] for i in bucket)
+        longest = max(1, max(lengths[i] for i in bucket))
+        for model, model_codes in codes_by_model.items():
+            encoded = await inference_queue.run(
+                encode_texts, [texts[i] for i in bucket], src_code, model, admitted=True, cost=tokens,
+                memory=memory_estimator(model).encode_bytes(len(bucket), longest)
+            )
+            for tgt_code in model_codes:
+                outputs = await inference_queue.run(
+                    decode_encoded, encoded, tgt_code, profile, admitted=True, cost=tokens * beams,
+                    memory=generate_memory(model, len(bucket), longest, src_code, tgt_code, profile)
+                )
+                yield tgt_code, bucket, outputs
+
+async def iter_translate_pipeline(
+    texts: List[str],
+    src_code: str,
+    tgt_codes: List[str],
+    preserve_crypto_terms: bool,
+    document_mode: bool,
+    profile: str,
+    quality: Optional[str] = None,
+    usage: Optional[dict] = None
+):
+    """Protect terms, translate and restore texts for several target languages
+    
+    Long texts (or all texts in document mode) are split into sentences; every
+    segment of every text goes through one bucketed batch job and the
+    documents are reassembled with their original whitespace afterwards.
+    Repeated segments are translated once; usage["deduplicated"] counts the
+    translations that saved.
+    
+    Yields events as translations are decoded:
+    - {"type": "segment", ...} for each sentence of a segmented text
+    - {"type": "result", ...} once a whole text is translated into a language
+    """
+    documents = []
+    segments = []
+    owners = []  # (text index, segment index) for every segment
+    for index, text in enumerate(texts):
+        if needs_segmentation(text, document_mode):
+            pieces = split_document(text, src_code, DOCUMENT_SEGMENT_CHARS, count_tokens, MAX_INPUT_TOKENS)
+            text_segments = [piece for piece, translatable in pieces if translatable]
+        else:
+            pieces = None
+            text_segments = [text]
+        documents.append(pieces)
+        owners.extend((index, segment_index) for segment_index in range(len(text_segments)))
+        segments.extend(text_segments)
+    
+    # Protect crypto terms once per segment (independent of target language)
+    segments_to_translate = []
+    replacements = []
+    for segment in segments:
+        if preserve_crypto_terms:
+            protected_segment, segment_replacements = protect_crypto_terms(segment)
+        else:
+            protected_segment, segment_replacements = segment, {}
+        segments_to_translate.append(protected_segment)
+        replacements.append(segment_replacements)
+    
+    # Translated segments per target language and text, plus how many are still missing
+    translated = {tgt_code: [[] for _ in texts] for tgt_code in tgt_codes}
+    remaining = {tgt_code: [0] * len(texts) for tgt_code in tgt_codes}
+    for tgt_code in tgt_codes:
+        for index, segment_index in owners:
+            translated[tgt_code][index].append(None)
+            remaining[tgt_code][index] += 1
+    
+    # Documents without any translatable text are finished already
+    for tgt_code in tgt_codes:
+        for index, pieces in enumerate(documents):
+            if remaining[tgt_code][index] == 0:
+                yield {"type": "result", "index": index, "target": tgt_code, "translated_text": reassemble(pieces, [])}
+    
+    def finish_segment(tgt_code: str, i: int, output: str):
+        """Restore terms in a translated segment and yield the events it completes"""
+        if preserve_crypto_terms:
+            output = restore_crypto_terms(output, replacements[i])
+        
+        index, segment_index = owners[i]
+        pieces = documents[index]
+        translated[tgt_code][index][segment_index] = output
+        remaining[tgt_code][index] -= 1
+        
+        if pieces is not None:
+            yield {"type": "segment", "index": index, "segment": segment_index, "target": tgt_code, "translated_text": output}
+        if remaining[tgt_code][index] == 0:
+            text_segments = translated[tgt_code][index]
+            result = reassemble(pieces, text_segments) if pieces is not None else text_segments[0]
+            yield {"type": "result", "index": index, "target": tgt_code, "translated_text": result}
+    
+    def finish_copies(tgt_code: str, i: int, output: str):
+        for position in copies_of[i]:
+            yield from finish_segment(tgt_code, position, output)
+    
+    def count_saved(scope: str, count: int):
+        if count:
+            deduplicated_total.inc(count, scope=scope)
+            if usage is not None:
+                usage["deduplicated"] = usage.get("deduplicated", 0) + count
+    
+    # Identical segments (after normalization) are translated once and fanned
+    # back out; every copy still gets its own crypto terms restored
+    copies_of = {}
+    first_copy = {}
+    for i, segment in enumerate(segments_to_translate):
+        first = first_copy.setdefault(normalize_text(segment), i)
+        copies_of.setdefault(first, []).append(i)
+    count_saved("request", (len(segments_to_translate) - len(copies_of)) * len(tgt_codes))
+    
+    # Segments the translation memory already knows are served right away,
+    # and segments another request is translating right now are waited for
+    # Only work of the same or a higher priority is waited for, and never past our deadline
+    priority, deadline = current_schedule()
+    missing = {}
+    waiting = []
+    flight_keys = {}  # (segment, target) -> in-flight translation this request owns
+    models = {tgt_code: select_model(quality, src_code, tgt_code) for tgt_code in tgt_codes}
+    recalled = iter(await recall_segments([
+        (segments_to_translate[i], src_code, tgt_code, profile, models[tgt_code]) for i in copies_of for tgt_code in tgt_codes
+    ]))
+    for i in copies_of:
+        for tgt_code in tgt_codes:
+            model = models[tgt_code]
+            output = next(recalled)
+            if output is not None:
+                for event in finish_copies(tgt_code, i, output):
+                    yield event
+                continue
+            key = InFlight.key(segments_to_translate[i], src_code, tgt_code, profile, model)
+            owned, shared = in_flight.claim(key, priority)
+            if shared is not None:
+                waiting.append((i, tgt_code, shared))
+                continue
+            if owned:
+                flight_keys[(i, tgt_code)] = key
+            missing.setdefault(i, []).append(tgt_code)
+    
+    async def translate_missing(missing: Dict[int, List[str]]):
+        """Translate segments, those missing the same set of targets together"""
+        groups = {}
+        for i, codes in missing.items():
+            groups.setdefault(tuple(codes), []).append(i)
+        
+        for codes, group in groups.items():
+            group_segments = [segments_to_translate[i] for i in group]
+            async for tgt_code, indices, outputs in iter_fanout(group_segments, src_code, list(codes), profile, quality):
+                model = models[tgt_code]
+                for j, output in zip(indices, outputs):
+                    key = flight_keys.pop((group[j], tgt_code), None)
+                    if key is not None:
+                        in_flight.resolve(key, output)
+                for j, output in zip(indices, outputs):
+                    for event in finish_copies(tgt_code, group[j], output):
+                        yield event
+                # One transaction per decoded bucket
+                await remember_segments([
+                    (segments_to_translate[group[j]], output, replacements[group[j]], src_code, tgt_code, profile, model)
+                    for j, output in zip(indices, outputs)
+                ])
+    
+    try:
+        # Own work first, so two requests waiting on each other both make progress
+        async for event in translate_missing(missing):
+            yield event
+        
+        retry = {}
+        for i, tgt_code, shared in waiting:
+            with profiling.phase("in_flight"):
+                output = await InFlight.wait(shared, deadline)
+            if output is None:
+                # The other request failed or went away
+                retry.setdefault(i, []).append(tgt_code)
+                continue
+            count_saved("in_flight", 1)
+            for event in finish_copies(tgt_code, i, output):
+                yield event
+        
+        async for event in translate_missing(retry):
+            yield event
+    finally:
+        for key in flight_keys.values():
+            in_flight.abandon(key)
+
+async def translate_pipeline(
+    texts: List[str],
+    src_code: str,
+    tgt_codes: List[str],
+    preserve_crypto_terms: bool,
+    document_mode: bool,
+    profile: str,
+    quality: Optional[str] = None,
+    usage: Optional[dict] = None
+) -> Dict[str, List[str]]:
+    """Translate texts for several target languages and return all results at once"""
+    results = {tgt_code: [""] * len(texts) for tgt_code in tgt_codes}
+    async for event in iter_translate_pipeline(texts, src_code, tgt_codes, preserve_crypto_terms, document_mode, profile, quality, usage):
+        if event["type"] == "result":
+            results[event["target"]][event["index"]] = event["translated_text"]
+    return results
+
+async def run_batch_translation(request: BatchTranslationRequest, usage: Optional[dict] = None) -> Dict[str, List[str]]:
+    """Translate a batch request (cache first, then the model) and return {target_lang: [translations]}
+    
+    usage["deduplicated"] counts translations served from a repeated text or
+    sentence instead of the model.
+    """
+    translations = {}
+    
+    src_code, target_codes = resolve_batch_languages(request.source_lang, request.target_langs)
+    unique_codes = list(dict.fromkeys(target_codes.values()))
+    profile = require_profile(request.profile)
+    
+    # Serve cached translations; only the rest goes to the model
+    results, groups = lookup_cached(request, src_code, unique_codes, profile)
+    
+    if groups:
+        # Shed load before starting; buckets of an admitted request always run
+        inference_queue.check_capacity()
+        
+        for codes, indices in groups.items():
+            group_results = await translate_pipeline(
+                [request.texts[i] for i in indices],
+                src_code,
+                list(codes),
+                request.preserve_crypto_terms,
+                request.document_mode,
+                profile,
+                request.quality,
+                usage
+            )
+            
+            for tgt_code in codes:
+                model = select_model(request.quality, src_code, tgt_code)
+                for i, translated in zip(indices, group_results[tgt_code]):
+                    results[tgt_code][i] = translated
+                    if cache is not None:
+                        cache.put(cache_key(request.texts[i], src_code, tgt_code, request.preserve_crypto_terms, request.document_mode, profile, model), translated)
+    
+    for target_lang, tgt_code in target_codes.items():
+        translations[target_lang] = results[tgt_code]
+    
+    return translations
+
+async def run_document_translation(request: DocumentTranslationRequest) -> tuple[str, int, int, Dict[str, str], Dict[str, int]]:
+    """Translate the text nodes of a document in one batch and rebuild it for every target language
+    
+    Returns (format, nodes, unique nodes, {target_lang: document}, {target_lang: untranslated nodes}).
+    """
+    fmt = markup.detect_format(request.document) if request.format == "auto" else request.format
+    if fmt not in markup.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown document format: {fmt} (use auto, {', '.join(markup.FORMATS)})")
+    src_code = require_nllb_code(request.source_lang)
+    
+    if fmt == "text":
+        pieces = split_document(request.document, src_code, DOCUMENT_SEGMENT_CHARS, count_tokens, MAX_INPUT_TOKENS)
+    else:
+        pieces = markup.split_markup(request.document, fmt)
+    nodes = [text for text, translatable in pieces if translatable]
+    
+    # Repeated nodes (menu labels, captions, boilerplate) are translated once;
+    # inline markup, URLs, handles, numbers and prices are held back as placeholders
+    unique_nodes = list(dict.fromkeys(nodes))
+    protected = [markup.protect_spans(node, fmt) for node in unique_nodes]
+    batch = BatchTranslationRequest(
+        texts=[text for text, _ in protected],
+        source_lang=request.source_lang,
+        target_langs=request.target_langs,
+        preserve_crypto_terms=request.preserve_crypto_terms,
+        document_mode=request.document_mode,
+        profile=request.profile,
+        quality=request.quality
+    )
+    translations = await run_batch_translation(batch)
+    
+    documents = {}
+    untranslated = {}
+    for target_lang, outputs in translations.items():
+        translated_nodes = {}
+        untranslated[target_lang] = 0
+        for node, (_, replacements), output in zip(unique_nodes, protected, outputs):
+            restored = markup.restore_spans(output, replacements, fmt)
+            if restored is None:
+                # A dropped link or price would silently change the article; keep the source text
+                restored = node
+                untranslated[target_lang] += 1
+            translated_nodes[node] = restored
+        documents[target_lang] = reassemble(pieces, [translated_nodes[node] for node in nodes])
+    return fmt, len(nodes), len(unique_nodes), documents, untranslated
+
+async def translate_job_chunk(job: dict, texts: List[str]) -> List[Dict[str, str]]:
+    """Translate one chunk of a background job, returning {target_lang: translation} per text"""
+    request = BatchTranslationRequest(
+        texts=texts,
+        source_lang=job["source_lang"],
+        target_langs=job["target_langs"],
+        **job["options"]
+    )
+    # Backfills only get the model when no interactive or batch work is waiting
+    with schedule("background"):
+        translations = await run_batch_translation(request)
+    return [{lang: translations[lang][i] for lang in translations} for i in range(len(texts))]
+
+def stream_tokens_sync(text: str, src_lang: str, tgt_lang: str, model: str, streamer) -> None:
+    """Greedy-decode one text, pushing tokens to the streamer (runs on the inference thread)"""
+    encoded = encode_texts([text], src_lang, model)
+    # Streamers only support a single greedy hypothesis. Tokens already sent
+    # cannot be redone, so the stream always gets the full output budget.
+    generate_tokens(
+        model, encoded["last_hidden_state"], encoded["attention_mask"], tgt_lang, "fast", MAX_OUTPUT_TOKENS,
+        streamer=streamer
+    )
 
 @app.get("/")
 async def root():
     """Health check"""
     return {
         "service": "NLLB-200 Translation Service",
-        "status": "ready" if model is not None else "loading",
+        "status": "ready" if startup_state["phase"] == "ready" else startup_state["phase"],
         "model": MODEL_NAME,
         "device": "cuda" if torch.cuda.is_available() else "cpu",
+        "backend": BACKEND,
+        "models": model_registry.loaded_tiers() if model_registry is not None else [],
         "supported_languages": len(LANGUAGE_CODES)
     }
 
+@app.get("/live")
+async def liveness():
+    """Liveness probe: the process is up (fails only if startup failed)"""
+    if startup_state["phase"] == "failed":
+        raise HTTPException(status_code=503, detail=f"Startup failed: {startup_state['error']}")
+    return {"status": "alive", "phase": startup_state["phase"]}
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: the model is loaded, warmed up and all workers are running"""
+    if startup_state["phase"] != "ready":
+        raise HTTPException(status_code=503, detail=f"Not ready: {startup_state['phase']}")
+    if worker_pool is not None and worker_pool.stats()["alive"] < worker_pool.processes:
+        raise HTTPException(status_code=503, detail="Not ready: inference worker exited")
+    return {"status": "ready"}
+
 @app.get("/languages")
 async def get_supported_languages():
     """Get supported language codes"""
@@ -203,50 +1317,75 @@ async def get_supported_languages():
 @app.post("/translate", response_model=TranslationResponse)
 async def translate(request: TranslationRequest):
     """Translate single text"""
-    if model is None:
+    if model_registry is None:
         raise HTTPException(status_code=503, detail="Model not loaded yet")
     
     try:
-        # Helper to get NLLB code (accepts both short codes like 'en' and full codes like 'eng_Latn')
-        def get_nllb_code(lang: str) -> str:
-            # If it's already a full NLLB code (contains underscore), use it directly
-            if "_" in lang:
-                return lang
-            # Otherwise, look it up in the mapping
-            if lang not in LANGUAGE_CODES:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Unsupported language: {lang}. Use short codes (en, ha, sw) or NLLB codes (eng_Latn, hau_Latn)"
-                )
-            return LANGUAGE_CODES[lang]
-        
         # Get NLLB codes
-        src_code = get_nllb_code(request.source_lang)
-        tgt_code = get_nllb_code(request.target_lang)
-        
-        # Protect crypto terms if requested
-        text_to_translate = request.text
-        replacements = {}
-        
-        if request.preserve_crypto_terms:
-            text_to_translate, replacements = protect_crypto_terms(request.text)
-        
-        # Perform translation
-        logger.info(f"Translating: {request.source_lang} -> {request.target_lang}")
+        src_code = require_nllb_code(request.source_lang)
+        tgt_code = require_nllb_code(request.target_lang)
+        profile = require_profile(request.profile)
+        model = select_model(request.quality, src_code, tgt_code)
+        scheduled = request_schedule(request.priority, request.deadline_ms, "interactive")
         
-        translated_text = translate_text(text_to_translate, src_code, tgt_code)
-        
-        # Restore crypto terms
-        if request.preserve_crypto_terms:
-            translated_text = restore_crypto_terms(translated_text, replacements)
-        
-        return TranslationResponse(
-            translated_text=translated_text,
-            source_lang=request.source_lang,
-            target_lang=request.target_lang,
-            model_version=MODEL_NAME
-        )
+        with track_request("translate", src_code, tgt_code), schedule(*scheduled):
+            # Serve repeated texts from the cache
+            key = None
+            translated_text = None
+            if cache is not None:
+                key = cache_key(request.text, src_code, tgt_code, request.preserve_crypto_terms, request.document_mode, profile, model)
+                with profiling.phase("cache"):
+                    translated_text = cache.get(key)
+            
+            if translated_text is None and needs_segmentation(request.text, request.document_mode):
+                # Long text: translate its sentences as one batched job instead of truncating
+                logger.info(f"Translating document: {request.source_lang} -> {request.target_lang}")
+                inference_queue.check_capacity()
+                results = await translate_pipeline(
+                    [request.text], src_code, [tgt_code], request.preserve_crypto_terms, True, profile, model
+                )
+                translated_text = results[tgt_code][0]
+                if cache is not None:
+                    cache.put(key, translated_text)
+            
+            if translated_text is None:
+                # Protect crypto terms if requested
+                text_to_translate = request.text
+                replacements = {}
+                
+                if request.preserve_crypto_terms:
+                    text_to_translate, replacements = protect_crypto_terms(request.text)
+                
+                # Perform translation
+                logger.info(f"Translating: {request.source_lang} -> {request.target_lang}")
+                
+                # Reuse a remembered segment; otherwise concurrent requests for the
+                # same pair are batched into one generate call
+                translated_text = await recall_segment(text_to_translate, src_code, tgt_code, profile, model)
+                if translated_text is None:
+                    translated_text = await batcher.submit(text_to_translate, src_code, tgt_code, profile, model)
+                    await remember_segment(text_to_translate, translated_text, replacements, src_code, tgt_code, profile, model)
+                
+                # Restore crypto terms
+                if request.preserve_crypto_terms:
+                    translated_text = restore_crypto_terms(translated_text, replacements)
+                
+                if cache is not None:
+                    cache.put(key, translated_text)
+            
+            return TranslationResponse(
+                translated_text=translated_text,
+                source_lang=request.source_lang,
+                target_lang=request.target_lang,
+                model_version=model_registry.models[model]
+            )
         
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise overloaded(e)
+    except DeadlineExceededError as e:
+        raise deadline_missed(e)
     except Exception as e:
         logger.error(f"Translation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -254,69 +1393,396 @@ async def translate(request: TranslationRequest):
 @app.post("/translate/batch", response_model=BatchTranslationResponse)
 async def translate_batch(request: BatchTranslationRequest):
     """Translate multiple texts to multiple languages"""
-    if model is None:
+    if model_registry is None:
         raise HTTPException(status_code=503, detail="Model not loaded yet")
     
     try:
-        translations = {}
-        
-        # Helper to get NLLB code (accepts both short codes and full codes)
-        def get_nllb_code(lang: str) -> str:
-            if "_" in lang:
-                return lang
-            if lang not in LANGUAGE_CODES:
-                return None
-            return LANGUAGE_CODES[lang]
+        src_code, target_codes = resolve_batch_languages(request.source_lang, request.target_langs)
+        usage = {}
+        scheduled = request_schedule(request.priority, request.deadline_ms, "batch")
+        with track_request("translate_batch", src_code, target_label(list(target_codes.values()))), schedule(*scheduled):
+            translations = await run_batch_translation(request, usage)
         
-        src_code = get_nllb_code(request.source_lang)
-        if src_code is None:
-            raise HTTPException(status_code=400, detail=f"Unsupported source language: {request.source_lang}")
-        
-        for target_lang in request.target_langs:
-            tgt_code = get_nllb_code(target_lang)
-            if tgt_code is None:
-                logger.warning(f"Skipping unsupported language: {target_lang}")
-                continue
-            
-            lang_translations = []
-            
-            for text in request.texts:
-                # Protect crypto terms
-                text_to_translate = text
-                replacements = {}
-                
-                if request.preserve_crypto_terms:
-                    text_to_translate, replacements = protect_crypto_terms(text)
-                
-                # Translate
-                translated = translate_text(text_to_translate, src_code, tgt_code)
-                
-                # Restore crypto terms
-                if request.preserve_crypto_terms:
-                    translated = restore_crypto_terms(translated, replacements)
-                
-                lang_translations.append(translated)
-            
-            translations[target_lang] = lang_translations
+        models = dict.fromkeys(
+            model_registry.models[select_model(request.quality, src_code, tgt_code)] for tgt_code in target_codes.values()
+        )
         
         return BatchTranslationResponse(
             translations=translations,
-            model_version=MODEL_NAME
+            model_version=",".join(models) or model_registry.models[model_registry.default],
+            deduplicated=usage.get("deduplicated", 0)
         )
         
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise overloaded(e)
+    except DeadlineExceededError as e:
+        raise deadline_missed(e)
     except Exception as e:
         logger.error(f"Batch translation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def grpc_translate(fields: dict) -> dict:
+    """Translate handler for gRPC calls (same path as POST /translate)"""
+    return (await translate(TranslationRequest(**fields))).model_dump()
+
+async def grpc_translate_batch(fields: dict) -> dict:
+    """TranslateBatch handler for gRPC calls (same path as POST /translate/batch)"""
+    return (await translate_batch(BatchTranslationRequest(**fields))).model_dump()
+
+@app.post("/translate/document", response_model=DocumentTranslationResponse)
+async def translate_document(request: DocumentTranslationRequest):
+    """Translate the text of an HTML or Markdown document, keeping its markup"""
+    if model_registry is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    
+    try:
+        src_code, target_codes = resolve_batch_languages(request.source_lang, request.target_langs)
+        scheduled = request_schedule(request.priority, request.deadline_ms, "batch")
+        with track_request("translate_document", src_code, target_label(list(target_codes.values()))), schedule(*scheduled):
+            fmt, nodes, unique_nodes, documents, untranslated = await run_document_translation(request)
+        
+        models = dict.fromkeys(
+            model_registry.models[select_model(request.quality, src_code, tgt_code)] for tgt_code in target_codes.values()
+        )
+        
+        return DocumentTranslationResponse(
+            translations=documents,
+            format=fmt,
+            nodes=nodes,
+            unique_nodes=unique_nodes,
+            untranslated_nodes=untranslated,
+            model_version=",".join(models) or model_registry.models[model_registry.default]
+        )
+        
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise overloaded(e)
+    except DeadlineExceededError as e:
+        raise deadline_missed(e)
+    except Exception as e:
+        logger.error(f"Document translation error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def iter_token_stream(text: str, src_code: str, tgt_code: str, model: str, preserve_crypto_terms: bool):
+    """Yield {"type": "token"} events while one text is generated, then the full result"""
+    text_to_translate, replacements = protect_crypto_terms(text) if preserve_crypto_terms else (text, {})
+    restorer = IncrementalRestorer(lambda translated: restore_crypto_terms(translated, replacements))
+    
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    streamer = AsyncTextStreamer(tokenizer, chunks, loop)
+    job = asyncio.ensure_future(
+        inference_queue.run(
+            stream_tokens_sync, text_to_translate, src_code, tgt_code, model, streamer, admitted=True, local=True,
+            memory=generate_memory(
+                model, 1, min(count_tokens(text_to_translate), MAX_INPUT_TOKENS), src_code, tgt_code, "fast", MAX_OUTPUT_TOKENS
+            )
+        )
+    )
+    
+    while True:
+        getter = asyncio.ensure_future(chunks.get())
+        done, _ = await asyncio.wait({getter, job}, return_when=asyncio.FIRST_COMPLETED)
+        if getter not in done:
+            # Generation finished (or failed) without an end marker
+            getter.cancel()
+            break
+        chunk = getter.result()
+        if chunk is None:
+            break
+        delta = restorer.feed(chunk)
+        if delta:
+            yield {"type": "token", "translated_text": delta}
+    
+    # Surface generation errors
+    await job
+    
+    tail = restorer.finish()
+    if tail:
+        yield {"type": "token", "translated_text": tail}
+    yield {"type": "result", "index": 0, "target": tgt_code, "translated_text": restorer.text.strip()}
+
+async def tracked_events(events, endpoint: str, src_code: str, tgt_code: str, scheduled: tuple):
+    """Pass events through, counting the whole stream as one request for /metrics"""
+    with track_request(endpoint, src_code, tgt_code):
+        # The body is produced after the endpoint returned, in the response's own task
+        set_schedule(*scheduled)
+        async for event in events:
+            yield event
+
+def event_stream(events, sse: bool, error_label: str) -> StreamingResponse:
+    """Wrap an async iterator of events in an NDJSON or SSE response"""
+    async def body():
+        try:
+            async for event in events:
+                yield format_event(event, sse)
+            yield format_event({"type": "done"}, sse)
+        except Exception as e:
+            # Headers are already sent, so errors are reported in-stream
+            logger.error(f"{error_label} error: {e}")
+            yield format_event({"type": "error", "detail": str(e)}, sse)
+    
+    return StreamingResponse(
+        body(),
+        media_type=SSE_MEDIA_TYPE if sse else NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/translate/stream")
+async def translate_stream(request: TranslationRequest, http_request: Request, format: Optional[str] = None):
+    """Translate single text, streaming segments (or tokens) as NDJSON or Server-Sent Events"""
+    if model_registry is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    
+    src_code = require_nllb_code(request.source_lang)
+    tgt_code = require_nllb_code(request.target_lang)
+    profile = require_profile(request.profile)
+    model = select_model(request.quality, src_code, tgt_code)
+    scheduled = request_schedule(request.priority, request.deadline_ms, "interactive")
+    sse = wants_sse(http_request.headers.get("accept"), format)
+    
+    key = None
+    cached = None
+    if cache is not None and not request.stream_tokens:
+        key = cache_key(request.text, src_code, tgt_code, request.preserve_crypto_terms, request.document_mode, profile, model)
+        cached = cache.get(key)
+    
+    if cached is None:
+        try:
+            inference_queue.check_capacity()
+        except QueueFullError as e:
+            raise overloaded(e)
+    
+    async def events():
+        if cached is not None:
+            yield {"type": "result", "index": 0, "target_lang": request.target_lang, "translated_text": cached, "cached": True}
+            return
+        
+        if request.stream_tokens and not needs_segmentation(request.text, request.document_mode):
+            source = iter_token_stream(request.text, src_code, tgt_code, model, request.preserve_crypto_terms)
+        else:
+            source = iter_translate_pipeline(
+                [request.text], src_code, [tgt_code], request.preserve_crypto_terms, request.document_mode, profile, model
+            )
+        
+        async for event in source:
+            event.pop("target", None)
+            event["target_lang"] = request.target_lang
+            if event["type"] == "result" and key is not None:
+                cache.put(key, event["translated_text"])
+            yield event
+    
+    logger.info(f"Streaming translation: {request.source_lang} -> {request.target_lang}")
+    return event_stream(tracked_events(events(), "translate_stream", src_code, tgt_code, scheduled), sse, "Streaming translation")
+
+@app.post("/translate/batch/stream")
+async def translate_batch_stream(request: BatchTranslationRequest, http_request: Request, format: Optional[str] = None):
+    """Translate multiple texts to multiple languages, streaming each result as soon as it is decoded"""
+    if model_registry is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    
+    src_code, target_codes = resolve_batch_languages(request.source_lang, request.target_langs)
+    unique_codes = list(dict.fromkeys(target_codes.values()))
+    profile = require_profile(request.profile)
+    scheduled = request_schedule(request.priority, request.deadline_ms, "batch")
+    sse = wants_sse(http_request.headers.get("accept"), format)
+    
+    # Requested language names per NLLB code ("ha" and "hau_Latn" share one decode)
+    langs_by_code = {}
+    for target_lang, tgt_code in target_codes.items():
+        langs_by_code.setdefault(tgt_code, []).append(target_lang)
+    
+    results, groups = lookup_cached(request, src_code, unique_codes, profile)
+    if groups:
+        try:
+            inference_queue.check_capacity()
+        except QueueFullError as e:
+            raise overloaded(e)
+    
+    async def events():
+        # Cached results go out immediately
+        for tgt_code, lang_results in results.items():
+            for index, translated in enumerate(lang_results):
+                if translated is not None:
+                    for target_lang in langs_by_code[tgt_code]:
+                        yield {"type": "result", "index": index, "target_lang": target_lang, "translated_text": translated, "cached": True}
+        
+        for codes, indices in groups.items():
+            group_events = iter_translate_pipeline(
+                [request.texts[i] for i in indices],
+                src_code,
+                list(codes),
+                request.preserve_crypto_terms,
+                request.document_mode,
+                profile,
+                request.quality
+            )
+            async for event in group_events:
+                index = indices[event["index"]]
+                tgt_code = event.pop("target")
+                if event["type"] == "result" and cache is not None:
+                    model = select_model(request.quality, src_code, tgt_code)
+                    cache.put(cache_key(request.texts[index], src_code, tgt_code, request.preserve_crypto_terms, request.document_mode, profile, model), event["translated_text"])
+                for target_lang in langs_by_code[tgt_code]:
+                    yield {**event, "index": index, "target_lang": target_lang}
+    
+    logger.info(f"Streaming batch translation: {len(request.texts)} texts -> {list(target_codes)}")
+    return event_stream(
+        tracked_events(events(), "translate_batch_stream", src_code, target_label(unique_codes), scheduled),
+        sse,
+        "Streaming batch translation"
+    )
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest):
+    """Queue a large translation job to run in the background"""
+    if job_store is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    
+    # Reject bad languages now rather than when the job runs
+    _, target_codes = resolve_batch_languages(request.source_lang, request.target_langs)
+    if not target_codes:
+        raise HTTPException(status_code=400, detail="No supported target languages")
+    profile = require_profile(request.profile)
+    validate_tier(request.quality)
+    
+    job_id = job_store.create(
+        request.texts,
+        request.source_lang,
+        list(target_codes),
+        {"preserve_crypto_terms": request.preserve_crypto_terms, "document_mode": request.document_mode, "profile": profile, "quality": request.quality}
+    )
+    job_runner.notify()
+    logger.info(f"Queued translation job {job_id}: {len(request.texts)} texts -> {list(target_codes)}")
+    return job_store.get(job_id)
+
+@app.get("/jobs")
+async def list_jobs(limit: int = Query(50, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    """Most recent translation jobs"""
+    if job_store is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    return {"jobs": job_store.list(limit, offset)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status and progress"""
+    job = job_store.get(job_id) if job_store is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=1000)):
+    """A page of finished translations; pass next_offset back to continue"""
+    job = job_store.get(job_id) if job_store is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    items = job_store.results(job_id, offset, limit)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "items": items,
+        "next_offset": items[-1]["index"] + 1 if len(items) == limit else None
+    }
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Stop a job; finished translations stay available"""
+    job = job_store.get(job_id) if job_store is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] not in (COMPLETED, FAILED, CANCELLED):
+        job_store.set_status(job_id, CANCELLED)
+    return job_store.get(job_id)
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Delete a job and its results"""
+    if job_store is None or job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job_store.delete(job_id)
+    return {"status": "deleted"}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics"""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     return {
-        "status": "healthy" if model is not None else "initializing",
+        "status": "healthy" if model_registry is not None else "initializing",
         "model": MODEL_NAME,
+        "startup": startup_state,
+        "backend": BACKEND,
+        "models": model_registry.stats() if model_registry is not None else None,
+        "batching": batcher.stats() if batcher is not None else None,
+        "dedup": in_flight.stats(),
+        "wire": wire.available(),
+        "grpc": grpc_service.stats() if grpc_service is not None else None,
+        "queue": inference_queue.stats(),
+        "admission": {**admission.stats(), "max_batch_memory_mb": MAX_BATCH_MEMORY_MB},
+        "workers": worker_pool.stats() if worker_pool is not None else None,
+        "cache": cache.stats() if cache is not None else None,
+        "translation_memory": translation_memory.stats() if translation_memory is not None else None,
+        "decoding": {"default_profile": DEFAULT_PROFILE, "profiles": DECODING_PROFILES, "length": length_predictor.stats()},
+        "profiling": phase_stats.stats(),
+        "crypto_terms": term_protector.stats(),
+        "jobs": job_store.counts() if job_store is not None else None,
         "supported_languages": ["hausa", "yoruba", "igbo", "swahili", "zulu", "amharic", "somali", "shona", "luganda", "wolof", "english", "french", "arabic", "portuguese"]
     }
 
+@app.get("/admin/profile")
+async def get_profile():
+    """Rolling per-phase timings and the state of the current profiler session"""
+    return {
+        "phases": phase_stats.stats(),
+        "session": profile_session.describe() if profile_session is not None else None,
+    }
+
+@app.post("/admin/profile", status_code=202)
+async def start_profile(requests: int = 20, mode: str = "torch"):
+    """Trace the inference work of the next N translation requests with the torch profiler or cProfile"""
+    global profile_session
+    if profile_session is not None and profile_session.active:
+        raise HTTPException(status_code=409, detail="A profile is already being taken")
+    if requests < 1:
+        raise HTTPException(status_code=400, detail="requests must be at least 1")
+    directory = os.path.join(PROFILE_DIR, time.strftime("%Y%m%d-%H%M%S") + f"-{mode}")
+    try:
+        profile_session = profiling.ProfileSession(mode, requests, directory)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Profiling the next {requests} requests with {mode} into {directory}")
+    return profile_session.describe()
+
+@app.post("/admin/cache/clear")
+async def clear_cache():
+    """Invalidate all cached translations"""
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Translation cache is disabled")
+    cache.clear()
+    return {"status": "cleared"}
+
+@app.post("/admin/tm/clear")
+async def clear_translation_memory():
+    """Forget all remembered segment translations"""
+    if translation_memory is None:
+        raise HTTPException(status_code=404, detail="Translation memory is disabled")
+    translation_memory.clear()
+    return {"status": "cleared"}
+
+@app.post("/admin/terms/reload")
+async def reload_crypto_terms():
+    """Re-read the protected crypto terms file"""
+    count = term_protector.reload()
+    return {"status": "reloaded", "terms": count, "version": term_protector.version}
+
 if __name__ == "__main__":
     import uvicorn  # type: ignore
     uvicorn.run(
@@ -0,0 +1,92 @@
+"""
+Streaming helpers for the NLLB translation service.
+
+Results are pushed to the client as NDJSON lines or Server-Sent Events as soon
+as they are decoded, instead of after the whole job has finished.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import re
+from typing import Callable, Dict, Optional
+
+from transformers import TextStreamer  # type: ignore
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# A placeholder such as __CRYPTO_TERM_3__ may arrive split across token chunks
+_PLACEHOLDER = re.compile(r"__CRYPTO_TERM_\d+__")
+# Text ending in a proper prefix of a placeholder: "_", "__", "__C", ..., "__CRYPTO_TERM_3", "__CRYPTO_TERM_3_"
+_PARTIAL_PLACEHOLDER = re.compile(
+    functools.reduce(lambda rest, char: f"{re.escape(char)}(?:{rest})?", reversed("__CRYPTO_TERM_"), r"\d+_?") + "$"
+)
+
+
+def wants_sse(accept: Optional[str], format: Optional[str] = None) -> bool:
+    """Whether the client asked for Server-Sent Events rather than NDJSON"""
+    if format:
+        return format.lower() == "sse"
+    return SSE_MEDIA_TYPE in (accept or "")
+
+
+def format_event(event: Dict, sse: bool) -> str:
+    """Encode one event as an NDJSON line or an SSE message"""
+    data = json.dumps(event, ensure_ascii=False)
+    if sse:
+        return f"event: {event.get('type', 'message')}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+class AsyncTextStreamer(TextStreamer):
+    """Forwards decoded text from the inference thread to an asyncio queue"""
+
+    def __init__(self, tokenizer, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.queue = queue
+        self.loop = loop
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+        if stream_end:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+
+class IncrementalRestorer:
+    """Restores protected terms in streamed text without emitting half a placeholder"""
+
+    def __init__(self, restore: Callable[[str], str]):
+        self._restore = restore
+        self._text = ""
+        self._emitted = ""
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of model output, returning the newly safe restored text"""
+        self._text += chunk
+        # Only the text after the last complete placeholder can be the start of another one
+        # (the closing "__" of a finished placeholder is not)
+        complete = 0
+        for match in _PLACEHOLDER.finditer(self._text):
+            complete = match.end()
+        partial = _PARTIAL_PLACEHOLDER.search(self._text, complete)
+        safe = self._text[:partial.start()] if partial else self._text
+        return self._advance(self._restore(safe))
+
+    def finish(self) -> str:
+        """Flush whatever is left once the model is done"""
+        return self._advance(self._restore(self._text))
+
+    @property
+    def text(self) -> str:
+        return self._emitted
+
+    def _advance(self, restored: str) -> str:
+        # Restoration may rewrite text that was already sent (e.g. model output that only
+        # looked like part of a placeholder); resync and send everything after the common prefix
+        common = len(os.path.commonprefix([restored, self._emitted]))
+        delta = restored[common:]
+        self._emitted = restored
+        return delta
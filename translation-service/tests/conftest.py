@@ -0,0 +1,6 @@
+"""The service modules are flat siblings imported by name, as server.py does"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
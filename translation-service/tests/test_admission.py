@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import AdmissionController, MemoryEstimator, MemoryPressureError, process_memory
+from inference_queue import QueueFullError
+
+MB = 2**20
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    """Sampled memory use of every process, set by the test"""
+    sizes = {"per_process": 100 * MB}
+    monkeypatch.setattr(admission, "process_memory", lambda pid: sizes["per_process"])
+    return sizes
+
+
+def test_generate_estimate_grows_with_the_work():
+    estimator = MemoryEstimator()
+    base = estimator.generate_bytes(1, 32, 32)
+    assert estimator.generate_bytes(8, 32, 32) > base
+    assert estimator.generate_bytes(1, 32, 32, beams=4) > base
+    assert estimator.generate_bytes(1, 256, 32) > base
+    assert estimator.generate_bytes(1, 32, 256) > base
+    assert estimator.encode_bytes(8, 32) > estimator.encode_bytes(1, 32) > 0
+
+
+def test_estimator_from_checkpoint(tmp_path):
+    (tmp_path / "config.json").write_text(json.dumps({"d_model": 64, "decoder_layers": 2, "vocab_size": 1000}))
+    small = MemoryEstimator.from_checkpoint(str(tmp_path), dtype_bytes=2)
+    assert (small.d_model, small.decoder_layers, small.vocab_size, small.dtype_bytes) == (64, 2, 1000, 2)
+    assert small.generate_bytes(1, 32, 32) < MemoryEstimator().generate_bytes(1, 32, 32)
+
+    missing = MemoryEstimator.from_checkpoint(str(tmp_path / "missing"))
+    assert missing.d_model == 1024
+
+
+def test_process_memory_of_this_process():
+    used = process_memory(os.getpid())
+    assert used is None or used > 0
+
+
+def test_check_throttles_above_the_high_water_mark(memory):
+    controller = AdmissionController(1000 * MB, high_watermark=0.5, sample_seconds=0)
+    controller.check(retry_after=3)
+
+    memory["per_process"] = 600 * MB
+    with pytest.raises(MemoryPressureError) as error:
+        controller.check(retry_after=3)
+    assert isinstance(error.value, QueueFullError) and error.value.retry_after == 3
+    assert controller.throttled == 1
+    assert controller.stats()["peak_used_mb"] == 600
+
+
+def test_watched_processes_count(memory):
+    controller = AdmissionController(1000 * MB, high_watermark=0.5, sample_seconds=0)
+    controller.watch(lambda: [1, 2, 3, 4, 5])
+    with pytest.raises(MemoryPressureError):
+        controller.check(retry_after=1)  # 6 processes x 100 MB pass the 500 MB mark
+
+
+def test_no_limit_never_throttles(memory):
+    memory["per_process"] = 10**6 * MB
+    controller = AdmissionController(0, sample_seconds=0)
+    controller.check(retry_after=1)
+    with controller.reserve(10**6 * MB):
+        pass
+
+
+def test_reservation_waits_until_it_fits(memory):
+    controller = AdmissionController(1000 * MB, high_watermark=0.5, sample_seconds=0.01)
+    order = []
+
+    def second_job():
+        with controller.reserve(300 * MB):
+            order.append("second")
+
+    with controller.reserve(300 * MB):
+        thread = threading.Thread(target=second_job)
+        thread.start()
+        time.sleep(0.1)
+        order.append("first")  # 100 MB used + 600 MB reserved would pass the 500 MB mark
+    thread.join(5)
+
+    assert order == ["first", "second"]
+    assert controller.waits == 1 and controller.reserved == 0
+
+
+def test_oversized_job_runs_alone(memory):
+    controller = AdmissionController(1000 * MB, high_watermark=0.5, sample_seconds=0)
+    with controller.reserve(2000 * MB):
+        assert controller.reserved == 2000 * MB
+    assert controller.waits == 0 and controller.reserved == 0
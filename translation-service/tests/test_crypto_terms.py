@@ -0,0 +1,83 @@
+import os
+import re
+
+import pytest
+
+from crypto_terms import TermProtector, build_trie_pattern, read_terms_file
+
+TERMS = ["Bitcoin", "Bitcoin Cash", "BTC", "Ethereum", "DeFi", "ERC-20"]
+
+
+@pytest.fixture
+def protector():
+    return TermProtector(TERMS)
+
+
+def test_trie_matches_exactly_the_terms():
+    pattern = re.compile(f"^(?:{build_trie_pattern(['bit', 'bitcoin', 'bitcoin cash', 'eth'])})$")
+    for term in ["bit", "bitcoin", "bitcoin cash", "eth"]:
+        assert pattern.match(term)
+    for other in ["bitc", "bitcoin c", "et", "ether"]:
+        assert not pattern.match(other)
+
+
+def test_protect_and_restore_round_trip(protector):
+    text = "Bitcoin Cash and bitcoin beat ETHEREUM; Bitcoin again."
+    protected, replacements = protector.protect(text)
+    assert protected == "__CRYPTO_TERM_0__ and __CRYPTO_TERM_1__ beat __CRYPTO_TERM_2__; __CRYPTO_TERM_3__ again."
+    assert replacements["__CRYPTO_TERM_0__"] == "Bitcoin Cash"  # longest term wins
+    assert TermProtector.restore(protected, replacements) == text
+
+
+def test_repeated_term_shares_a_placeholder(protector):
+    protected, replacements = protector.protect("BTC, BTC and BTC")
+    assert protected == "__CRYPTO_TERM_0__, __CRYPTO_TERM_0__ and __CRYPTO_TERM_0__"
+    assert replacements == {"__CRYPTO_TERM_0__": "BTC"}
+
+
+def test_word_boundaries(protector):
+    protected, replacements = protector.protect("BTCUSD my_bitcoin DeFis ERC-20s")
+    assert replacements == {}
+    assert protected == "BTCUSD my_bitcoin DeFis ERC-20s"
+
+
+def test_terms_next_to_placeholders(protector):
+    protected, replacements = protector.protect("__KEEP_0__Bitcoin__KEEP_1__ rose")
+    assert protected == "__KEEP_0____CRYPTO_TERM_0____KEEP_1__ rose"
+    assert replacements == {"__CRYPTO_TERM_0__": "Bitcoin"}
+
+
+def test_restore_leaves_unknown_placeholders():
+    assert TermProtector.restore("__CRYPTO_TERM_5__ up", {"__CRYPTO_TERM_0__": "BTC"}) == "__CRYPTO_TERM_5__ up"
+
+
+def test_terms_file_reloads_after_edit(tmp_path):
+    path = tmp_path / "terms.txt"
+    path.write_text("# tickers\nSOL\n\n", encoding="utf-8")
+    protector = TermProtector(["BTC"], str(path), check_interval=0)
+    assert protector.term_count == 2
+    assert protector.protect("SOL and BTC")[1] == {"__CRYPTO_TERM_0__": "SOL", "__CRYPTO_TERM_1__": "BTC"}
+
+    version = protector.version
+    path.write_text("SOL\nCardano\n", encoding="utf-8")
+    os.utime(path, (1, 1))  # a different mtime, however fast the filesystem
+    assert protector.protect("Cardano")[1] == {"__CRYPTO_TERM_0__": "Cardano"}
+    assert protector.term_count == 3 and protector.version != version
+
+
+def test_glossary_keeps_specific_terms_only(tmp_path):
+    definition = "A long definition line that explains the term above in more than a hundred and twenty characters, so the file reads as a glossary."
+    path = tmp_path / "glossary.txt"
+    path.write_text(
+        "\n".join([
+            "A", definition,
+            "Block", definition,
+            "Bull market", definition,
+            "Decentralized Autonomous Organization (DAO)", definition,
+            "ERC-20 / Token standard", definition,
+        ]),
+        encoding="utf-8",
+    )
+    assert read_terms_file(str(path)) == [
+        "Bull market", "Decentralized Autonomous Organization", "DAO", "ERC-20", "Token standard",
+    ]
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+from dedup import InFlight
+from inference_queue import DeadlineExceededError
+
+
+def key(text="Bitcoin rose"):
+    return InFlight.key(text, "eng_Latn", "fra_Latn", "balanced", "standard")
+
+
+def test_key_normalizes_text():
+    assert key("Bitcoin  rose ") == key("Bitcoin rose")
+    assert key("Bitcoin rose") != InFlight.key("Bitcoin rose", "eng_Latn", "hau_Latn", "balanced", "standard")
+
+
+def test_waiters_share_the_owners_translation():
+    async def main():
+        flights = InFlight()
+        assert flights.claim(key(), "interactive") == (True, None)
+        owned, shared = flights.claim(key(), "batch")
+        assert not owned and shared is not None
+        waiter = asyncio.ensure_future(InFlight.wait(shared))
+        await asyncio.sleep(0)
+        flights.resolve(key(), "Le bitcoin a monté")
+        assert await waiter == "Le bitcoin a monté"
+        # Resolved keys are free to claim again
+        assert flights.claim(key(), "batch") == (True, None)
+        return flights.stats()
+
+    assert asyncio.run(main()) == {"in_flight": 1, "claimed": 2, "joined": 1, "bypassed": 0}
+
+
+def test_higher_priority_work_does_not_wait_for_lower():
+    async def main():
+        flights = InFlight()
+        flights.claim(key(), "background")
+        assert flights.claim(key(), "interactive") == (False, None)
+        assert flights.claim(key(), "background")[1] is not None
+        return flights.bypassed
+
+    assert asyncio.run(main()) == 1
+
+
+def test_abandoned_translation_releases_waiters():
+    async def main():
+        flights = InFlight()
+        flights.claim(key(), "interactive")
+        _, shared = flights.claim(key(), "interactive")
+        assert shared is not None
+        waiter = asyncio.ensure_future(InFlight.wait(shared))
+        await asyncio.sleep(0)
+        flights.abandon(key())
+        return await waiter
+
+    assert asyncio.run(main()) is None
+
+
+def test_waiter_deadline():
+    async def main():
+        flights = InFlight()
+        flights.claim(key(), "interactive")
+        _, shared = flights.claim(key(), "interactive")
+        assert shared is not None
+        with pytest.raises(DeadlineExceededError):
+            await InFlight.wait(shared, time.perf_counter() + 0.05)
+        # A waiter giving up does not cancel the translation for the others
+        assert not shared.cancelled()
+        with pytest.raises(DeadlineExceededError):
+            await InFlight.wait(shared, time.perf_counter() - 1)
+
+    asyncio.run(main())
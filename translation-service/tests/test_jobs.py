@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+from inference_queue import QueueFullError
+from jobs import CANCELLED, COMPLETED, QUEUED, RUNNING, JobRunner, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def create(store, texts=("a", "b", "c")) -> str:
+    return store.create(list(texts), "en", ["sw"], {"profile": "balanced"})
+
+
+def test_create_and_get(store):
+    job_id = create(store)
+    job = store.get(job_id)
+    assert job["status"] == QUEUED
+    assert job["target_langs"] == ["sw"]
+    assert job["options"] == {"profile": "balanced"}
+    assert (job["total"], job["completed"], job["progress"]) == (3, 0, 0.0)
+    assert store.get("missing") is None
+
+
+def test_results_are_paged_in_input_order(store):
+    job_id = create(store, [f"text {i}" for i in range(5)])
+    store.save_results(job_id, {3: {"sw": "tatu"}, 0: {"sw": "sifuri"}, 1: {"sw": "moja"}})
+    assert store.get(job_id)["completed"] == 3
+    assert [item["index"] for item in store.results(job_id, 0, 10)] == [0, 1, 3]
+    assert store.results(job_id, 1, 1) == [{"index": 1, "translations": {"sw": "moja"}}]
+    assert store.pending_texts(job_id, 10) == [(2, "text 2"), (4, "text 4")]
+
+
+def test_list_is_newest_first_and_paged(store):
+    ids = []
+    for _ in range(3):
+        ids.append(create(store))
+        time.sleep(0.01)
+    assert [job["id"] for job in store.list(2)] == ids[:0:-1]
+    assert [job["id"] for job in store.list(2, offset=2)] == [ids[0]]
+
+
+def test_interrupted_jobs_run_first(store):
+    first = create(store)
+    time.sleep(0.01)
+    second = create(store)
+    assert store.next_runnable()["id"] == first
+    store.set_status(second, RUNNING)
+    assert store.next_runnable()["id"] == second
+
+
+def test_survives_reopen(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    job_id = create(JobStore(path))
+    job = JobStore(path).get(job_id)
+    assert job is not None and job["total"] == 3
+
+
+def test_delete(store):
+    job_id = create(store)
+    store.delete(job_id)
+    assert store.get(job_id) is None
+    assert store.pending_texts(job_id, 10) == []
+
+
+def run_jobs(store, translate_chunk, until, is_busy=lambda: False, chunk_size=2):
+    async def main():
+        runner = JobRunner(store, translate_chunk, is_busy, chunk_size=chunk_size)
+        runner.start()
+        runner.notify()
+        for _ in range(200):
+            if until():
+                break
+            await asyncio.sleep(0.01)
+        assert runner._task is not None
+        runner._task.cancel()
+    asyncio.run(main())
+
+
+def test_runner_completes_jobs_in_chunks(store):
+    job_id = create(store, ["a", "b", "c"])
+    chunks = []
+
+    async def translate_chunk(job, texts):
+        chunks.append(texts)
+        return [{"sw": text.upper()} for text in texts]
+
+    run_jobs(store, translate_chunk, until=lambda: store.get(job_id)["status"] == COMPLETED)
+    assert chunks == [["a", "b"], ["c"]]
+    assert [item["translations"]["sw"] for item in store.results(job_id, 0, 10)] == ["A", "B", "C"]
+
+
+def test_runner_retries_when_overloaded(store):
+    job_id = create(store, ["a"])
+    attempts = []
+
+    async def translate_chunk(job, texts):
+        attempts.append(texts)
+        if len(attempts) == 1:
+            raise QueueFullError(0)
+        return [{"sw": "x"}]
+
+    run_jobs(store, translate_chunk, until=lambda: store.get(job_id)["status"] == COMPLETED)
+    assert len(attempts) == 2
+
+
+def test_runner_stops_cancelled_jobs(store):
+    job_id = create(store, ["a", "b", "c", "d"])
+
+    async def translate_chunk(job, texts):
+        store.set_status(job_id, CANCELLED)
+        return [{"sw": "x"} for _ in texts]
+
+    run_jobs(store, translate_chunk, until=lambda: store.get(job_id)["status"] == CANCELLED)
+    assert store.get(job_id)["completed"] == 2
@@ -0,0 +1,96 @@
+import pytest
+
+from markup import protect_spans, restore_spans, split_markup
+
+HTML = (
+    '<html><head><meta name="description" content="Bitcoin news"></head><body>'
+    '<h1>Bitcoin is <em>not</em> a fad</h1>'
+    '<p>Read <a href="https://example.com/?a=1&amp;b=2">the docs</a> &amp; run <code>npm install</code>.<br>Now $70,000</p>'
+    '<p>Chart <span class="notranslate">BTC</span> up</p>'
+    '<script>var a = "<p>x</p>";</script><pre>code <b>x</b></pre>'
+    '<ul><li><a href="/one">Wrapped link</a></li></ul></body></html>'
+)
+
+MARKDOWN = (
+    "---\ntitle: x\n---\n"
+    "# Bitcoin is **not** a fad\n\n"
+    "Read the [docs](https://example.com/a_b) and run `npm i`\nwhich wraps *here* \\*literally\\*.\n\n"
+    "- item _one_\n- [Wrapped link](/one)\n\n"
+    "| a | **b** |\n|---|---|\n\n"
+    "```\ncode\n```\n"
+)
+
+
+def nodes(document, fmt):
+    return [text for text, translatable in split_markup(document, fmt) if translatable]
+
+
+@pytest.mark.parametrize("document, fmt", [(HTML, "html"), (MARKDOWN, "markdown")])
+def test_pieces_join_to_document(document, fmt):
+    assert "".join(text for text, _ in split_markup(document, fmt)) == document
+
+
+@pytest.mark.parametrize("document, fmt", [(HTML, "html"), (MARKDOWN, "markdown")])
+def test_untouched_translation_restores_document(document, fmt):
+    rebuilt = []
+    for text, translatable in split_markup(document, fmt):
+        if translatable:
+            text = restore_spans(*protect_spans(text, fmt), fmt)
+        rebuilt.append(text)
+    assert "".join(rebuilt) == document
+
+
+def test_html_inline_markup_stays_in_its_sentence():
+    found = nodes(HTML, "html")
+    assert "Bitcoin is <em>not</em> a fad" in found
+    assert "Chart <span class=\"notranslate\">BTC</span> up" in found
+    assert "Wrapped link" in found
+    assert "Bitcoin news" in found
+    assert not any("var a" in node or "code <b>" in node for node in found)
+
+    text, replacements = protect_spans("Bitcoin is <em>not</em> a fad", "html")
+    assert text == "Bitcoin is __KEEP_0__not__KEEP_1__ a fad"
+    assert replacements == {"__KEEP_0__": "<em>", "__KEEP_1__": "</em>"}
+
+
+def test_html_protects_code_and_untranslated_elements_whole():
+    text, replacements = protect_spans('Chart <span class="notranslate">BTC</span> up', "html")
+    assert text == "Chart __KEEP_0__ up"
+    assert replacements["__KEEP_0__"] == '<span class="notranslate">BTC</span>'
+
+    node = next(node for node in nodes(HTML, "html") if node.startswith("Read"))
+    text, replacements = protect_spans(node, "html")
+    assert "npm" not in text and "&amp;" not in text and "& run" in text
+    assert "<code>npm install</code>" in replacements.values()
+    assert "https://example.com/?a=1&amp;b=2" not in text
+
+
+def test_markdown_inline_markup_stays_in_its_sentence():
+    found = nodes(MARKDOWN, "markdown")
+    assert "Bitcoin is **not** a fad" in found
+    assert "item _one_" in found
+    assert "Wrapped link" in found
+    # A paragraph wrapped over two lines is one node
+    assert "Read the [docs](https://example.com/a_b) and run `npm i`\nwhich wraps *here* \\*literally\\*." in found
+    assert "code" not in found and not any("title" in node for node in found)
+
+    text, replacements = protect_spans("Bitcoin is **not** a fad", "markdown")
+    assert text == "Bitcoin is __KEEP_0__not__KEEP_1__ a fad"
+    assert set(replacements.values()) == {"**"}
+
+
+def test_translated_text_is_escaped_for_the_format():
+    _, replacements = protect_spans("Bitcoin is **not** a fad", "markdown")
+    translated = "Le *bitcoin* n'est __KEEP_0__pas__KEEP_1__ un [effet] de_mode `x` \\"
+    assert restore_spans(translated, replacements, "markdown") == (
+        "Le \\*bitcoin\\* n'est **pas** un \\[effet] de\\_mode \\`x\\` \\\\"
+    )
+
+    _, replacements = protect_spans("Bitcoin is <em>not</em> a fad", "html")
+    assert restore_spans("A <b> & __KEEP_0__pas__KEEP_1__", replacements, "html") == "A &lt;b&gt; &amp; <em>pas</em>"
+    assert restore_spans("5 * 3", {}, "text") == "5 * 3"
+
+
+def test_lost_placeholder_fails_restore():
+    _, replacements = protect_spans("Bitcoin is **not** a fad", "markdown")
+    assert restore_spans("Bitcoin n'est pas __KEEP_1__ une mode", replacements, "markdown") is None
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+from backends import InferenceBackend
+from model_registry import ModelRegistry, parse_model_list, parse_routes
+
+MB = 2**20
+
+
+class FakeBackend(InferenceBackend):
+    """Stands in for a loaded model of a given size"""
+
+    def __init__(self, checkpoint, size_mb):
+        super().__init__("cpu")
+        self.checkpoint = checkpoint
+        self.size = int(size_mb * MB)
+
+    def memory_bytes(self):
+        return self.size
+
+    def describe(self):
+        return {"backend": "fake"}
+
+
+def make_registry(sizes_mb, budget_mb=0, load_seconds=0.0):
+    loads = []
+
+    def load(checkpoint) -> InferenceBackend:
+        loads.append(checkpoint)
+        time.sleep(load_seconds)
+        return FakeBackend(checkpoint, sizes_mb[checkpoint])
+
+    models = OrderedDict((f"tier-{checkpoint}", checkpoint) for checkpoint in sizes_mb)
+    registry = ModelRegistry(models, load, resolve_path=lambda checkpoint: "/nonexistent", memory_budget_mb=budget_mb)
+    return registry, loads
+
+
+def test_parse_model_list():
+    assert parse_model_list("standard=a/b, premium = c/d,") == OrderedDict([("standard", "a/b"), ("premium", "c/d")])
+    with pytest.raises(ValueError):
+        parse_model_list("a/b")
+    with pytest.raises(ValueError):
+        parse_model_list(" , ")
+
+
+def test_parse_routes():
+    assert parse_routes("eng_Latn:hau_Latn=premium, *:swh_Latn=standard") == {
+        ("eng_Latn", "hau_Latn"): "premium",
+        ("*", "swh_Latn"): "standard",
+    }
+
+
+def test_default_tier_must_be_configured():
+    with pytest.raises(ValueError):
+        ModelRegistry(OrderedDict(standard="a"), lambda checkpoint: FakeBackend(checkpoint, 10), lambda checkpoint: "", default="premium")
+
+
+def test_tiers_load_once_on_first_use():
+    registry, loads = make_registry({"small": 100, "large": 300})
+    assert registry.default == "tier-small" and registry.loaded_tiers() == []
+    first = registry.get("tier-large")
+    assert registry.get("tier-large") is first
+    assert loads == ["large"] and registry.is_loaded("tier-large")
+    assert registry.stats()["loaded"]["tier-large"]["uses"] == 2
+
+
+def test_least_recently_used_tier_is_evicted_but_never_the_default():
+    registry, loads = make_registry({"a": 100, "b": 100, "c": 100}, budget_mb=250)
+    registry.get("tier-a")  # default
+    registry.get("tier-b")
+    registry.get("tier-c")
+    assert registry.loaded_tiers() == ["tier-a", "tier-c"]
+    assert registry.evictions == 1
+
+    registry.get("tier-b")
+    assert registry.loaded_tiers() == ["tier-a", "tier-b"]
+    assert loads == ["a", "b", "c", "b"]
+    assert registry.memory_bytes() == {"tier-a": 100 * MB, "tier-b": 100 * MB}
+
+
+def test_concurrent_requests_share_one_load():
+    registry, loads = make_registry({"a": 100}, load_seconds=0.2)
+    backends = []
+    threads = [threading.Thread(target=lambda: backends.append(registry.get("tier-a"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert loads == ["a"]
+    assert len(backends) == 4 and all(backend is backends[0] for backend in backends)
+
+
+def test_failed_load_can_be_retried():
+    attempts = []
+
+    def load(checkpoint) -> InferenceBackend:
+        attempts.append(checkpoint)
+        if len(attempts) == 1:
+            raise OSError("download failed")
+        return FakeBackend(checkpoint, 10)
+
+    registry = ModelRegistry(OrderedDict(standard="a"), load, lambda checkpoint: "/nonexistent")
+    with pytest.raises(OSError):
+        registry.get("standard")
+    assert registry.get("standard").memory_bytes() == 10 * MB
+    assert attempts == ["a", "a"]
+
+
+def test_no_loading_after_workers_fork():
+    registry, loads = make_registry({"a": 100, "b": 100})
+    registry.get("tier-a")
+    registry.allow_loading = False
+    assert registry.get("tier-a") is not None
+    with pytest.raises(RuntimeError):
+        registry.get("tier-b")
+    assert loads == ["a"]
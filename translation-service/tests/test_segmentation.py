@@ -0,0 +1,69 @@
+import pytest
+
+from segmentation import reassemble, split_document, split_sentences
+
+
+def segments(pieces):
+    return [text for text, translatable in pieces if translatable]
+
+
+def count_chars(text):
+    """One token per character, plus the language prefix and </s>"""
+    return len(text) + 2
+
+
+def test_pieces_join_to_document():
+    document = "  Bitcoin rose 5%. Dr. Smith agreed!\nEthereum fell.\n\n\tNew paragraph?  "
+    pieces = split_document(document, "eng_Latn")
+    assert "".join(text for text, _ in pieces) == document
+    assert segments(pieces) == ["Bitcoin rose 5%.", "Dr. Smith agreed!", "Ethereum fell.", "New paragraph?"]
+
+
+def test_abbreviations_and_decimals_do_not_end_sentences():
+    assert segments(split_sentences("BTC hit 1.5 million vs. ETH. It is up.", "eng_Latn", 1000)) == [
+        "BTC hit 1.5 million vs. ETH.", "It is up."
+    ]
+
+
+def test_unspaced_terminators():
+    assert segments(split_sentences("比特币上涨。以太坊下跌！", "zho_Hans", 1000)) == ["比特币上涨。", "以太坊下跌！"]
+    assert segments(split_sentences("ቢትኮይን ጨመረ።ኢቴሬም ወደቀ።", "amh_Ethi", 1000)) == ["ቢትኮይን ጨመረ።", "ኢቴሬም ወደቀ።"]
+
+
+def test_long_sentences_break_at_clauses_then_spaces():
+    sentence = "first clause here, second clause here, " + "word " * 20 + "end"
+    pieces = split_document(sentence, "eng_Latn", max_chars=30)
+    assert "".join(text for text, _ in pieces) == sentence
+    assert all(len(text) <= 30 for text in segments(pieces))
+
+
+@pytest.mark.parametrize("document", [
+    "https://example.com/" + "a" * 200,
+    "比特币" * 100,
+    "See https://example.com/" + "a" * 200 + " for details",
+])
+def test_runs_without_spaces_are_cut_by_token_count(document):
+    # Without a token limit the run stays whole, however long
+    assert max(len(text) for text in segments(split_document(document, "eng_Latn", max_chars=50))) > 100
+
+    pieces = split_document(document, "eng_Latn", max_chars=50, count_tokens=count_chars, max_tokens=64)
+    assert "".join(text for text, _ in pieces) == document
+    assert all(count_chars(text) <= 64 for text in segments(pieces))
+
+
+def test_token_cut_prefers_whitespace():
+    pieces = split_document("aaaa " * 30, "eng_Latn", max_chars=1000, count_tokens=count_chars, max_tokens=42)
+    assert all(text.strip() == text and count_chars(text) <= 42 for text in segments(pieces))
+    assert not any("aaaa" not in text for text in segments(pieces))
+
+
+def test_token_cut_keeps_placeholders_whole():
+    document = "x" * 30 + "__CRYPTO_TERM_12__" + "y" * 30
+    pieces = split_document(document, "eng_Latn", count_tokens=count_chars, max_tokens=40)
+    assert "".join(text for text, _ in pieces) == document
+    assert any("__CRYPTO_TERM_12__" in text for text in segments(pieces))
+
+
+def test_reassemble():
+    pieces = split_document("One. Two.\n\nThree.", "eng_Latn")
+    assert reassemble(pieces, ["Un.", "Deux.", "Trois."]) == "Un. Deux.\n\nTrois."
@@ -0,0 +1,64 @@
+import pytest
+
+from crypto_terms import TermProtector
+from streaming import IncrementalRestorer, format_event, wants_sse
+
+REPLACEMENTS = {"__CRYPTO_TERM_0__": "Bitcoin", "__CRYPTO_TERM_12__": "DeFi"}
+
+
+def restorer() -> IncrementalRestorer:
+    return IncrementalRestorer(lambda text: TermProtector.restore(text, REPLACEMENTS))
+
+
+def stream(chunks) -> tuple:
+    """(concatenated deltas, final text) of streaming the chunks"""
+    r = restorer()
+    sent = "".join(r.feed(chunk) for chunk in chunks) + r.finish()
+    return sent, r.text
+
+
+def test_placeholder_in_its_own_chunk():
+    assert stream(["Nilinunua ", "__CRYPTO_TERM_0__"]) == ("Nilinunua Bitcoin", "Nilinunua Bitcoin")
+
+
+@pytest.mark.parametrize("text", [
+    "Nilinunua __CRYPTO_TERM_0__ jana",
+    "__CRYPTO_TERM_12__ na __CRYPTO_TERM_0__",
+    "bei ya __CRYPTO_TERM_0____CRYPTO_TERM_12__",
+])
+def test_placeholder_split_at_every_position(text):
+    expected = TermProtector.restore(text, REPLACEMENTS)
+    for split in range(len(text) + 1):
+        assert stream([text[:split], text[split:]]) == (expected, expected), split
+
+
+def test_one_character_per_chunk():
+    text = "Nilinunua __CRYPTO_TERM_0__ na __CRYPTO_TERM_12__."
+    assert stream(list(text)) == ("Nilinunua Bitcoin na DeFi.", "Nilinunua Bitcoin na DeFi.")
+
+
+def test_partial_placeholder_is_held_back():
+    r = restorer()
+    assert r.feed("bei ya __CRYPTO_TE") == "bei ya "
+    assert r.feed("RM_0") == ""
+    assert r.feed("__ leo") == "Bitcoin leo"
+
+
+def test_underscores_that_are_not_a_placeholder_are_flushed():
+    assert stream(["snake_", "case __init__"]) == ("snake_case __init__", "snake_case __init__")
+
+
+def test_unknown_placeholder_is_left_as_is():
+    assert stream(["__CRYPTO_TERM_", "7__ x"]) == ("__CRYPTO_TERM_7__ x", "__CRYPTO_TERM_7__ x")
+
+
+def test_format_event():
+    assert format_event({"type": "token", "text": "é"}, sse=False) == '{"type": "token", "text": "é"}\n'
+    assert format_event({"type": "done"}, sse=True) == 'event: done\ndata: {"type": "done"}\n\n'
+
+
+def test_wants_sse():
+    assert wants_sse("text/event-stream")
+    assert not wants_sse("application/json")
+    assert wants_sse("application/json", format="sse")
+    assert not wants_sse("text/event-stream", format="ndjson")
@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+
+from translation_memory import EXACT, TEMPLATE, TranslationMemory, make_template, numbers_in, substitute_numbers
+
+KEY = ("eng_Latn", "swh_Latn", "scope")
+
+
+@pytest.fixture
+def memory():
+    return TranslationMemory(None)
+
+
+def store(memory, source, translation):
+    memory.store(source, translation, *KEY)
+
+
+def lookup(memory, source):
+    return memory.lookup(source, *KEY)
+
+
+def test_numbers_in_skips_placeholders():
+    assert numbers_in("__CRYPTO_TERM_0__ rose 5% to $70,000 (3.25)") == ["5", "70,000", "3.25"]
+
+
+def test_template_masks_numbers_only():
+    assert make_template("BTC  rose 5%") == make_template("BTC rose 7%")
+    assert make_template("BTC rose 5%") != make_template("BTC fell 5%")
+
+
+def test_substitute_numbers():
+    assert substitute_numbers("ilipanda 5% hadi 70,000", ["5", "70,000"], ["3", "68,500"]) == "ilipanda 3% hadi 68,500"
+    # An old number that occurs twice (or not at all) in the translation is ambiguous
+    assert substitute_numbers("5 na 5", ["5"], ["6"]) is None
+    assert substitute_numbers("tano", ["5"], ["6"]) is None
+    # The same old number cannot become two different ones
+    assert substitute_numbers("5 5", ["5", "5"], ["6", "7"]) is None
+
+
+def test_exact_match_ignores_whitespace(memory):
+    store(memory, "Bitcoin rose today.", "Bitcoin ilipanda leo.")
+    assert lookup(memory, "Bitcoin  rose today. ") == ("Bitcoin ilipanda leo.", EXACT)
+
+
+def test_template_match_substitutes_numbers(memory):
+    store(memory, "BTC rose 5% to $70,000", "BTC ilipanda 5% hadi $70,000")
+    assert lookup(memory, "BTC rose 3% to $68,500") == ("BTC ilipanda 3% hadi $68,500", TEMPLATE)
+
+
+@pytest.mark.parametrize("query", ["BTC is not up.", "Is BTC up?", "BTC is up?", "BTC is up!", "ETH is up."])
+def test_near_duplicates_are_not_reused(memory, query):
+    store(memory, "BTC is up.", "BTC imepanda.")
+    assert lookup(memory, query) is None
+
+
+def test_matches_are_scoped(memory):
+    store(memory, "Hello", "Habari")
+    assert memory.lookup("Hello", "eng_Latn", "hau_Latn", "scope") is None
+    assert memory.lookup("Hello", "eng_Latn", "swh_Latn", "other") is None
+
+
+def test_store_replaces_translation(memory):
+    store(memory, "Hello", "Habari")
+    store(memory, "Hello", "Jambo")
+    assert lookup(memory, "Hello") == ("Jambo", EXACT)
+    assert memory.stats()["segments"] == 1
+
+
+def test_size_limit_drops_oldest():
+    memory = TranslationMemory(None, max_segments=100)
+    memory.store_many([(f"text {i} words", f"maneno {i}", *KEY) for i in range(150)])
+    assert memory.stats()["segments"] <= 100
+    assert lookup(memory, "text 149 words") == ("maneno 149", EXACT)
+
+
+def test_persists_and_drops_old_band_table(tmp_path):
+    path = str(tmp_path / "tm.sqlite3")
+    store(TranslationMemory(path), "Hello", "Habari")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE bands (band_hash INTEGER, segment_id INTEGER)")
+    db.commit()
+    db.close()
+    reopened = TranslationMemory(path)
+    assert lookup(reopened, "Hello") == ("Habari", EXACT)
+    assert sqlite3.connect(path).execute("SELECT name FROM sqlite_master WHERE name = 'bands'").fetchone() is None
+
+
+def test_stats(memory):
+    store(memory, "Hello", "Habari")
+    lookup(memory, "Hello")
+    lookup(memory, "Goodbye")
+    stats = memory.stats()
+    assert stats["lookups"] == 2
+    assert stats["hits"] == {EXACT: 1, TEMPLATE: 0}
+    assert stats["match_rate"] == 0.5
@@ -0,0 +1,70 @@
+import os
+import signal
+import time
+
+import pytest
+
+from worker_pool import WorkerPool, fork_available
+
+pytestmark = pytest.mark.skipif(not fork_available(), reason="needs fork()")
+
+_state = {"initialized": False}
+
+
+def _initialize():
+    _state["initialized"] = True
+
+
+def _job(value):
+    return os.getpid(), _state["initialized"], value
+
+
+def _exit():
+    os._exit(3)
+
+
+def _fail():
+    raise ValueError("bad input")
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(2, 1, initializer=_initialize)
+    pool.start()
+    yield pool
+    for pid in pool.pids() + [pool._server.pid]:
+        os.kill(pid, signal.SIGKILL)
+
+
+def test_runs_jobs_in_workers(pool):
+    pid, initialized, value = pool.call(0, _job, (7,))
+    assert pid != os.getpid() and initialized and value == 7
+    assert pool.call(1, _job, (8,))[0] not in (pid, os.getpid())
+
+
+def test_job_errors_are_raised(pool):
+    with pytest.raises(ValueError, match="bad input"):
+        pool.call(0, _fail, ())
+    assert pool.stats()["restarts"] == 0
+
+
+def test_worker_that_exits_is_replaced(pool):
+    with pytest.raises(RuntimeError, match="exit code 3"):
+        pool.call(0, _exit, ())
+    pid, initialized, _ = pool.call(0, _job, (1,))
+    assert initialized
+    assert pool.stats()["alive"] == 2 and pool.stats()["restarts"] == 1
+
+
+def test_killed_worker_is_replaced_before_its_next_job(pool):
+    os.kill(pool.pids()[1], signal.SIGKILL)
+    time.sleep(0.2)
+    assert pool.stats()["alive"] == 1
+    assert pool.call(1, _job, (2,))[2] == 2
+    assert pool.stats()["alive"] == 2
+
+    # A replacement can be replaced again
+    os.kill(pool.pids()[1], signal.SIGKILL)
+    time.sleep(0.2)
+    assert pool.call(1, _job, (3,))[2] == 3
+    assert pool.stats()["restarts"] == 2
@@ -0,0 +1,84 @@
+"""
+Thread-safe tokenization for the NLLB translation service.
+
+The Hugging Face tokenizer keeps the source language and the padding and
+truncation settings as mutable state on one shared object. Setting
+``src_lang`` or calling it with different options from two inference threads
+races: a request can be encoded with another request's language prefix, or
+the Rust tokenizer raises "Already borrowed".
+
+NllbTokenizer never mutates anything after construction. It encodes with a
+private copy of the Rust tokenizer without special tokens. The NLLB language
+prefix and the end-of-sentence token come from a language-token table built
+once at startup, so any number of threads can tokenize and decode at once.
+"""
+
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import torch  # type: ignore
+from tokenizers import Tokenizer  # type: ignore
+
+
+class NllbTokenizer:
+    """Reentrant NLLB encode/decode with a precomputed language-token table"""
+
+    def __init__(self, tokenizer, languages: Iterable[str]):
+        # Private copy with padding and truncation switched off once; only read from then on
+        self._backend = Tokenizer.from_str(tokenizer.backend_tokenizer.to_str())
+        self._backend.no_padding()
+        self._backend.no_truncation()
+        self._clean_up = tokenizer.clean_up_tokenization if tokenizer.clean_up_tokenization_spaces else None
+        self.pad_token_id = tokenizer.pad_token_id
+        self.eos_token_id = tokenizer.eos_token_id
+        self.unk_token_id = tokenizer.unk_token_id
+        self.language_ids: Dict[str, int] = {}
+        for code in languages:
+            token_id = tokenizer.convert_tokens_to_ids(code)
+            if token_id is None or token_id == self.unk_token_id:
+                raise ValueError(f"Language code {code} is not in the tokenizer vocabulary")
+            self.language_ids[code] = token_id
+        # Every other NLLB language the checkpoint knows (its language tokens are special tokens)
+        for code in tokenizer.additional_special_tokens:
+            token_id = tokenizer.convert_tokens_to_ids(code)
+            if "_" in code and token_id is not None and token_id != self.unk_token_id:
+                self.language_ids.setdefault(code, token_id)
+
+    def supports(self, code: str) -> bool:
+        """Whether an NLLB language code is in the language-token table"""
+        return code in self.language_ids
+
+    def language_id(self, code: str) -> int:
+        """Token id of an NLLB language code (forced BOS for the target, prefix for the source)"""
+        token_id = self.language_ids.get(code)
+        if token_id is None:
+            raise ValueError(f"Unknown language code: {code}")
+        return token_id
+
+    def encode(self, texts: Sequence[str], src_lang: str, max_length: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Padded input_ids and attention_mask laid out as "<src_lang> text </s>", truncated to max_length"""
+        prefix = self.language_id(src_lang)
+        rows = [
+            [prefix] + encoding.ids[:max_length - 2] + [self.eos_token_id]
+            for encoding in self._backend.encode_batch(list(texts), add_special_tokens=False)
+        ]
+        longest = max(len(row) for row in rows)
+        input_ids = torch.full((len(rows), longest), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), longest), dtype=torch.long)
+        for i, row in enumerate(rows):
+            input_ids[i, :len(row)] = torch.tensor(row, dtype=torch.long)
+            attention_mask[i, :len(row)] = 1
+        return input_ids, attention_mask
+
+    def count(self, text: str) -> int:
+        """Number of tokens of an encoded text, including the language prefix and </s>"""
+        return len(self._backend.encode(text, add_special_tokens=False).ids) + 2
+
+    def decode(self, token_ids, skip_special_tokens: bool = True, **kwargs) -> str:
+        """Text for one sequence of token ids (compatible with the transformers streamers)"""
+        return self.batch_decode([token_ids], skip_special_tokens=skip_special_tokens)[0]
+
+    def batch_decode(self, sequences, skip_special_tokens: bool = True) -> List[str]:
+        if isinstance(sequences, torch.Tensor):
+            sequences = sequences.tolist()
+        texts = self._backend.decode_batch([list(ids) for ids in sequences], skip_special_tokens=skip_special_tokens)
+        return [self._clean_up(text) for text in texts] if self._clean_up is not None else texts
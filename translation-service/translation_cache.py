@@ -0,0 +1,228 @@
+"""
+Two-tier translation result cache for the NLLB translation service.
+
+A size-bounded in-memory LRU sits in front of a persistent SQLite store, so
+repeated headlines, disclaimers and ticker blurbs skip beam search entirely
+and stay cached across restarts.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Column used to pick victims when the on-disk store is over its size limit
+EVICTION_ORDER = {
+    "lru": "last_access",   # least recently used
+    "lfu": "hits",          # least frequently used
+    "fifo": "created_at",   # oldest first
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str, keep_layout: bool = False) -> str:
+    """Normalize text for cache lookups (unicode form and whitespace)
+
+    With keep_layout only the unicode form is normalized: segmented texts are
+    translated with their original whitespace and paragraph breaks, so texts
+    laid out differently must not share an entry.
+    """
+    text = unicodedata.normalize("NFC", text)
+    return text if keep_layout else _WHITESPACE.sub(" ", text).strip()
+
+
+class TranslationCache:
+    """In-memory LRU backed by a persistent SQLite store"""
+
+    def __init__(
+        self,
+        path: Optional[str],
+        model_name: str,
+        max_memory_items: int = 10000,
+        max_disk_items: int = 500000,
+        ttl_seconds: float = 30 * 24 * 3600,
+        eviction: str = "lru",
+    ):
+        if eviction not in EVICTION_ORDER:
+            raise ValueError(f"Unknown cache eviction policy: {eviction}")
+
+        self.path = path
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl_seconds = ttl_seconds
+        self.eviction = eviction
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes_since_prune = 0
+        self._disk_items = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            self._open(path)
+
+    def _open(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        for column in ("created_at", "last_access", "hits"):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_translations_{column} ON translations ({column})")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        # Invalidate everything produced by a different model
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'model'").fetchone()
+        if row is not None and row[0] != self.model_name:
+            logger.info(f"Model changed ({row[0]} -> {self.model_name}), clearing translation cache")
+            self._db.execute("DELETE FROM translations")
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES ('model', ?)", (self.model_name,)
+        )
+        self._prune()
+
+    def make_key(
+        self,
+        text: str,
+        src_lang: str,
+        tgt_lang: str,
+        preserve_crypto_terms: bool,
+        decoding: dict,
+        terms_version: str = "",
+        keep_layout: bool = False,
+    ) -> str:
+        """Cache key for one translation (keep_layout for texts whose whitespace is kept in the output)"""
+        raw = json.dumps(
+            [
+                normalize_text(text, keep_layout),
+                src_lang,
+                tgt_lang,
+                self.model_name,
+                preserve_crypto_terms,
+                terms_version,
+                decoding,
+            ],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a translation, promoting disk hits into memory"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM translations WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if now - created_at <= self.ttl_seconds:
+                        self._db.execute(
+                            "UPDATE translations SET last_access = ?, hits = hits + 1 WHERE key = ?",
+                            (now, key),
+                        )
+                        self._remember(key, value, created_at)
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM translations WHERE key = ?", (key,))
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str):
+        """Store a translation in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    """INSERT OR REPLACE INTO translations (key, value, model, created_at, last_access, hits)
+                    VALUES (?, ?, ?, ?, ?, 0)""",
+                    (key, value, self.model_name, now, now),
+                )
+                self._writes_since_prune += 1
+                self._disk_items += 1
+                if self._writes_since_prune >= 1000:
+                    self._prune()
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _prune(self):
+        """Drop expired entries and enforce the on-disk size limit"""
+        self._writes_since_prune = 0
+        if self._db is None:
+            return
+        self._db.execute("DELETE FROM translations WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        count = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        excess = count - self.max_disk_items
+        if excess > 0:
+            order = EVICTION_ORDER[self.eviction]
+            self._db.execute(
+                f"DELETE FROM translations WHERE key IN (SELECT key FROM translations ORDER BY {order} ASC LIMIT ?)",
+                (excess,),
+            )
+            count -= excess
+        self._disk_items = count
+
+    def clear(self):
+        """Invalidate every cached translation"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM translations")
+            self._disk_items = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters for the health endpoint"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_items": self._disk_items if self._db is not None else None,  # approximate between prunes
+            "eviction": self.eviction,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -0,0 +1,255 @@
+"""
+Segment-level translation memory for the NLLB translation service.
+
+Every translated segment is stored as (source segment, target language,
+translation). A new segment can reuse an earlier translation in two ways:
+
+- exact     same text after whitespace/unicode normalization
+- template  same text once numbers are masked ("Bitcoin rose 5% to $70,000"
+            matches "Bitcoin rose 3% to $68,500"); the new numbers are put into
+            the stored translation when each old number occurs there exactly once
+
+Near-duplicates are not reused: a changed word ("not"), word order ("Is BTC
+up?") or sentence-final punctuation can change the meaning.
+
+Segments are looked up after crypto terms are replaced with placeholders, so
+"Bitcoin rose 5%" and "Ethereum rose 5%" share one entry. Entries live in a
+local SQLite file.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+from translation_cache import normalize_text
+
+# Stand-alone numbers ("5", "70,000", "3.25"); digits inside placeholders such as
+# __CRYPTO_TERM_0__ are not numbers
+_NUMBER = re.compile(r"(?<![\w.,])\d+(?:[.,]\d+)*(?![\w])")
+_NUMBER_SLOT = "\u2060#\u2060"  # word joiners keep the slot from matching a literal "#"
+_HASH_MASK = (1 << 63) - 1  # SQLite INTEGER is signed 64-bit
+
+EXACT = "exact"
+TEMPLATE = "template"
+
+
+def numbers_in(text: str) -> List[str]:
+    return _NUMBER.findall(text)
+
+
+def make_template(text: str) -> str:
+    """Normalized text with every number replaced by one slot marker"""
+    return _NUMBER.sub(_NUMBER_SLOT, normalize_text(text))
+
+
+def _stable_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big") & _HASH_MASK
+
+
+def substitute_numbers(translation: str, old: List[str], new: List[str]) -> Optional[str]:
+    """Put new numbers in place of the old ones, or None if that cannot be done safely"""
+    if old == new:
+        return translation
+    mapping: Dict[str, str] = {}
+    for old_number, new_number in zip(old, new):
+        if mapping.setdefault(old_number, new_number) != new_number:
+            return None  # the same old number would have to become two different ones
+    found = numbers_in(translation)
+    for old_number, new_number in mapping.items():
+        if old_number != new_number and found.count(old_number) != 1:
+            return None  # reformatted or repeated in the translation
+    return _NUMBER.sub(lambda m: mapping.get(m.group(0), m.group(0)), translation)
+
+
+class _Segment:
+    """A segment's normalized forms and hashes, computed once and only when needed"""
+
+    def __init__(self, segment: str):
+        self.source = normalize_text(segment)
+        self.template = make_template(segment)
+        self.numbers = numbers_in(self.source)
+
+    @cached_property
+    def source_hash(self) -> int:
+        return _stable_hash(self.source)
+
+    @cached_property
+    def template_hash(self) -> int:
+        return _stable_hash(self.template)
+
+
+class TranslationMemory:
+    """File-backed segment store with exact and template lookup"""
+
+    def __init__(self, path: Optional[str], max_segments: int = 500000):
+        self.path = path
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._segments = 0
+
+        self.lookups = 0
+        self.hits = {EXACT: 0, TEMPLATE: 0}
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY,
+                scope TEXT NOT NULL,
+                src_lang TEXT NOT NULL,
+                tgt_lang TEXT NOT NULL,
+                source_hash INTEGER NOT NULL,
+                template_hash INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_segments_source ON segments (source_hash, scope, src_lang, tgt_lang)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_segments_template ON segments (template_hash, scope, src_lang, tgt_lang)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_segments_created_at ON segments (created_at)")
+        # Left behind by the former near-duplicate index
+        self._db.execute("DROP TABLE IF EXISTS bands")
+        self._segments = self._db.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        self._prune()
+
+    def lookup(self, segment: str, src_lang: str, tgt_lang: str, scope: str) -> Optional[Tuple[str, str]]:
+        """(translation, match kind) for a segment, or None"""
+        return self.lookup_many([(segment, src_lang, tgt_lang, scope)])[0]
+
+    def lookup_many(self, queries: List[Tuple[str, str, str, str]]) -> List[Optional[Tuple[str, str]]]:
+        """lookup() for several (segment, src_lang, tgt_lang, scope) queries
+
+        Hashes are computed once per distinct segment however many target
+        languages it is looked up for. Blocking (SQLite); call it off the
+        event loop.
+        """
+        features: Dict[str, _Segment] = {}
+        results = []
+        with self._lock:
+            for segment, src_lang, tgt_lang, scope in queries:
+                if segment not in features:
+                    features[segment] = _Segment(segment)
+                results.append(self._lookup(features[segment], (scope, src_lang, tgt_lang)))
+        return results
+
+    def _lookup(self, segment: "_Segment", key: tuple) -> Optional[Tuple[str, str]]:
+        self.lookups += 1
+        row = self._db.execute(
+            """SELECT id, translation FROM segments
+            WHERE source_hash = ? AND scope = ? AND src_lang = ? AND tgt_lang = ?""",
+            (segment.source_hash,) + key,
+        ).fetchone()
+        if row is not None:
+            self._hit(row[0])
+            self.hits[EXACT] += 1
+            return row[1], EXACT
+
+        if segment.numbers:
+            rows = self._db.execute(
+                """SELECT id, source, translation FROM segments
+                WHERE template_hash = ? AND scope = ? AND src_lang = ? AND tgt_lang = ?
+                ORDER BY hits DESC LIMIT 5""",
+                (segment.template_hash,) + key,
+            ).fetchall()
+            for segment_id, stored_source, translation in rows:
+                if make_template(stored_source) != segment.template:
+                    continue
+                reused = substitute_numbers(translation, numbers_in(stored_source), segment.numbers)
+                if reused is not None:
+                    self._hit(segment_id)
+                    self.hits[TEMPLATE] += 1
+                    return reused, TEMPLATE
+        return None
+
+    def _hit(self, segment_id: int):
+        self._db.execute("UPDATE segments SET hits = hits + 1 WHERE id = ?", (segment_id,))
+
+    def store(self, segment: str, translation: str, src_lang: str, tgt_lang: str, scope: str):
+        """Remember a model translation of a segment"""
+        self.store_many([(segment, translation, src_lang, tgt_lang, scope)])
+
+    def store_many(self, entries: List[Tuple[str, str, str, str, str]]):
+        """store() for several (segment, translation, src_lang, tgt_lang, scope) entries in one transaction
+
+        Blocking (SQLite); call it off the event loop.
+        """
+        features: Dict[str, _Segment] = {}
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for segment, translation, src_lang, tgt_lang, scope in entries:
+                    if segment not in features:
+                        features[segment] = _Segment(segment)
+                    self._store(features[segment], translation, (scope, src_lang, tgt_lang), now)
+                if self._segments > self.max_segments:
+                    self._prune()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _store(self, segment: "_Segment", translation: str, key: tuple, now: float):
+        if not segment.source:
+            return
+        row = self._db.execute(
+            "SELECT id FROM segments WHERE source_hash = ? AND scope = ? AND src_lang = ? AND tgt_lang = ?",
+            (segment.source_hash,) + key,
+        ).fetchone()
+        if row is not None:
+            self._db.execute(
+                "UPDATE segments SET translation = ?, created_at = ?, hits = 0 WHERE id = ?",
+                (translation, now, row[0]),
+            )
+            return
+        self._db.execute(
+            """INSERT INTO segments
+            (scope, src_lang, tgt_lang, source_hash, template_hash, source, translation, created_at, hits)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)""",
+            key + (segment.source_hash, segment.template_hash, segment.source, translation, now),
+        )
+        self._segments += 1
+
+    def _prune(self):
+        """Enforce the size limit by dropping the oldest segments"""
+        excess = self._segments - self.max_segments
+        if excess <= 0:
+            return
+        # A little below the limit, so the next prune is some writes away
+        excess += max(1, self.max_segments // 100)
+        ids = [row[0] for row in self._db.execute("SELECT id FROM segments ORDER BY created_at ASC LIMIT ?", (excess,))]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self._db.execute(f"DELETE FROM segments WHERE id IN ({placeholders})", chunk)
+        self._segments -= len(ids)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM segments")
+            self._segments = 0
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        return {
+            "segments": self._segments,
+            "lookups": self.lookups,
+            "hits": dict(self.hits),
+            "match_rate": round(hits / self.lookups, 4) if self.lookups else 0.0,
+        }
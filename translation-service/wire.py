@@ -0,0 +1,229 @@
+"""
+Wire formats for the NLLB translation service.
+
+Large batch payloads (many paragraphs x many languages) spend measurable time
+in JSON encoding and on the network. Requests and responses negotiate:
+
+- body format      JSON (orjson when installed) or MessagePack
+                   (Content-Type / Accept: application/msgpack)
+- compression      gzip or zstd (Content-Encoding / Accept-Encoding)
+
+msgpack, zstandard and orjson are optional; without them the service keeps
+speaking plain JSON and gzip, and never advertises what it cannot decode.
+"""
+
+import contextvars
+import gzip
+import io
+import json
+import zlib
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException, Request  # type: ignore
+from fastapi.responses import JSONResponse, Response  # type: ignore
+from fastapi.routing import APIRoute  # type: ignore
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # type: ignore
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard  # type: ignore
+except ImportError:
+    zstandard = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Responses smaller than this are not worth compressing
+min_compress_bytes = 1024
+# Largest request body accepted after decompression (guards against compression bombs)
+max_body_bytes = 64 * 1024 * 1024
+
+# (body format, content encoding) negotiated for the response of the current request
+_response_format: contextvars.ContextVar = contextvars.ContextVar("response_format", default=("json", None))
+
+
+def configure(min_compress: int, max_body: int):
+    global min_compress_bytes, max_body_bytes
+    min_compress_bytes = min_compress
+    max_body_bytes = max_body
+
+
+def available() -> dict:
+    """Supported formats and encodings (for /health)"""
+    return {
+        "formats": ["json"] + (["msgpack"] if msgpack is not None else []),
+        "encodings": ["gzip"] + (["zstd"] if zstandard is not None else []),
+        "json_encoder": "orjson" if orjson is not None else "json",
+    }
+
+
+def dumps_json(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_json(body: bytes) -> Any:
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def _media_type(header: Optional[str]) -> str:
+    return (header or "").split(";")[0].strip().lower()
+
+
+def _accepted(header: Optional[str]) -> dict:
+    """{token: q} from an Accept or Accept-Encoding header"""
+    accepted = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if token:
+            accepted[token.strip().lower()] = q
+    return accepted
+
+
+def negotiate(accept: Optional[str], accept_encoding: Optional[str]) -> Tuple[str, Optional[str]]:
+    """(body format, content encoding) for a response; JSON and no compression unless asked for"""
+    types = _accepted(accept)
+    msgpack_q = max((types.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    json_q = max(types.get(JSON_MEDIA_TYPE, 0.0), types.get("*/*", 0.0), types.get("application/*", 0.0))
+    body_format = "msgpack" if msgpack is not None and msgpack_q > 0 and msgpack_q >= json_q else "json"
+
+    encodings = _accepted(accept_encoding)
+    options = [("zstd", 2)] if zstandard is not None else []
+    options.append(("gzip", 1))
+    # Highest q wins; on a tie zstd is preferred (faster at a similar ratio)
+    encoding = max(
+        ((name, encodings.get(name, encodings.get("*", 0.0)), rank) for name, rank in options),
+        key=lambda option: (option[1], option[2]),
+    )
+    return body_format, encoding[0] if encoding[1] > 0 else None
+
+
+def pack_msgpack(content: Any) -> bytes:
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    return msgpack.packb(content, use_bin_type=True)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=5)
+
+
+def decompress(body: bytes, encoding: str, limit: int) -> bytes:
+    """Decompress a request body, refusing to produce more than limit bytes"""
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decompressor.decompress(body, limit + 1)
+    elif encoding == "zstd" and zstandard is not None:
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body))
+        chunks, size = [], 0
+        while size <= limit:
+            chunk = reader.read(min(1 << 20, limit + 1 - size))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        data = b"".join(chunks)
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    if len(data) > limit:
+        raise HTTPException(status_code=413, detail=f"Request body is larger than {limit} bytes once decompressed")
+    return data
+
+
+async def decode_request(request: Request) -> Request:
+    """The request with its body decompressed and parsed, presented to FastAPI as JSON"""
+    encoding = request.headers.get("content-encoding", "identity").strip().lower()
+    media_type = _media_type(request.headers.get("content-type"))
+    if encoding == "identity" and media_type not in MSGPACK_MEDIA_TYPES and orjson is None:
+        return request
+
+    body = await request.body()
+    if encoding != "identity" and body:
+        try:
+            body = decompress(body, encoding, max_body_bytes)
+        except (zlib.error, EOFError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid {encoding} body: {e}")
+        except HTTPException:
+            raise
+        except Exception as e:  # zstandard.ZstdError
+            raise HTTPException(status_code=400, detail=f"Invalid {encoding} body: {e}")
+
+    parsed = None
+    if media_type in MSGPACK_MEDIA_TYPES:
+        if msgpack is None:
+            raise HTTPException(status_code=415, detail="MessagePack is not available on this server")
+        try:
+            parsed = msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid MessagePack body: {e}")
+    elif body and (not media_type or media_type == JSON_MEDIA_TYPE):
+        try:
+            parsed = loads_json(body)
+        except ValueError:
+            parsed = None  # FastAPI reports the JSON error itself
+
+    # A new request with plain headers (MessagePack presented as JSON) and the parsed body attached
+    replaced = (b"content-encoding", b"content-length") + ((b"content-type",) if media_type in MSGPACK_MEDIA_TYPES else ())
+    headers = [(name, value) for name, value in request.scope["headers"] if name not in replaced]
+    if media_type in MSGPACK_MEDIA_TYPES:
+        headers.append((b"content-type", JSON_MEDIA_TYPE.encode()))
+    decoded = Request({**request.scope, "headers": headers}, request.receive)
+    decoded._body = body
+    if parsed is not None:
+        decoded._json = parsed
+    return decoded
+
+
+class WireRoute(APIRoute):
+    """Route that decodes compressed/msgpack request bodies and negotiates the response format"""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            _response_format.set(negotiate(request.headers.get("accept"), request.headers.get("accept-encoding")))
+            return await handler(await decode_request(request))
+
+        return route_handler
+
+
+class WireResponse(JSONResponse):
+    """JSON (orjson when installed) or MessagePack response, compressed when the client accepts it"""
+
+    def __init__(self, content: Any = None, status_code: int = 200, headers: Optional[dict] = None, media_type: Optional[str] = None, background=None):
+        self._format, self._encoding = _response_format.get()
+        self._compressed = False
+        if media_type is None and self._format == "msgpack":
+            media_type = MSGPACK_MEDIA_TYPES[0]
+        super().__init__(content, status_code, headers, media_type, background)
+        if self._compressed:
+            self.headers["content-encoding"] = self._encoding
+        self.headers["vary"] = "Accept, Accept-Encoding"
+
+    def render(self, content: Any) -> bytes:
+        body = pack_msgpack(content) if self._format == "msgpack" else dumps_json(content)
+        if self._encoding is not None and len(body) >= min_compress_bytes:
+            body = compress(body, self._encoding)
+            self._compressed = True
+        return body
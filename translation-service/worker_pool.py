@@ -0,0 +1,232 @@
+"""
+Pre-fork inference worker pool for the NLLB translation service.
+
+The model is loaded once in the API process, which then forks the workers, so
+all of them share the same weight pages copy-on-write instead of each holding
+its own copy. Every worker gets its own intra-op thread count and serves jobs
+over a dedicated pipe; tensors travel through shared memory
+(torch.multiprocessing) rather than being copied through the pipe.
+
+A worker that dies (e.g. killed by the OOM killer) is replaced by a fresh
+fork. Replacements are not forked from the API process: by then it runs the
+event loop, queue and gRPC threads, and a lock one of them holds at fork time
+would stay locked forever in the child. A small fork server is forked next to
+the original workers instead. It stays single-threaded and forks replacements
+from the same state the originals started from, so they share the weights too
+(trade-off: one idle process whose private memory is a few MB).
+"""
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+import torch  # type: ignore
+import torch.multiprocessing  # type: ignore  # registers shared-memory pickling for tensors
+
+logger = logging.getLogger(__name__)
+
+
+def fork_available() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def _serve(conn, threads: int, initializer: Optional[Callable[[], None]]):
+    """Worker process main loop: run (fn, args) jobs until the pipe closes"""
+    # Shutdown is driven by the API process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    torch.set_num_threads(threads)
+    if initializer is not None:
+        initializer()
+
+    while True:
+        try:
+            fn, args = conn.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            result = fn(*args)
+        except Exception as e:
+            conn.send((False, e))
+        else:
+            conn.send((True, result))
+
+
+def _fork_server(conn, threads: int, initializer: Optional[Callable[[], None]]):
+    """Fork server main loop: fork workers on request and report their exit codes"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    exitcodes: Dict[int, Optional[int]] = {}
+
+    while True:
+        try:
+            request, value = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request == "fork":
+            # The worker's end of its pipe comes as a file descriptor
+            fd = reduction.recv_handle(conn)
+            pid = os.fork()
+            if pid == 0:
+                conn.close()
+                try:
+                    _serve(Connection(fd), threads, initializer)
+                finally:
+                    os._exit(0)
+            os.close(fd)
+            exitcodes[pid] = None
+            conn.send(pid)
+        elif request == "status":
+            if exitcodes.get(value, 0) is None:
+                done, status = os.waitpid(value, os.WNOHANG)
+                if done:
+                    exitcodes[value] = os.waitstatus_to_exitcode(status)
+            conn.send(exitcodes.get(value))
+
+
+class _ForkedWorker:
+    """A worker forked by the fork server, with the parts of the Process API the pool uses"""
+
+    def __init__(self, pool: "WorkerPool", pid: int):
+        self._pool = pool
+        self.pid = pid
+
+    @property
+    def exitcode(self) -> Optional[int]:
+        try:
+            return self._pool._server_request("status", self.pid)
+        except (EOFError, OSError):
+            # The fork server is gone (its children were re-parented); only liveness is known
+            try:
+                os.kill(self.pid, 0)
+            except ProcessLookupError:
+                return -1
+            return None
+
+    def is_alive(self) -> bool:
+        return self.exitcode is None
+
+    def kill(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def join(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while self.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+class WorkerPool:
+    """N forked worker processes, each running one inference job at a time"""
+
+    def __init__(self, processes: int, threads_per_process: int, initializer: Optional[Callable[[], None]] = None):
+        self.processes = processes
+        self.threads_per_process = threads_per_process
+        self._initializer = initializer  # run in each worker after the fork
+        self._conns: List[Any] = []
+        self._procs: List[Any] = []
+        self._locks: List[threading.Lock] = []
+        self._server: Any = None
+        self._server_conn: Any = None
+        self._server_lock = threading.Lock()
+        self.restarts = 0
+
+    def start(self):
+        """Fork the workers and the fork server; call after the model is loaded and before any inference"""
+        # Tokenizer thread pools do not survive fork
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        context = multiprocessing.get_context("fork")
+        self._server_conn, server_conn = context.Pipe()
+        self._server = context.Process(
+            target=_fork_server,
+            args=(server_conn, self.threads_per_process, self._initializer),
+            name="nllb-fork-server",
+            daemon=True,
+        )
+        self._server.start()
+        server_conn.close()
+
+        for i in range(self.processes):
+            parent_conn, child_conn = context.Pipe()
+            proc = context.Process(
+                target=_serve,
+                args=(child_conn, self.threads_per_process, self._initializer),
+                name=f"nllb-worker-{i}",
+                daemon=True,
+            )
+            proc.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+            self._locks.append(threading.Lock())
+        logger.info(
+            f"Started {self.processes} inference worker processes "
+            f"({self.threads_per_process} threads each, pid {os.getpid()} shares weights)"
+        )
+
+    def _server_request(self, request: str, value: Any = None, handle: Optional[int] = None) -> Any:
+        with self._server_lock:
+            self._server_conn.send((request, value))
+            if handle is not None:
+                reduction.send_handle(self._server_conn, handle, self._server.pid)
+            return self._server_conn.recv()
+
+    def _respawn(self, index: int) -> Optional[int]:
+        """Replace a dead worker (called with its lock held) and return its exit code;
+        it stays dead if the fork server cannot fork"""
+        proc = self._procs[index]
+        if proc.is_alive():  # the pipe broke but the process hangs on
+            proc.kill()
+        proc.join(5)
+        exitcode = proc.exitcode
+        self._conns[index].close()
+        parent_conn, child_conn = multiprocessing.get_context("fork").Pipe()
+        try:
+            pid = self._server_request("fork", index, handle=child_conn.fileno())
+        except (EOFError, OSError) as e:
+            logger.error(f"Could not restart inference worker {index}: {e}")
+            parent_conn.close()
+            return exitcode
+        finally:
+            child_conn.close()
+        self._conns[index], self._procs[index] = parent_conn, _ForkedWorker(self, pid)
+        self.restarts += 1
+        logger.warning(f"Restarted inference worker {index} (pid {pid}, exit code {exitcode})")
+        return exitcode
+
+    def call(self, index: int, fn: Callable, args: tuple) -> Any:
+        """Run fn(*args) in worker `index` and return its result (blocking)
+
+        A job whose worker died fails; the worker is restarted for the next job.
+        """
+        with self._locks[index]:
+            if not self._procs[index].is_alive():
+                self._respawn(index)
+            conn = self._conns[index]
+            try:
+                conn.send((fn, args))
+                ok, result = conn.recv()
+            except (EOFError, OSError) as e:
+                exitcode = self._respawn(index)
+                raise RuntimeError(f"Inference worker {index} exited (exit code {exitcode})") from e
+        if not ok:
+            raise result
+        return result
+
+    def pids(self) -> List[int]:
+        return [proc.pid for proc in self._procs if proc.is_alive()]
+
+    def stats(self) -> dict:
+        return {
+            "processes": self.processes,
+            "threads_per_process": self.threads_per_process,
+            "alive": sum(1 for proc in self._procs if proc.is_alive()),
+            "restarts": self.restarts,
+            "fork_server_alive": self._server is not None and self._server.is_alive(),
+        }